@@ -0,0 +1,248 @@
+"""Persistent store of every analysis result, with history and leaderboard queries.
+
+Results are appended to a SQLite database in WAL mode, so readers never block
+the writer (or each other), including across processes sharing the file.
+Requests only put a row on a queue: a background thread writes queued rows in
+batches, one transaction per batch, off the request path.
+
+Queries are keyset-paginated and served from indexes, so they cost the same on
+the millionth row as on the first:
+
+- history: newest first, optionally within one category, paged by id
+- leaderboard: highest percentage first, optionally within one category,
+  each image listed once
+"""
+import datetime
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS analyses ("
+    "id INTEGER PRIMARY KEY, image_hash TEXT NOT NULL, model TEXT NOT NULL, "
+    "percentage REAL NOT NULL, score INTEGER NOT NULL, max_score INTEGER NOT NULL, "
+    "categories TEXT NOT NULL, items TEXT NOT NULL, created_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS analyses_by_percentage ON analyses (percentage, id)",
+    # One row per (analysis, detected category): the category indexes
+    "CREATE TABLE IF NOT EXISTS analysis_categories ("
+    "category TEXT NOT NULL, analysis_id INTEGER NOT NULL, percentage REAL NOT NULL, "
+    "PRIMARY KEY (category, analysis_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS analysis_categories_by_percentage "
+    "ON analysis_categories (category, percentage, analysis_id)",
+)
+
+COLUMNS = 'a.id, a.image_hash, a.model, a.percentage, a.score, a.max_score, a.categories, a.items, a.created_at'
+
+_STOP = object()
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL: a commit is durable once checkpointed; a power cut may lose the last few batches
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def row_to_dict(row):
+    id_, image_hash, model, percentage, score, max_score, categories, items, created_at = row
+    return {
+        'id': id_,
+        'image_hash': image_hash,
+        'model': model,
+        'percentage': percentage,
+        'score': score,
+        'max_score': max_score,
+        'detected_categories': json.loads(categories),
+        'detected_items': json.loads(items),
+        'created_at': datetime.datetime.fromtimestamp(created_at, datetime.timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+class AnalysisStore:
+    """Append-only SQLite store of analysis results, written in batches by a background thread
+
+    batch_size:      most rows written per transaction
+    flush_interval:  longest a queued row waits for its batch to fill up
+    max_queue:       rows allowed to wait; beyond that new rows are dropped (and counted)
+                     rather than slowing requests down
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=0.5, max_queue=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._local = threading.local()
+        self._writer = None
+        self._writer_pid = None
+        self._lock = threading.Lock()
+
+        conn = connect(path)
+        for statement in SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        conn.close()
+
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+    def _ensure_writer(self):
+        # Threads don't survive fork: a pre-forked worker starts its own writer on first use
+        if self._writer_pid == os.getpid() and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer_pid != os.getpid() or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name='analysis-store-writer', daemon=True)
+                self._writer.start()
+                self._writer_pid = os.getpid()
+
+    def record(self, image_hash, model, result, created_at=None):
+        """Queue one /analyze result for writing; never blocks"""
+        row = (
+            image_hash,
+            model,
+            result['percentage'],
+            result['score'],
+            result['max_score'],
+            json.dumps(result['detected_categories']),
+            json.dumps(result['detected_items']),
+            created_at or time.time(),
+            result['detected_categories'],
+        )
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _next_batch(self):
+        """Block for the first row, then collect more for up to flush_interval"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_loop(self):
+        conn = connect(self.path)
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is _STOP
+            rows = [row for row in batch if row is not _STOP]
+            if rows:
+                self._write(conn, rows)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _write(self, conn, rows):
+        try:
+            with conn:
+                for row in rows:
+                    cursor = conn.execute(
+                        "INSERT INTO analyses (image_hash, model, percentage, score, max_score, categories, items, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row[:-1])
+                    conn.executemany(
+                        "INSERT INTO analysis_categories (category, analysis_id, percentage) VALUES (?, ?, ?)",
+                        [(category, cursor.lastrowid, row[2]) for category in row[-1]])
+        except sqlite3.Error as e:
+            print(f"Warning: Could not write {len(rows)} analyses to the store: {str(e)}")
+            with self._lock:
+                self.write_errors += len(rows)
+            return
+        with self._lock:
+            self.written += len(rows)
+            self.batches += 1
+
+    def flush(self):
+        """Wait until every queued row has been written"""
+        if self._writer_pid == os.getpid():
+            self._queue.join()
+
+    def close(self):
+        """Write what is queued and stop the writer"""
+        if self._writer_pid == os.getpid() and self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+
+    def _reader(self):
+        # One read connection per thread (and per process); WAL lets them all read concurrently
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = connect(self.path)
+            self._local.pid = os.getpid()
+        return conn
+
+    def history(self, limit=20, before=None, category=None):
+        """Newest analyses first; pass the last id of a page as before= to get the next one"""
+        before = before if before is not None else 2 ** 63 - 1
+        if category:
+            rows = self._reader().execute(
+                f"SELECT {COLUMNS} FROM analysis_categories c JOIN analyses a ON a.id = c.analysis_id "
+                "WHERE c.category = ? AND c.analysis_id < ? ORDER BY c.analysis_id DESC LIMIT ?",
+                (category, before, limit)).fetchall()
+        else:
+            rows = self._reader().execute(
+                f"SELECT {COLUMNS} FROM analyses a WHERE a.id < ? ORDER BY a.id DESC LIMIT ?",
+                (before, limit)).fetchall()
+        return [row_to_dict(row) for row in rows]
+
+    def iter_analyses(self, batch_size=1000):
+        """Every stored analysis, oldest first, read a page at a time (for bulk re-scoring)"""
+        after = 0
+        while True:
+            rows = self._reader().execute(
+                f"SELECT {COLUMNS} FROM analyses a WHERE a.id > ? ORDER BY a.id LIMIT ?", (after, batch_size)).fetchall()
+            for row in rows:
+                yield row_to_dict(row)
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][0]
+
+    def leaderboard(self, limit=10, category=None):
+        """Top analyses by percentage (newest first on ties), one per image"""
+        if category:
+            cursor = self._reader().execute(
+                f"SELECT {COLUMNS} FROM analysis_categories c JOIN analyses a ON a.id = c.analysis_id "
+                "WHERE c.category = ? ORDER BY c.percentage DESC, c.analysis_id DESC", (category,))
+        else:
+            cursor = self._reader().execute(
+                f"SELECT {COLUMNS} FROM analyses a ORDER BY a.percentage DESC, a.id DESC")
+        # Rows stream off the index in order, so this stops after reading little more than limit rows
+        entries = []
+        seen = set()
+        for row in cursor:
+            if row[1] in seen:
+                continue
+            seen.add(row[1])
+            entries.append(row_to_dict(row))
+            if len(entries) == limit:
+                break
+        cursor.close()
+        return entries
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': self.path,
+                'queued': self._queue.qsize(),
+                'written': self.written,
+                'batches': self.batches,
+                'dropped': self.dropped,
+                'write_errors': self.write_errors,
+            }
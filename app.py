@@ -1,176 +1,275 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
-import google.generativeai as genai
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
+import asyncio
+import atexit
+import functools
+import random
+import time
 import base64
-from io import BytesIO
-from PIL import Image
 import json
+import threading
+import contextvars
+import inspect
+import mimetypes
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from result_cache import ResultCache, image_digest, make_cache_key
+from near_duplicates import NearDuplicateIndex, image_dhash
+from analysis_store import AnalysisStore
+from jobs import JobQueue, JobWorkers, QueueFull
+from live_sessions import LiveSessionStore, frame_thumbnail, merge_items, thumbnail_difference
+from prefilter import REASONS as PREFILTER_REASONS, Prefilter, load_classifier
+from preprocessing import ImageTooLarge, PreprocessStats, check_pixel_budget, preprocess_image
+from memory import PeakMemoryTracker
+from compression import PrecompressedAsset, choose_encoding, compress
+from catalogue import CatalogueStore
+from model_registry import ModelRegistry, supports_generation_field
+from scheduler import GeminiScheduler, SchedulerTimeout
+from deadlines import DeadlineExceeded, LatencyTracker, attempt_budget, call_with_timeout, deadline_scope, hedged, hedged_async, remaining, wait_for_deadline
+from metrics import MetricsRegistry, add_request_timing, add_request_tokens, current_request_timings, record_stage, start_request_timings, timed_stage
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = Flask(__name__)
+# static/ is served by static_file() below, compressed once and cached by content hash
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
+# Largest request body accepted for an upload (raw, multipart or base64 JSON)
+MAX_UPLOAD_BYTES = int(os.getenv('MAX_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+
+# /analyze/batch: images per request, total request size, and analyses run at once
+# (the worker pool is shared by every batch request in the process)
+BATCH_MAX_IMAGES = int(os.getenv('BATCH_MAX_IMAGES', '20'))
+BATCH_MAX_UPLOAD_BYTES = int(os.getenv('BATCH_MAX_UPLOAD_BYTES', str(100 * 1024 * 1024)))
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='batch')
+
+# Flask enforces the larger limit; single-image uploads are checked against MAX_UPLOAD_BYTES
+app.config['MAX_CONTENT_LENGTH'] = max(MAX_UPLOAD_BYTES, BATCH_MAX_UPLOAD_BYTES)
+
 # Initialize Gemini
 # Set your API key as environment variable or in .env file: GEMINI_API_KEY='your-key-here'
 api_key = os.getenv('GEMINI_API_KEY', '')
 if not api_key:
     print("Warning: GEMINI_API_KEY not set. Please set it as an environment variable or in a .env file.")
-genai.configure(api_key=api_key)
-
-# Performative male characteristics
-PERFORMATIVE_CHARACTERISTICS = {
-    "feminist_literature": {
-        "items": [
-            "bell hooks", "All About Love", "feminist", "Roxane Gay", "Rebecca Solnit", 
-            "Men Explain Things to Me", "feminism", "feminist author", "feminist writer",
-            "The Argonauts", "Bad Feminist", "We Should All Be Feminists", "The Second Sex",
-            "The Handmaid's Tale", "The Color Purple", "Sister Outsider", "This Bridge Called My Back",
-            "woman writer", "female author", "women's studies", "gender studies"
-        ],
-        "weight": 15
-    },
-    "matcha_latte": {
-        "items": ["matcha", "matcha latte", "green tea latte"],
-        "weight": 10
-    },
-    "tote_bag": {
-        "items": ["tote bag", "canvas bag", "reusable bag"],
-        "weight": 12
-    },
-    "labubu_keychain": {
-        "items": ["Labubu", "keychain", "Pop Mart"],
-        "weight": 8
-    },
-    "baggy_jeans": {
-        "items": ["baggy jeans", "wide leg jeans", "oversized jeans"],
-        "weight": 10
-    },
-    "vintage_clothing": {
-        "items": ["vintage", "thrifted", "retro clothing"],
-        "weight": 8
-    },
-    "female_indie_artists": {
-        "items": ["Phoebe Bridgers", "Taylor Swift", "Lana Del Rey", "indie music", "vinyl record"],
-        "weight": 12
-    },
-    "aesthetic_items": {
-        "items": ["film camera", "polaroid", "journal", "stationery", "minimalist aesthetic"],
-        "weight": 7
-    },
-    "coffee_shop_aesthetic": {
-        "items": ["coffee shop", "cafe", "indie cafe", "artisanal coffee"],
-        "weight": 6
-    },
-    "bookstore_library": {
-        "items": ["bookstore", "library", "reading", "books"],
-        "weight": 5
-    },
-    "plant_parent": {
-        "items": ["plants", "houseplants", "succulents", "potted plants"],
-        "weight": 5
-    },
-    "thrifting": {
-        "items": ["thrift store", "vintage shop", "secondhand"],
-        "weight": 6
-    }
-}
+# The Gemini client library and Pillow are imported on first use, so importing this module
+# stays fast. WARMUP=1 loads them, builds the prompts and connects to Gemini before a server
+# process takes traffic (gunicorn.conf.py, asgi.py, python app.py); /readyz fails until then.
+# With WARMUP=0 the first requests pay for it instead
+WARMUP = os.getenv('WARMUP', '1').lower() not in ('0', 'false', 'no')
+GEMINI_MODEL_NAME = os.getenv('GEMINI_MODEL', 'gemini-2.5-flash')
+
+# 'legacy' = free-text prompt with fallback/enhanced follow-up calls,
+# 'structured' = one call returning JSON with a classified-error retry policy,
+# 'compact' = one call with a short prompt (category ids and descriptions, no suggestions)
+# and a tighter output cap
+ANALYSIS_MODE = os.getenv('ANALYSIS_MODE', 'legacy').lower()
+# A/B split between modes, e.g. "legacy=1,compact=1"; overrides ANALYSIS_MODE when set
+ANALYSIS_MODE_WEIGHTS = {}
+for pair in filter(None, os.getenv('ANALYSIS_MODE_WEIGHTS', '').split(',')):
+    mode, _, weight = pair.partition('=')
+    ANALYSIS_MODE_WEIGHTS[mode.strip().lower()] = float(weight or 1)
+COMPACT_MAX_OUTPUT_TOKENS = int(os.getenv('COMPACT_MAX_OUTPUT_TOKENS', '512'))
+STRUCTURED_MAX_ATTEMPTS = int(os.getenv('STRUCTURED_MAX_ATTEMPTS', '2'))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '0.5'))
+
+# Cache of Gemini results keyed on image digest + prompt + model
+# RESULT_CACHE_SIZE=0 disables the in-memory tier; RESULT_CACHE_PATH enables the SQLite tier,
+# which keeps at most RESULT_CACHE_DISK_SIZE results
+result_cache = ResultCache(
+    max_entries=int(os.getenv('RESULT_CACHE_SIZE', '1024')),
+    ttl_seconds=int(os.getenv('RESULT_CACHE_TTL', '86400')),
+    disk_path=os.getenv('RESULT_CACHE_PATH') or None,
+    disk_max_entries=int(os.getenv('RESULT_CACHE_DISK_SIZE', '100000'))
+)
+
+# Re-encoded, re-captured or slightly cropped copies of an analyzed photo reuse its
+# cached result if their perceptual hashes differ in at most NEAR_DUPLICATE_MAX_DISTANCE
+# of 64 bits. Kept tight: reusing another photo's result is worse than a cache miss, and
+# different photos of the same scene can be 5-6 bits apart. NEAR_DUPLICATE_CACHE_SIZE=0
+# disables near-duplicate reuse
+near_duplicate_index = NearDuplicateIndex(
+    max_entries=int(os.getenv('NEAR_DUPLICATE_CACHE_SIZE', '4096')),
+    max_distance=int(os.getenv('NEAR_DUPLICATE_MAX_DISTANCE', '4'))
+)
+
+# PREFILTER=1 skips Gemini for blank, near-uniform and very blurry images (see prefilter.py);
+# PREFILTER_CLASSIFIER='module:function' adds a local classifier for what the statistics can't catch
+PREFILTER = os.getenv('PREFILTER', '').lower() in ('1', 'true', 'yes')
+prefilter = Prefilter(
+    min_contrast=float(os.getenv('PREFILTER_MIN_CONTRAST', '4')),
+    min_entropy=float(os.getenv('PREFILTER_MIN_ENTROPY', '1')),
+    min_sharpness=float(os.getenv('PREFILTER_MIN_SHARPNESS', '3')),
+    classifier=load_classifier(os.getenv('PREFILTER_CLASSIFIER')),
+    classifier_threshold=float(os.getenv('PREFILTER_CLASSIFIER_THRESHOLD', '0.1'))
+) if PREFILTER else None
+
+# Every analysis result is kept in ANALYSIS_STORE_PATH (SQLite) for /history and /leaderboard;
+# unset, results are not persisted and those endpoints are disabled
+ANALYSIS_STORE_PATH = os.getenv('ANALYSIS_STORE_PATH')
+analysis_store = AnalysisStore(ANALYSIS_STORE_PATH) if ANALYSIS_STORE_PATH else None
+if analysis_store is not None:
+    atexit.register(analysis_store.close)
+
+# Live camera sessions merge the items detected across a client's frames (see live_sessions.py).
+# A frame whose thumbnail differs from the session's last analyzed frame by at most
+# LIVE_CHANGE_THRESHOLD (mean brightness, 0-255) shows the same scene and is answered without
+# analysis. Sessions are per process unless LIVE_SESSION_PATH names a SQLite file shared by the workers
+LIVE_CHANGE_THRESHOLD = float(os.getenv('LIVE_CHANGE_THRESHOLD', '12'))
+live_sessions = LiveSessionStore(
+    path=os.getenv('LIVE_SESSION_PATH') or ':memory:',
+    ttl_seconds=int(os.getenv('LIVE_SESSION_TTL', '900'))
+)
+
+# POST /jobs queues analyses for JOB_WORKERS threads per process to run (see jobs.py). The queue is
+# a SQLite file (JOB_QUEUE_PATH, by default jobs.sqlite3 next to this file, whatever the working
+# directory) shared by the workers, so accepted jobs survive a restart; set JOB_QUEUE_PATH empty to
+# keep it in memory, per process. JOB_MAX_WAIT caps how long GET /jobs/<id>?wait= holds a request
+# open for the result
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+JOB_MAX_WAIT = float(os.getenv('JOB_MAX_WAIT', '30'))
+JOB_QUEUE_PATH = os.getenv('JOB_QUEUE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jobs.sqlite3'))
+job_queue = JobQueue(
+    path=JOB_QUEUE_PATH or ':memory:',
+    max_queued=int(os.getenv('JOB_MAX_QUEUED', '1000')),
+    lease_seconds=int(os.getenv('JOB_LEASE_SECONDS', '300')),
+    ttl_seconds=int(os.getenv('JOB_TTL', '3600'))
+)
+
+# Uploads are downscaled and re-encoded once before being sent to Gemini
+PREPROCESS_MAX_EDGE = int(os.getenv('PREPROCESS_MAX_EDGE', '1536'))
+PREPROCESS_FORMAT = os.getenv('PREPROCESS_FORMAT', 'JPEG').upper()
+PREPROCESS_QUALITY = int(os.getenv('PREPROCESS_QUALITY', '85'))
+preprocess_stats = PreprocessStats()
+# Uploads that would decode to more pixels than this are refused with a 413 before
+# they are decoded (0 = no limit). JPEGs count at the reduced size they are decoded at
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', str(25_000_000)))
+
+# Prometheus metrics, served at /metrics
+# SERVER_TIMING=1 also reports each request's stage timings in a Server-Timing header
+SERVER_TIMING = os.getenv('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+# JSON responses of at least this many bytes are gzip/brotli-compressed for clients
+# that accept it (0 = never)
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+metrics_registry = MetricsRegistry()
+REQUEST_SECONDS = metrics_registry.histogram(
+    'analyzer_request_seconds', 'Time to produce a response (time to first byte for streamed responses)', ['endpoint', 'status'])
+STAGE_SECONDS = metrics_registry.histogram(
+    'analyzer_stage_seconds', 'Time spent in each stage of an analysis', ['stage'])
+GEMINI_CALL_SECONDS = metrics_registry.histogram(
+    'analyzer_gemini_call_seconds', 'Latency of individual Gemini calls', ['model', 'call', 'outcome'])
+GEMINI_RETRIES = metrics_registry.counter(
+    'analyzer_gemini_retries', 'Gemini calls retried after a transient error', ['error'])
+GEMINI_FAILURES = metrics_registry.counter(
+    'analyzer_gemini_failures', 'Analyses that failed upstream, by kind (safety_block, quota, deadline, api_key, other)', ['kind'])
+GEMINI_HEDGES = metrics_registry.counter(
+    'analyzer_gemini_hedges', 'Gemini calls hedged to GEMINI_HEDGE_MODEL, by which call answered first', ['call', 'winner'])
+RESULT_CACHE_LOOKUPS = metrics_registry.counter(
+    'analyzer_result_cache_lookups', 'Result cache lookups', ['result'])
+PREFILTER_SKIPS = metrics_registry.counter(
+    'analyzer_prefilter_skips', 'Analyses answered by the pre-filter without calling Gemini', ['reason'])
+NEAR_DUPLICATE_LOOKUPS = metrics_registry.counter(
+    'analyzer_near_duplicate_lookups', 'Perceptual-hash lookups after an exact result cache miss', ['result'])
+LIVE_FRAMES = metrics_registry.counter(
+    'analyzer_live_frames', 'Frames sent to live sessions, by outcome (analyzed, unchanged, busy)', ['result'])
+GEMINI_QUEUE_SECONDS = metrics_registry.histogram(
+    'analyzer_gemini_queue_seconds', 'Time Gemini calls waited for rate limit capacity')
+GEMINI_TOKENS = metrics_registry.counter(
+    'analyzer_gemini_tokens', 'Gemini tokens billed, from response usage metadata (estimated when missing)', ['model', 'call', 'kind'])
+REQUEST_TOKENS = metrics_registry.histogram(
+    'analyzer_request_tokens', 'Gemini tokens used to answer one request', ['endpoint', 'kind'],
+    buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000))
+DETECTED_CATEGORIES = metrics_registry.histogram(
+    'analyzer_detected_categories', 'Categories detected per fresh (uncached) analysis, by analysis mode', ['mode'],
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 12))
+JOBS = metrics_registry.counter(
+    'analyzer_jobs', 'Queued analysis jobs, by event (submitted, rejected, completed, failed)', ['event'])
+JOB_WAIT_SECONDS = metrics_registry.histogram(
+    'analyzer_job_wait_seconds', 'Time jobs waited in the queue before a worker started them')
+# Read from the queue itself, so with a shared JOB_QUEUE_PATH every worker reports the same values
+metrics_registry.gauge('analyzer_jobs_queued', 'Jobs waiting in the queue', lambda: job_queue.depth()[0])
+metrics_registry.gauge('analyzer_job_oldest_wait_seconds', 'How long the oldest queued job has been waiting',
+                       lambda: round(job_queue.depth()[1], 3))
+# Peak RSS per request (see memory.py); requests handled at the same time share their peak
+memory_tracker = PeakMemoryTracker()
+REQUEST_PEAK_MEMORY = metrics_registry.histogram(
+    'analyzer_request_peak_memory_bytes', 'How far handling one request raised the process\'s peak RSS', ['endpoint'],
+    buckets=tuple(mb * 1024 * 1024 for mb in (1, 2, 5, 10, 20, 50, 100, 200, 500)))
+metrics_registry.gauge('analyzer_process_rss_bytes', 'Resident set size of this process',
+                       lambda: memory_tracker.stats()['rss_bytes'])
+metrics_registry.gauge('analyzer_process_peak_rss_bytes', 'Highest resident set size of this process so far',
+                       lambda: memory_tracker.stats()['peak_rss_bytes'] or 0)
+
+# Every Gemini call goes through one scheduler: RPM/TPM token buckets (0 = unlimited),
+# adaptive backoff on 429s, and coalescing of identical in-flight calls (see scheduler.py)
+IMAGE_TOKENS = 258  # Gemini bills a fixed number of tokens per image
+GEMINI_OUTPUT_TOKENS_ESTIMATE = int(os.getenv('GEMINI_OUTPUT_TOKENS_ESTIMATE', '400'))
+gemini_scheduler = GeminiScheduler(
+    rpm=int(os.getenv('GEMINI_RPM', '0')),
+    tpm=int(os.getenv('GEMINI_TPM', '0')),
+    queue_timeout=float(os.getenv('GEMINI_QUEUE_TIMEOUT', '20')),
+    backoff_base=float(os.getenv('GEMINI_BACKOFF_BASE', '1')),
+    backoff_max=float(os.getenv('GEMINI_BACKOFF_MAX', '30')),
+    wait_histogram=GEMINI_QUEUE_SECONDS
+)
 
-def calculate_performativeness_score(detected_items):
+# An analysis may spend REQUEST_DEADLINE seconds on Gemini in total (0 = no limit): queueing,
+# retries, the fallback and the enhanced call all share it, and each call gets only its share of
+# what is left, so a slow first call still leaves time for the fallback (see deadlines.py).
+# Sync calls wait on GEMINI_CALL_THREADS threads; a call past its budget is abandoned and keeps
+# its thread until the client library returns.
+# GEMINI_HEDGE_MODEL (a model name, usually a faster one) enables hedging: a first, structured or
+# compact call that hasn't answered after GEMINI_HEDGE_PERCENTILE of its model's recent latencies
+# (at least GEMINI_HEDGE_MIN_DELAY seconds) is also sent to that model, and the first answer wins
+REQUEST_DEADLINE = float(os.getenv('REQUEST_DEADLINE', '60'))
+GEMINI_HEDGE_MODEL = os.getenv('GEMINI_HEDGE_MODEL', '').strip()
+GEMINI_HEDGE_PERCENTILE = float(os.getenv('GEMINI_HEDGE_PERCENTILE', '90'))
+GEMINI_HEDGE_MIN_DELAY = float(os.getenv('GEMINI_HEDGE_MIN_DELAY', '0.5'))
+gemini_latencies = LatencyTracker()
+gemini_executor = ThreadPoolExecutor(max_workers=int(os.getenv('GEMINI_CALL_THREADS', '64')), thread_name_prefix='gemini')
+
+# Performative male characteristics, suggestions and roasts live in catalogue.json
+# and are reloaded automatically when the file changes (see catalogue.py)
+CATALOGUE_PATH = os.getenv('CATALOGUE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalogue.json'))
+catalogue_store = CatalogueStore(CATALOGUE_PATH, check_interval=float(os.getenv('CATALOGUE_CHECK_INTERVAL', '2')))
+
+def get_catalogue():
+    """Return the current catalogue version"""
+    return catalogue_store.get()
+
+def calculate_performativeness_score(detected_items, catalogue=None):
     """Calculate performativeness percentage based on detected items
     Each category can only be scored once total, preventing double-counting.
     An item can contribute to multiple different categories (e.g., "baggy vintage jeans" 
     can match both baggy_jeans and vintage_clothing), but each category is only scored once.
     """
-    total_score = 0
-    max_possible_score = sum(char["weight"] for char in PERFORMATIVE_CHARACTERISTICS.values())
-    
-    detected_categories = set()
+    catalogue = catalogue or get_catalogue()
     
-    # First, find all category matches for all items
-    # This allows items to match multiple categories
-    item_category_matches = {}
-    for item_desc in detected_items:
-        item_lower = item_desc.lower()
-        matching_categories = []
-        
-        # Check which categories this item matches
-        for category, data in PERFORMATIVE_CHARACTERISTICS.items():
-            for keyword in data["items"]:
-                if keyword.lower() in item_lower:
-                    matching_categories.append(category)
-                    break  # Found a match for this category, move to next
-        
-        if matching_categories:
-            item_category_matches[item_desc] = matching_categories
-    
-    # Now score categories, ensuring each category is only scored once
-    # Process categories in priority order (highest weight first)
-    category_priority = sorted(
-        PERFORMATIVE_CHARACTERISTICS.items(),
-        key=lambda x: x[1]["weight"],
-        reverse=True
-    )
-    
-    for category, data in category_priority:
-        if category in detected_categories:
-            continue  # Category already scored
-        
-        # Find the first item that matches this category
-        for item_desc, matching_categories in item_category_matches.items():
-            if category in matching_categories:
-                # Score this category (only once)
-                total_score += data["weight"]
-                detected_categories.add(category)
-                break  # This category is now scored, move to next category
+    # All keywords are matched in a single pass over the items (see keyword_matcher.py)
+    detected_categories = catalogue.matcher.match_categories(detected_items)
+    total_score = sum(catalogue.weight(category) for category in detected_categories)
+    max_possible_score = catalogue.max_possible_score
     
     # Calculate percentage (cap at 100%)
     percentage = min((total_score / max_possible_score) * 100, 100)
     return round(percentage, 1), detected_categories, total_score, max_possible_score
 
-def generate_roasts(percentage, detected_categories, detected_items):
+def generate_roasts(percentage, detected_categories, detected_items, catalogue=None):
     """Generate mean roasting comments for scores below 30%"""
     if percentage >= 30:
         return []
     
-    roasts = [
-        "Bro, where's the performativeness? This is giving 'I just discovered what a tote bag is' energy.",
-        "This score is lower than your chances of getting a match on Hinge with this aesthetic.",
-        "You call this performative? My grandma's Facebook profile picture is more performative than this.",
-        "This is what happens when you try to be performative but forget to actually perform.",
-        "Not even a single feminist book in sight? We're not in 2015 anymore, step it up.",
-        "Where's the matcha? Where's the tote bag? Where's the effort? Nowhere, that's where.",
-        "This is giving 'I googled performative male culture 5 minutes ago' vibes.",
-        "You've got the confidence of a 100% score but the aesthetic of a 0% score.",
-        "Even a basic white girl's Instagram from 2016 had more performative elements than this.",
-        "This is so low it's almost impressive. Almost.",
-        "You're missing so many categories, it's like you're actively avoiding being performative.",
-        "This score is a cry for help. Where are the plants? The books? The VIBE?",
-        "Not even trying, are we? This is giving 'I'll do it tomorrow' energy.",
-        "You know what's more performative than this? Literally anything else.",
-        "This is what happens when you skip the performative male starter pack entirely.",
-        "Bro, you're missing the whole point. This isn't a suggestion box, it's a requirement list.",
-        "Even your reflection in a coffee shop window would score higher than this.",
-        "This is giving 'I thought performative meant I could just exist' energy.",
-        "You've achieved the impossible: being less performative than a blank canvas.",
-        "Where's the effort? Where's the aesthetic? Where's the self-awareness? Nowhere to be found."
-    ]
+    catalogue = catalogue or get_catalogue()
+    roasts = list(catalogue.roasts)
     
     # Add category-specific roasts based on what's missing
-    all_categories = set(PERFORMATIVE_CHARACTERISTICS.keys())
-    missing_categories = all_categories - detected_categories
-    
-    if "feminist_literature" in missing_categories:
-        roasts.append("No feminist books? Not even trying to look like you care about women's issues, huh?")
-    
-    if "matcha_latte" in missing_categories:
-        roasts.append("No matcha? You're really out here living like it's 2010.")
-    
-    if "tote_bag" in missing_categories:
-        roasts.append("Where's the tote bag? How are you even carrying things? With your hands? How primitive.")
+    for category, roast in catalogue.missing_roasts.items():
+        if category not in detected_categories:
+            roasts.append(roast)
     
     if len(detected_items) == 0:
         roasts.append("Zero items detected. Not even trying, are we? This is embarrassing.")
@@ -190,91 +289,188 @@ def generate_roasts(percentage, detected_categories, detected_items):
         num_roasts = min(3, len(roasts))
         return random.sample(roasts, num_roasts)
 
-def generate_improvement_suggestions(detected_categories):
+def generate_improvement_suggestions(detected_categories, catalogue=None):
     """Generate improvement suggestions based on missing categories"""
-    suggestions = []
-    all_categories = set(PERFORMATIVE_CHARACTERISTICS.keys())
-    missing_categories = all_categories - detected_categories
-    
-    # Create suggestions for missing high-value categories - relaxed and casual tone
-    category_suggestions = {
-        "feminist_literature": "Maybe throw in some feminist lit? Books by bell hooks, Roxane Gay, or Rebecca Solnit would work (+15 points)",
-        "matcha_latte": "A matcha latte could add some points here (+10 points)",
-        "tote_bag": "A cute tote bag would fit the vibe (+12 points)",
-        "labubu_keychain": "A Labubu keychain or Pop Mart collectible could help boost your score (+8 points)",
-        "baggy_jeans": "Some baggy or wide-leg jeans might score better than slim-fit (+10 points)",
-        "vintage_clothing": "Vintage or thrifted pieces always add to the aesthetic (+8 points)",
-        "female_indie_artists": "Some vinyl from Phoebe Bridgers, Taylor Swift, or Lana Del Rey would be a nice touch (+12 points)",
-        "aesthetic_items": "A film camera, polaroid, or journal could add to the aesthetic (+7 points)",
-        "coffee_shop_aesthetic": "An indie coffee shop background never hurts (+6 points)",
-        "bookstore_library": "A bookstore or library setting would fit perfectly (+5 points)",
-        "plant_parent": "Some houseplants or succulents in the background could help (+5 points)",
-        "thrifting": "Thrift store vibes or vintage shop setting would add points (+6 points)"
-    }
+    catalogue = catalogue or get_catalogue()
+    
+    # Prioritize high-value missing categories (category_priority is pre-sorted by weight)
+    sorted_missing = [category for category in catalogue.category_priority if category not in detected_categories]
     
     # If score is already 100%, return empty suggestions
-    if len(missing_categories) == 0:
+    if len(sorted_missing) == 0:
         return []
     
-    # Prioritize high-value missing categories
-    sorted_missing = sorted(missing_categories, 
-                           key=lambda x: PERFORMATIVE_CHARACTERISTICS[x]["weight"], 
-                           reverse=True)
-    
     # Get top suggestions (up to 6, but prioritize the highest value ones)
+    suggestions = []
     for category in sorted_missing[:6]:  # Top 6 suggestions
-        if category in category_suggestions:
+        if category in catalogue.suggestions:
             # Suggestions already include point values, so just use them as-is
-            suggestions.append(category_suggestions[category])
+            suggestions.append(catalogue.suggestions[category])
     
     return suggestions
 
-@app.route('/')
-def index():
-    return render_template('index.html')
+class AnalysisError(Exception):
+    """Error raised by the analysis pipeline, carrying the HTTP status to respond with"""
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.message = message
+        self.status = status
 
-@app.route('/analyze', methods=['POST'])
-def analyze_image():
+def decode_image_data(image_data):
+    """Decode a base64 image (optionally a data URL) into raw bytes"""
+    # Remove data URL prefix if present
+    # (sliced rather than split, so a large upload isn't copied twice)
+    if ',' in image_data:
+        image_data = image_data[image_data.index(',') + 1:]
+    
     try:
-        # Check API key
-        if not api_key:
-            return jsonify({'error': 'Gemini API key not configured. Please set GEMINI_API_KEY environment variable.'}), 500
-        
-        data = request.json
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
+        with timed_stage(STAGE_SECONDS, 'base64_decode'):
+            return base64.b64decode(image_data)
+    except Exception as e:
+        raise AnalysisError(f'Invalid image format: {str(e)}', 400)
+
+def read_stream_bounded(stream, limit, chunk_size=64 * 1024):
+    """Read a binary stream into memory, refusing anything larger than limit bytes"""
+    buffer = bytearray()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        if len(buffer) + len(chunk) > limit:
+            raise AnalysisError(f'Image too large. The maximum upload size is {limit // (1024 * 1024)} MB.', 413)
+        buffer += chunk
+    return bytes(buffer)
+
+def check_image_pixels(image_bytes):
+    """Refuse an upload that would decode to more than MAX_IMAGE_PIXELS pixels (a decompression bomb guard)"""
+    try:
+        check_pixel_budget(image_bytes, MAX_IMAGE_PIXELS, PREPROCESS_MAX_EDGE)
+    except ImageTooLarge as e:
+        raise AnalysisError(f'Image too large. {e}', 413)
+
+def read_json_body():
+    """Parse the JSON request body without keeping a second copy of it on the request"""
+    body = request.get_data(cache=False)
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        raise AnalysisError('Invalid JSON body', 400)
+
+def read_image_upload():
+    """Return the uploaded image bytes from a raw, multipart or JSON /analyze request
+
+    - image/* (or application/octet-stream) body: the raw image bytes
+    - multipart/form-data: the file in the 'image' field
+    - application/json: {"image": "<base64 or data URL>"}
+    """
+    if request.content_length and request.content_length > MAX_UPLOAD_BYTES:
+        raise AnalysisError(f'Image too large. The maximum upload size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.', 413)
+    
+    content_type = request.mimetype or ''
+    
+    if content_type.startswith('image/') or content_type == 'application/octet-stream':
+        image_bytes = read_stream_bounded(request.stream, MAX_UPLOAD_BYTES)
+    elif content_type == 'multipart/form-data':
+        upload = request.files.get('image')
+        if upload is None:
+            raise AnalysisError('No image provided', 400)
+        image_bytes = read_stream_bounded(upload.stream, MAX_UPLOAD_BYTES)
+    elif request.is_json:
+        data = read_json_body()
+        if not data or not isinstance(data, dict):
+            raise AnalysisError('No data provided', 400)
             
-        image_data = data.get('image')
+        image_data = data.pop('image', None)
+        del data
         
         if not image_data:
-            return jsonify({'error': 'No image provided'}), 400
-        
-        # Remove data URL prefix if present
-        if ',' in image_data:
-            image_data = image_data.split(',')[1]
-        
-        # Decode base64 image
-        try:
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(BytesIO(image_bytes))
-        except Exception as e:
-            return jsonify({'error': f'Invalid image format: {str(e)}'}), 400
+            raise AnalysisError('No image provided', 400)
         
-        # Initialize Gemini model (using gemini-1.5-flash for vision)
-        try:
-            model = genai.GenerativeModel('gemini-2.5-flash')
-        except Exception as e:
-            return jsonify({'error': f'Failed to initialize Gemini model: {str(e)}'}), 500
-        
-        # Create prompt for analysis
-        characteristics_list = []
-        for category, char_data in PERFORMATIVE_CHARACTERISTICS.items():
-            characteristics_list.append(f"- {category.replace('_', ' ').title()}: {', '.join(char_data['items'])}")
-        
-        prompt = f"""Take a look at this image and identify items related to performative male culture. Here's what to look for:
+        image_bytes = decode_image_data(image_data)
+    else:
+        raise AnalysisError('Unsupported content type. Send an image, multipart/form-data or JSON.', 415)
+    
+    if not image_bytes:
+        raise AnalysisError('No image provided', 400)
+    check_image_pixels(image_bytes)
+    return image_bytes
+
+def check_batch_size(count):
+    if not count:
+        raise AnalysisError('No images provided', 400)
+    if count > BATCH_MAX_IMAGES:
+        raise AnalysisError(f'Too many images. A batch may contain at most {BATCH_MAX_IMAGES} images.', 400)
+
+def read_batch_image(read):
+    """One batch image's bytes from read(), or the AnalysisError to report in that image's record"""
+    try:
+        image_bytes = read()
+        if not image_bytes:
+            raise AnalysisError('No image provided', 400)
+        check_image_pixels(image_bytes)
+        return image_bytes
+    except AnalysisError as e:
+        return e
+
+def read_batch_upload():
+    """Return the uploaded images of a multipart or JSON /analyze/batch request, in order
+
+    - multipart/form-data: one file per 'images' field (repeated)
+    - application/json: {"images": ["<base64 or data URL>", ...]}
+
+    An image that can't be read is an AnalysisError in its place, so the rest
+    of the batch still runs and its record reports what was wrong with it.
+    """
+    if (request.mimetype or '') == 'multipart/form-data':
+        uploads = request.files.getlist('images')
+        check_batch_size(len(uploads))
+        return [read_batch_image(functools.partial(read_stream_bounded, upload.stream, MAX_UPLOAD_BYTES))
+                for upload in uploads]
+    
+    try:
+        data = read_json_body()
+    except AnalysisError:
+        data = None
+    if not isinstance(data, dict) or not isinstance(data.get('images'), list):
+        raise AnalysisError('No images provided', 400)
+    encoded = data.pop('images')
+    del data
+    # Counted before anything is decoded, so an oversized batch costs nothing
+    check_batch_size(len(encoded))
+    encoded.reverse()  # So pop() takes the images in order without shifting the list
+    images = []
+    while encoded:
+        # Decoded one at a time, so the base64 text of each is freed as it goes
+        image_data = encoded.pop()
+        if not isinstance(image_data, str):
+            image_data = ''
+        images.append(read_batch_image(functools.partial(decode_image_data, image_data)))
+    return images
+
+def prepare_image(image_bytes):
+    """Orient, downscale and re-encode the upload into the payload sent to Gemini"""
+    try:
+        prepared = preprocess_image(
+            image_bytes,
+            max_edge=PREPROCESS_MAX_EDGE,
+            image_format=PREPROCESS_FORMAT,
+            quality=PREPROCESS_QUALITY,
+            stats=preprocess_stats
+        )
+    except Exception as e:
+        raise AnalysisError(f'Invalid image format: {str(e)}', 400)
+    for stage, seconds in prepared.timings.items():
+        record_stage(STAGE_SECONDS, stage, seconds)
+    print(f"Preprocessed image: {prepared.bytes_in} -> {prepared.bytes_out} bytes ({prepared.width}x{prepared.height})")
+    return prepared
+
+@functools.lru_cache(maxsize=4)
+def build_analysis_prompt(catalogue):
+    """Build the Gemini prompt listing every characteristic to look for (once per catalogue version)"""
+    return f"""Take a look at this image and identify items related to performative male culture. Here's what to look for:
 
 Characteristics to check for:
-{chr(10).join(characteristics_list)}
+{catalogue.characteristics_list}
 
 What to do:
 - Look through the image and spot any items that match the categories above - be GENEROUS and INTERPRET BROADLY
@@ -296,155 +492,92 @@ SECTION 2 - IMPROVEMENT SUGGESTIONS:
 Give some relaxed, friendly suggestions for items that could boost the performativeness score. Keep it casual and light - like you're giving friendly advice to a friend. Focus on high-value items from the categories that seem to be missing, but don't be too prescriptive. Use a casual, conversational tone like "maybe add..." or "could throw in..." or "might help if you..."
 
 Remember: When in doubt, include it! Be generous and relaxed in your detection."""
-        
-        # Analyze image with Gemini - use generation config for more thorough analysis
-        try:
-            # Use generation config for more relaxed, flexible analysis
-            # Dictionary format works with Gemini API
-            generation_config = {
-                "temperature": 0.8,  # Higher temperature for more relaxed, generous interpretation
-                "top_p": 0.95,
-                "top_k": 40,
-                "max_output_tokens": 2048,  # Allow longer, detailed responses
-            }
-            
-            # Configure safety settings to be more permissive for personal images
-            # Use genai.types.SafetySetting for proper enum values
-            try:
-                from google.generativeai.types import HarmCategory, HarmBlockThreshold
-                safety_settings = [
-                    {
-                        "category": HarmCategory.HARM_CATEGORY_HARASSMENT,
-                        "threshold": HarmBlockThreshold.BLOCK_NONE,
-                    },
-                    {
-                        "category": HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                        "threshold": HarmBlockThreshold.BLOCK_NONE,
-                    },
-                    {
-                        "category": HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-                        "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH,
-                    },
-                    {
-                        "category": HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-                        "threshold": HarmBlockThreshold.BLOCK_NONE,
-                    },
-                ]
-            except ImportError:
-                # Fallback to string format if enums not available
-                safety_settings = [
-                    {
-                        "category": "HARM_CATEGORY_HARASSMENT",
-                        "threshold": "BLOCK_NONE"
-                    },
-                    {
-                        "category": "HARM_CATEGORY_HATE_SPEECH",
-                        "threshold": "BLOCK_NONE"
-                    },
-                    {
-                        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                        "threshold": "BLOCK_ONLY_HIGH"
-                    },
-                    {
-                        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                        "threshold": "BLOCK_NONE"
-                    }
-                ]
-            
-            try:
-                response = model.generate_content(
-                    [prompt, image],
-                    generation_config=generation_config,
-                    safety_settings=safety_settings
-                )
-            except Exception as gen_error:
-                # If generation fails, try without safety settings override
-                try:
-                    response = model.generate_content(
-                        [prompt, image],
-                        generation_config=generation_config
-                    )
-                except:
-                    raise gen_error
-            
-            # Check if content was blocked
-            if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
-                if hasattr(response.prompt_feedback, 'block_reason') and response.prompt_feedback.block_reason:
-                    raise Exception(f"Content blocked: {response.prompt_feedback.block_reason}")
-            
-            # Safely extract text from response
-            detected_items_text = ""
-            try:
-                # First try the simple .text property
-                if hasattr(response, 'text'):
-                    try:
-                        detected_items_text = response.text or ""
-                    except Exception:
-                        pass
-                
-                # If .text didn't work, try accessing through candidates
-                if not detected_items_text and hasattr(response, 'candidates'):
-                    candidates = getattr(response, 'candidates', [])
-                    if candidates and len(candidates) > 0:
-                        try:
-                            candidate = candidates[0]
-                            # Check if content was blocked in candidate
-                            if hasattr(candidate, 'finish_reason'):
-                                finish_reason = getattr(candidate, 'finish_reason', None)
-                                if finish_reason and 'SAFETY' in str(finish_reason).upper():
-                                    raise Exception("Content was blocked by safety filters")
-                            
-                            # Try to get text from candidate
-                            if hasattr(candidate, 'content'):
-                                content = getattr(candidate, 'content', None)
-                                if content and hasattr(content, 'parts'):
-                                    parts = getattr(content, 'parts', [])
-                                    if parts and len(parts) > 0:
-                                        part = parts[0]
-                                        if hasattr(part, 'text'):
-                                            detected_items_text = getattr(part, 'text', '') or ""
-                        except (IndexError, AttributeError, KeyError, TypeError) as e:
-                            print(f"Warning: Could not extract text from candidate: {str(e)}")
-                
-                # Last resort: try direct parts access
-                if not detected_items_text and hasattr(response, 'parts'):
-                    parts = getattr(response, 'parts', [])
-                    if parts and len(parts) > 0:
-                        try:
-                            part = parts[0]
-                            if hasattr(part, 'text'):
-                                detected_items_text = getattr(part, 'text', '') or ""
-                        except (IndexError, AttributeError, KeyError, TypeError):
-                            pass
-                            
-            except Exception as e:
-                # If we hit a blocking error, re-raise it
-                if 'blocked' in str(e).lower() or 'safety' in str(e).lower():
-                    raise
-                # Otherwise, log and continue with empty string
-                print(f"Warning: Could not extract text from response: {str(e)}")
-                detected_items_text = ""
-            
-            # If we still have no text, the response might be empty or blocked
-            if not detected_items_text:
-                # Check if response indicates blocking
-                candidates = getattr(response, 'candidates', None)
-                if candidates and len(candidates) > 0:
-                    try:
-                        candidate = candidates[0]
-                        if hasattr(candidate, 'finish_reason'):
-                            finish_reason = str(getattr(candidate, 'finish_reason', '')).upper()
-                            if 'SAFETY' in finish_reason or 'BLOCK' in finish_reason:
-                                raise Exception("Content was blocked by safety filters. Please try a different image.")
-                    except (IndexError, AttributeError, TypeError):
-                        pass
-                # If no blocking but also no text, it's an empty response
-                print("Warning: Received empty response from Gemini API")
-            
-            # Validate that we got a substantial response
-            if detected_items_text and len(detected_items_text.strip()) < 100:
-                # If response is too short, request a bit more detail
-                enhanced_prompt = """Could you take another look at this image? Try to spot anything that might match - be GENEROUS and don't be too strict:
+
+STRUCTURED_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "detected_items": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "suggestions": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": ["detected_items", "suggestions"],
+}
+
+@functools.lru_cache(maxsize=4)
+def build_structured_prompt(catalogue):
+    """Build the single-call prompt that asks Gemini for JSON output"""
+    return f"""Take a look at this image and identify items related to performative male culture. Here's what to look for:
+
+Characteristics to check for:
+{catalogue.characteristics_list}
+
+What to do:
+- Check clothing, books, beverages, bags, accessories, the environment, and other objects
+- Be GENEROUS and INTERPRET BROADLY - when in doubt, include an item rather than excluding it
+- Describe each item briefly in a natural, casual way, mentioning the words that make it match
+
+Respond with JSON only, in exactly this shape:
+{{"detected_items": ["one entry per matching item"], "suggestions": ["casual, friendly ideas for items that could boost the score"]}}"""
+
+@functools.lru_cache(maxsize=4)
+def build_compact_prompt(catalogue):
+    """Build the short prompt: category ids and descriptions only, no suggestions section"""
+    return f"""List the items in this image that match these categories (category id: description):
+{catalogue.compact_list}
+
+Be generous: include anything that plausibly matches. Write one line per item, as
+<category id>: <what you see, in a few words>
+and nothing else. If nothing matches, write: none"""
+
+def build_prompt(catalogue, mode):
+    """The prompt for an analysis mode (built once per catalogue version)"""
+    if mode == 'structured':
+        return build_structured_prompt(catalogue)
+    if mode == 'compact':
+        return build_compact_prompt(catalogue)
+    return build_analysis_prompt(catalogue)
+
+def choose_analysis_mode():
+    """The analysis mode for one request: ANALYSIS_MODE, or drawn by ANALYSIS_MODE_WEIGHTS"""
+    if ANALYSIS_MODE_WEIGHTS:
+        modes = list(ANALYSIS_MODE_WEIGHTS)
+        return random.choices(modes, weights=[ANALYSIS_MODE_WEIGHTS[mode] for mode in modes])[0]
+    return ANALYSIS_MODE
+
+def gemini_error_to_analysis_error(e):
+    """Map an exception from the Gemini call to a user-facing AnalysisError"""
+    if isinstance(e, SchedulerTimeout):
+        # Our own rate limiter gave up queueing; not an upstream failure worth a traceback
+        GEMINI_FAILURES.inc(kind='queue_timeout')
+        print(f"Gemini call rejected by the scheduler: {str(e)}")
+        return AnalysisError(str(e), 429)
+    if isinstance(e, DeadlineExceeded):
+        GEMINI_FAILURES.inc(kind='deadline')
+        print(f"Gemini call past its deadline: {str(e)}")
+        return AnalysisError('Gemini took too long to answer. Please try again.', 504)
+    
+    error_msg = str(e)
+    import traceback
+    from google.api_core import exceptions as google_exceptions
+    print(f"Gemini API error: {error_msg}")
+    print(f"Traceback: {traceback.format_exc()}")
+    
+    if 'API_KEY' in error_msg or 'api key' in error_msg.lower():
+        GEMINI_FAILURES.inc(kind='api_key')
+        return AnalysisError('Invalid Gemini API key. Please check your GEMINI_API_KEY.', 500)
+    elif 'quota' in error_msg.lower() or 'rate limit' in error_msg.lower() or isinstance(e, google_exceptions.TooManyRequests):
+        GEMINI_FAILURES.inc(kind='quota')
+        return AnalysisError('API quota exceeded or rate limit reached. Please try again later.', 429)
+    elif 'safety' in error_msg.lower() or 'blocked' in error_msg.lower() or 'content policy' in error_msg.lower():
+        GEMINI_FAILURES.inc(kind='safety_block')
+        return AnalysisError('Image content was blocked by safety filters. Please try a different image.', 400)
+    elif 'index out of range' in error_msg.lower():
+        GEMINI_FAILURES.inc(kind='other')
+        return AnalysisError('Unable to process image response. The image may have been blocked or the response format was unexpected. Please try a different image.', 500)
+    else:
+        GEMINI_FAILURES.inc(kind='other')
+        return AnalysisError(f'Gemini API error: {error_msg}', 500)
+
+ENHANCED_PROMPT = """Could you take another look at this image? Try to spot anything that might match - be GENEROUS and don't be too strict:
 - Clothing items (any trendy, baggy, or vintage-looking pieces)
 - Books or reading materials (any books, especially if they look literary or feminist)
 - Beverages or drinks (coffee, tea, matcha, or any cafe-style drinks)
@@ -453,200 +586,1627 @@ Remember: When in doubt, include it! Be generous and relaxed in your detection."
 - Any decorative items, plants, or other objects (be lenient - if it could fit the vibe, include it)
 
 Just list what you see - remember to be generous and not too strict with your interpretation!"""
-                
+
+def get_generation_settings():
+    """Return the (generation_config, safety_settings) used for every Gemini call
+
+    safety_settings is a function returning them: the enums live in the Gemini
+    client library, which is only imported when the first model is built.
+    """
+    # Use generation config for more relaxed, flexible analysis
+    # Dictionary format works with Gemini API
+    generation_config = {
+        "temperature": 0.8,  # Higher temperature for more relaxed, generous interpretation
+        "top_p": 0.95,
+        "top_k": 40,
+        "max_output_tokens": 2048,  # Allow longer, detailed responses
+    }
+    return generation_config, get_safety_settings
+
+@functools.lru_cache(maxsize=1)
+def get_safety_settings():
+    # Configure safety settings to be more permissive for personal images
+    # Use genai.types.SafetySetting for proper enum values
+    try:
+        from google.generativeai.types import HarmCategory, HarmBlockThreshold
+        safety_settings = [
+            {
+                "category": HarmCategory.HARM_CATEGORY_HARASSMENT,
+                "threshold": HarmBlockThreshold.BLOCK_NONE,
+            },
+            {
+                "category": HarmCategory.HARM_CATEGORY_HATE_SPEECH,
+                "threshold": HarmBlockThreshold.BLOCK_NONE,
+            },
+            {
+                "category": HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
+                "threshold": HarmBlockThreshold.BLOCK_ONLY_HIGH,
+            },
+            {
+                "category": HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
+                "threshold": HarmBlockThreshold.BLOCK_NONE,
+            },
+        ]
+    except ImportError:
+        # Fallback to string format if enums not available
+        safety_settings = [
+            {
+                "category": "HARM_CATEGORY_HARASSMENT",
+                "threshold": "BLOCK_NONE"
+            },
+            {
+                "category": "HARM_CATEGORY_HATE_SPEECH",
+                "threshold": "BLOCK_NONE"
+            },
+            {
+                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                "threshold": "BLOCK_ONLY_HIGH"
+            },
+            {
+                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+                "threshold": "BLOCK_NONE"
+            }
+        ]
+    return safety_settings
+
+def extract_response_text(response):
+    """Safely extract the text of a Gemini response, raising if it was blocked"""
+    # Check if content was blocked
+    if hasattr(response, 'prompt_feedback') and response.prompt_feedback:
+        if hasattr(response.prompt_feedback, 'block_reason') and response.prompt_feedback.block_reason:
+            raise Exception(f"Content blocked: {response.prompt_feedback.block_reason}")
+    
+    # Safely extract text from response
+    detected_items_text = ""
+    try:
+        # First try the simple .text property
+        if hasattr(response, 'text'):
+            try:
+                detected_items_text = response.text or ""
+            except Exception:
+                pass
+        
+        # If .text didn't work, try accessing through candidates
+        if not detected_items_text and hasattr(response, 'candidates'):
+            candidates = getattr(response, 'candidates', [])
+            if candidates and len(candidates) > 0:
                 try:
-                    enhanced_response = model.generate_content(
-                        [enhanced_prompt, image],
-                        generation_config=generation_config,
-                        safety_settings=safety_settings
-                    )
-                    # Safely extract text from enhanced response
-                    enhanced_text = ""
-                    try:
-                        if hasattr(enhanced_response, 'text') and enhanced_response.text:
-                            enhanced_text = enhanced_response.text
-                        elif hasattr(enhanced_response, 'candidates') and enhanced_response.candidates:
-                            if len(enhanced_response.candidates) > 0:
-                                candidate = enhanced_response.candidates[0]
-                                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
-                                    if len(candidate.content.parts) > 0:
-                                        if hasattr(candidate.content.parts[0], 'text'):
-                                            enhanced_text = candidate.content.parts[0].text
-                    except (IndexError, AttributeError, KeyError):
-                        pass
+                    candidate = candidates[0]
+                    # Check if content was blocked in candidate
+                    if hasattr(candidate, 'finish_reason'):
+                        finish_reason = getattr(candidate, 'finish_reason', None)
+                        if finish_reason and 'SAFETY' in str(finish_reason).upper():
+                            raise Exception("Content was blocked by safety filters")
                     
-                    if enhanced_text and len(enhanced_text.strip()) > len(detected_items_text.strip()):
-                        detected_items_text = enhanced_text
-                except Exception as enh_error:
-                    # If enhanced analysis fails, continue with original response
-                    print(f"Enhanced analysis failed: {str(enh_error)}")
-                    pass
-        except Exception as e:
-            error_msg = str(e)
-            import traceback
-            print(f"Gemini API error: {error_msg}")
-            print(f"Traceback: {traceback.format_exc()}")
-            
-            if 'API_KEY' in error_msg or 'api key' in error_msg.lower():
-                return jsonify({'error': 'Invalid Gemini API key. Please check your GEMINI_API_KEY.'}), 500
-            elif 'quota' in error_msg.lower() or 'rate limit' in error_msg.lower():
-                return jsonify({'error': 'API quota exceeded or rate limit reached. Please try again later.'}), 429
-            elif 'safety' in error_msg.lower() or 'blocked' in error_msg.lower() or 'content policy' in error_msg.lower():
-                return jsonify({'error': 'Image content was blocked by safety filters. Please try a different image.'}), 400
-            elif 'index out of range' in error_msg.lower():
-                return jsonify({'error': 'Unable to process image response. The image may have been blocked or the response format was unexpected. Please try a different image.'}), 500
-            else:
-                return jsonify({'error': f'Gemini API error: {error_msg}'}), 500
+                    # Try to get text from candidate
+                    if hasattr(candidate, 'content'):
+                        content = getattr(candidate, 'content', None)
+                        if content and hasattr(content, 'parts'):
+                            parts = getattr(content, 'parts', [])
+                            if parts and len(parts) > 0:
+                                part = parts[0]
+                                if hasattr(part, 'text'):
+                                    detected_items_text = getattr(part, 'text', '') or ""
+                except (IndexError, AttributeError, KeyError, TypeError) as e:
+                    print(f"Warning: Could not extract text from candidate: {str(e)}")
         
-        # Parse response into detected items and improvement suggestions
-        detected_items = []
-        improvement_suggestions = []
+        # Last resort: try direct parts access
+        if not detected_items_text and hasattr(response, 'parts'):
+            parts = getattr(response, 'parts', [])
+            if parts and len(parts) > 0:
+                try:
+                    part = parts[0]
+                    if hasattr(part, 'text'):
+                        detected_items_text = getattr(part, 'text', '') or ""
+                except (IndexError, AttributeError, KeyError, TypeError):
+                    pass
+                    
+    except Exception as e:
+        # If we hit a blocking error, re-raise it
+        if 'blocked' in str(e).lower() or 'safety' in str(e).lower():
+            raise
+        # Otherwise, log and continue with empty string
+        print(f"Warning: Could not extract text from response: {str(e)}")
+        detected_items_text = ""
+    
+    # If we still have no text, the response might be empty or blocked
+    if not detected_items_text:
+        # Check if response indicates blocking
+        candidates = getattr(response, 'candidates', None)
+        if candidates and len(candidates) > 0:
+            try:
+                candidate = candidates[0]
+                if hasattr(candidate, 'finish_reason'):
+                    finish_reason = str(getattr(candidate, 'finish_reason', '')).upper()
+                    if 'SAFETY' in finish_reason or 'BLOCK' in finish_reason:
+                        raise Exception("Content was blocked by safety filters. Please try a different image.")
+            except (IndexError, AttributeError, TypeError):
+                pass
+        # If no blocking but also no text, it's an empty response
+        print("Warning: Received empty response from Gemini API")
+    
+    return detected_items_text
+
+def extract_enhanced_text(response):
+    """Extract the text of the follow-up "enhanced" response, ignoring failures"""
+    enhanced_text = ""
+    try:
+        if hasattr(response, 'text') and response.text:
+            enhanced_text = response.text
+        elif hasattr(response, 'candidates') and response.candidates:
+            if len(response.candidates) > 0:
+                candidate = response.candidates[0]
+                if hasattr(candidate, 'content') and hasattr(candidate.content, 'parts'):
+                    if len(candidate.content.parts) > 0:
+                        if hasattr(candidate.content.parts[0], 'text'):
+                            enhanced_text = candidate.content.parts[0].text
+    except (IndexError, AttributeError, KeyError):
+        pass
+    return enhanced_text
+
+def needs_enhanced_analysis(detected_items_text):
+    """Whether the first response is too short and worth a second, more detailed pass"""
+    return bool(detected_items_text) and len(detected_items_text.strip()) < 100
+
+def structured_generation_config(generation_config):
+    """Generation config for structured mode: JSON output, schema-constrained when supported"""
+    config = dict(generation_config)
+    # Older client libraries don't know these fields; the prompt asks for JSON either way
+    if supports_generation_field('response_mime_type'):
+        config['response_mime_type'] = 'application/json'
+    if supports_generation_field('response_schema'):
+        config['response_schema'] = STRUCTURED_RESPONSE_SCHEMA
+    return config
+
+def compact_generation_config(generation_config):
+    """Generation config for compact mode: the answer is a short list, so cap it tighter"""
+    config = dict(generation_config)
+    config['max_output_tokens'] = min(config.get('max_output_tokens', COMPACT_MAX_OUTPUT_TOKENS), COMPACT_MAX_OUTPUT_TOKENS)
+    return config
+
+def build_model_registry():
+    """Create every configured model variant once, with prebuilt configs"""
+    generation_config, safety_settings = get_generation_settings()
+    # Per-model generation config overrides, e.g. {"gemini-2.5-flash-lite": {"temperature": 0.6}}
+    overrides = json.loads(os.getenv('GEMINI_MODEL_CONFIG', '{}'))
+    # Weighted traffic split, e.g. "gemini-2.5-flash=9,gemini-2.5-flash-lite=1"
+    weights = {}
+    for pair in filter(None, os.getenv('GEMINI_MODEL_WEIGHTS', '').split(',')):
+        name, _, weight = pair.partition('=')
+        weights[name.strip()] = float(weight or 1)
+    
+    names = [GEMINI_MODEL_NAME]
+    for name in os.getenv('GEMINI_MODELS', '').split(',') + list(weights) + [GEMINI_HEDGE_MODEL]:
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    
+    registry = ModelRegistry(GEMINI_MODEL_NAME, api_key=api_key)
+    for name in names:
+        model_config = {**generation_config, **overrides.get(name, {})}
+        registry.register(
+            name,
+            model_config,
+            safety_settings,
+            weight=weights.get(name, 0),
+            structured_generation_config=functools.partial(structured_generation_config, model_config),
+            compact_generation_config=compact_generation_config(model_config)
+        )
+    return registry
+
+model_registry = build_model_registry()
+
+def get_model_entry(model_name=None):
+    """Look up a registered model variant by name, or route to one by weight"""
+    try:
+        return model_registry.get(model_name)
+    except KeyError:
+        raise AnalysisError(f"Unknown model '{model_name}'. Available models: {', '.join(model_registry.names)}", 400)
+
+@contextmanager
+def gemini_call(model_entry, call):
+    """Time one Gemini call, tagged by purpose: first, fallback, enhanced, structured or stream"""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    except asyncio.CancelledError:
+        # Past its deadline, or a hedged call that lost the race
+        outcome = 'cancelled'
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        GEMINI_CALL_SECONDS.observe(seconds, model=model_entry.name, call=call, outcome=outcome)
+        add_request_timing(f'gemini_{call}', seconds)
+        if outcome == 'ok':
+            gemini_latencies.observe((model_entry.name, call), seconds)
+
+def estimate_prompt_tokens(contents):
+    """Rough prompt token count of a call: about four characters per token, plus each image"""
+    return sum(len(part) // 4 if isinstance(part, str) else IMAGE_TOKENS for part in contents)
+
+def estimate_call_tokens(contents):
+    """Rough tokens-per-minute cost of a call: prompt text, images and a typical answer"""
+    return estimate_prompt_tokens(contents) + GEMINI_OUTPUT_TOKENS_ESTIMATE
+
+def response_usage(response, contents, text=None):
+    """(prompt tokens, output tokens) billed for a response
+
+    Read from the response's usage metadata; client libraries too old to
+    report it get an estimate from the prompt and the response text.
+    """
+    usage = getattr(response, 'usage_metadata', None)
+    prompt_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+    if prompt_tokens:
+        return prompt_tokens, getattr(usage, 'candidates_token_count', 0) or 0
+    if text is None:
+        try:
+            text = response.text or ''
+        except Exception:
+            # Blocked responses have no text
+            text = ''
+    return estimate_prompt_tokens(contents), len(text) // 4
+
+def record_usage(model_entry, call, prompt_tokens, output_tokens):
+    """Count a call's tokens, both in total and against the current request"""
+    GEMINI_TOKENS.inc(prompt_tokens, model=model_entry.name, call=call, kind='prompt')
+    GEMINI_TOKENS.inc(output_tokens, model=model_entry.name, call=call, kind='output')
+    add_request_tokens(prompt_tokens, output_tokens)
+
+def coalescing_key(model_entry, contents, call, attempts_left=1):
+    """Identical calls (same image bytes, prompt, model and variant) share one upstream request
+
+    Attempts are keyed apart, so a retry after a timed-out call doesn't wait on that same call.
+    """
+    parts = [image_digest(part['data']) if isinstance(part, dict) else part for part in contents]
+    return make_cache_key(model_entry.name, call, attempts_left, *parts)
+
+@functools.lru_cache(maxsize=None)
+def accepts_request_options(model_type):
+    """Newer client libraries take a per-call timeout in request_options; 0.3.x doesn't"""
+    try:
+        return 'request_options' in inspect.signature(model_type.generate_content).parameters
+    except (TypeError, ValueError):
+        return False
+
+def request_options(model, timeout):
+    """Keyword arguments passing a call's timeout on to the client library, where it takes one"""
+    if timeout is None or not accepts_request_options(type(model)):
+        return {}
+    return {'request_options': {'timeout': timeout}}
+
+def queue_timeout(timeout):
+    """How long a call with timeout seconds left may wait in the scheduler (None = its default)"""
+    return None if timeout is None else min(gemini_scheduler.queue_timeout, timeout)
+
+# The model of a registry entry each hedged call uses, to send the hedge to the same variant
+HEDGED_CALLS = {'first': 'model', 'structured': 'structured_model', 'compact': 'compact_model'}
+
+def plan_hedge(model_entry, call, timeout):
+    """(hedge model entry, seconds to wait before hedging), or (None, None) not to hedge the call
+
+    Hedging starts once the model has enough recent latencies for a percentile,
+    and only if the hedge would still have time to answer.
+    """
+    if not GEMINI_HEDGE_MODEL or call not in HEDGED_CALLS:
+        return None, None
+    hedge_after = gemini_latencies.percentile((model_entry.name, call), GEMINI_HEDGE_PERCENTILE)
+    if hedge_after is None:
+        return None, None
+    hedge_after = max(hedge_after, GEMINI_HEDGE_MIN_DELAY)
+    if timeout is not None and hedge_after >= timeout:
+        return None, None
+    return model_registry.get(GEMINI_HEDGE_MODEL), hedge_after
+
+def send_generate(model_entry, model, contents, call, timeout, attempts_left):
+    """One generate_content call through the scheduler"""
+    def send():
+        with gemini_call(model_entry, call):
+            response = model.generate_content(contents, **request_options(model, timeout))
+        # Counted here, once per upstream call, even when coalesced callers share the response
+        record_usage(model_entry, call, *response_usage(response, contents))
+        return response
+    return gemini_scheduler.submit(send, key=coalescing_key(model_entry, contents, call, attempts_left),
+                                   tokens=estimate_call_tokens(contents), timeout=queue_timeout(timeout))
+
+def generate(model_entry, model, contents, call, attempts_left=1):
+    """Send one generate_content call through the scheduler, timed and tagged by call
+
+    The call gets its share of the analysis deadline, with attempts_left calls
+    (this one included) still to fit in it, and raises DeadlineExceeded past
+    it. Hedged calls that are slow are raced against GEMINI_HEDGE_MODEL.
+    """
+    timeout = attempt_budget(attempts_left)
+    primary = functools.partial(send_generate, model_entry, model, contents, call, timeout, attempts_left)
+    hedge_entry, hedge_after = plan_hedge(model_entry, call, timeout)
+    if hedge_entry is None:
+        return call_with_timeout(gemini_executor, primary, timeout)
+    hedge = functools.partial(send_generate, hedge_entry, getattr(hedge_entry, HEDGED_CALLS[call]), contents, call,
+                              timeout, attempts_left)
+    response, winner = hedged(gemini_executor, primary, hedge, hedge_after, timeout)
+    if winner is not None:
+        GEMINI_HEDGES.inc(call=call, winner=winner)
+    return response
+
+async def send_generate_async(model_entry, model, contents, call, timeout, attempts_left):
+    """Async variant of send_generate"""
+    async def send():
+        with gemini_call(model_entry, call):
+            response = await model.generate_content_async(contents, **request_options(model, timeout))
+        record_usage(model_entry, call, *response_usage(response, contents))
+        return response
+    return await gemini_scheduler.submit_async(send, key=coalescing_key(model_entry, contents, call, attempts_left),
+                                               tokens=estimate_call_tokens(contents), timeout=queue_timeout(timeout))
+
+async def generate_async(model_entry, model, contents, call, attempts_left=1):
+    """Async variant of generate; calls past their budget are cancelled"""
+    timeout = attempt_budget(attempts_left)
+    primary = functools.partial(send_generate_async, model_entry, model, contents, call, timeout, attempts_left)
+    hedge_entry, hedge_after = plan_hedge(model_entry, call, timeout)
+    if hedge_entry is None:
+        return await wait_for_deadline(primary(), timeout)
+    hedge = functools.partial(send_generate_async, hedge_entry, getattr(hedge_entry, HEDGED_CALLS[call]), contents,
+                              call, timeout, attempts_left)
+    response, winner = await hedged_async(primary, hedge, hedge_after, timeout)
+    if winner is not None:
+        GEMINI_HEDGES.inc(call=call, winner=winner)
+    return response
+
+def extract_text_timed(response):
+    """extract_response_text, recorded as the extract_text stage"""
+    with timed_stage(STAGE_SECONDS, 'extract_text'):
+        return extract_response_text(response)
+
+def enhance_analysis_text(detected_items_text, image, model_entry):
+    """Ask for a more detailed second pass if the first response is too short"""
+    # Validate that we got a substantial response
+    if needs_enhanced_analysis(detected_items_text):
+        # If response is too short, request a bit more detail
+        try:
+            enhanced_response = generate(model_entry, model_entry.model, [ENHANCED_PROMPT, image], 'enhanced')
+            enhanced_text = extract_enhanced_text(enhanced_response)
+            if enhanced_text and len(enhanced_text.strip()) > len(detected_items_text.strip()):
+                detected_items_text = enhanced_text
+        except Exception as enh_error:
+            # If enhanced analysis fails, continue with original response
+            print(f"Enhanced analysis failed: {str(enh_error)}")
+    return detected_items_text
+
+def request_analysis_text(prompt, image, model_entry):
+    """Send the prompt and image to Gemini and return the raw response text"""
+    # The registry's models carry the generation config and safety settings already
+    try:
+        try:
+            response = generate(model_entry, model_entry.model, [prompt, image], 'first', attempts_left=2)
+        except Exception as gen_error:
+            # If generation fails, try without safety settings override
+            try:
+                response = generate(model_entry, model_entry.fallback_model, [prompt, image], 'fallback')
+            except:
+                raise gen_error
         
-        # Find the split point between detected items and suggestions
-        lines = detected_items_text.split('\n')
-        items_end_index = len(lines)
-        suggestion_keywords = ['improvement', 'suggestions', 'to improve', 'could be added', 'missing', 'section 2']
+        detected_items_text = enhance_analysis_text(extract_text_timed(response), image, model_entry)
+    except AnalysisError:
+        raise
+    except Exception as e:
+        raise gemini_error_to_analysis_error(e)
+    
+    return detected_items_text
+
+async def request_analysis_text_async(prompt, image, model_entry):
+    """Async variant of request_analysis_text built on generate_content_async"""
+    try:
+        try:
+            response = await generate_async(model_entry, model_entry.model, [prompt, image], 'first', attempts_left=2)
+        except Exception as gen_error:
+            # If generation fails, try without safety settings override
+            try:
+                response = await generate_async(model_entry, model_entry.fallback_model, [prompt, image], 'fallback')
+            except:
+                raise gen_error
         
-        # Find where suggestions section starts
-        for i, line in enumerate(lines):
-            line_lower = line.lower()
-            if any(keyword in line_lower for keyword in suggestion_keywords):
-                # Check if this line actually starts suggestions (not just mentions the word)
-                if 'section' in line_lower or 'improve' in line_lower or 'suggestions' in line_lower:
-                    items_end_index = i
-                    break
+        detected_items_text = extract_text_timed(response)
         
-        # Parse detected items (everything before suggestions)
-        items_section = '\n'.join(lines[:items_end_index])
-        for line in items_section.split('\n'):
-            line = line.strip()
-            if line and not any(keyword in line.lower() for keyword in ['section', 'detected items', 'format', 'example', 'instructions']):
-                # Remove bullet points, dashes, numbers, etc.
-                cleaned_line = line
-                if cleaned_line.startswith('-') or cleaned_line.startswith('•') or cleaned_line.startswith('*'):
-                    cleaned_line = cleaned_line[1:].strip()
-                # Remove numbered lists (safely check string length first)
-                if cleaned_line and len(cleaned_line) > 0 and cleaned_line[0].isdigit() and ('.' in cleaned_line[:3] or ')' in cleaned_line[:3]):
+        if needs_enhanced_analysis(detected_items_text):
+            try:
+                enhanced_response = await generate_async(model_entry, model_entry.model, [ENHANCED_PROMPT, image], 'enhanced')
+                enhanced_text = extract_enhanced_text(enhanced_response)
+                if enhanced_text and len(enhanced_text.strip()) > len(detected_items_text.strip()):
+                    detected_items_text = enhanced_text
+            except Exception as enh_error:
+                print(f"Enhanced analysis failed: {str(enh_error)}")
+    except AnalysisError:
+        raise
+    except Exception as e:
+        raise gemini_error_to_analysis_error(e)
+    
+    return detected_items_text
+
+def stream_chunk_text(chunk):
+    """Text of one streamed response chunk; raises if the content was blocked"""
+    try:
+        return chunk.text or ""
+    except ValueError:
+        # No text parts: extract_response_text raises if the chunk was blocked
+        return extract_response_text(chunk)
+
+def start_stream(model, contents, attempts_left=1):
+    """Start a streamed generate_content call within its share of the deadline"""
+    timeout = attempt_budget(attempts_left)
+    # Streams can't be shared, so they are rate limited but never coalesced
+    send = functools.partial(gemini_scheduler.submit,
+                             lambda: model.generate_content(contents, stream=True, **request_options(model, timeout)),
+                             tokens=estimate_call_tokens(contents), timeout=queue_timeout(timeout))
+    return call_with_timeout(gemini_executor, send, timeout)
+
+def stream_analysis_text(prompt, image, model_entry, deadline=None):
+    """Yield the Gemini response text chunk by chunk as it is generated
+
+    deadline (time.monotonic()) bounds the time to the first chunk and is
+    checked again after every chunk.
+    """
+    try:
+        with gemini_call(model_entry, 'stream'):
+            # Not a deadline_scope across the yields: the caller may resume the generator in another context
+            with deadline_scope(None if deadline is None else deadline - time.monotonic()):
+                try:
+                    response = start_stream(model_entry.model, [prompt, image], attempts_left=2)
+                except Exception as gen_error:
+                    # If generation fails, try without safety settings override
                     try:
-                        parts = cleaned_line.split('.', 1) if '.' in cleaned_line[:3] else cleaned_line.split(')', 1)
-                        if len(parts) > 1:
-                            cleaned_line = parts[1].strip()
-                    except (IndexError, ValueError):
-                        # If splitting fails, just use the original line
-                        pass
-                if cleaned_line and len(cleaned_line) > 2:
-                    detected_items.append(cleaned_line)
-        
-        # Parse improvement suggestions (everything after the split point)
-        suggestions_section = '\n'.join(lines[items_end_index:])
-        for line in suggestions_section.split('\n'):
-            line = line.strip()
-            # Skip header lines
-            if any(keyword in line.lower() for keyword in ['section', 'format', 'example', 'instructions']):
+                        response = start_stream(model_entry.fallback_model, [prompt, image])
+                    except:
+                        raise gen_error
+            chunk = None
+            chunks = []
+            for chunk in response:
+                if deadline is not None and time.monotonic() > deadline:
+                    raise DeadlineExceeded('The streamed answer did not finish in time')
+                text = stream_chunk_text(chunk)
+                if text:
+                    chunks.append(text)
+                    yield text
+            # The last chunk carries the usage of the whole stream
+            record_usage(model_entry, 'stream', *response_usage(chunk, [prompt, image], ''.join(chunks)))
+    except AnalysisError:
+        raise
+    except Exception as e:
+        raise gemini_error_to_analysis_error(e)
+
+@functools.lru_cache(maxsize=1)
+def retryable_errors():
+    """Errors that can succeed if the same call is simply made again"""
+    from google.api_core import exceptions as google_exceptions
+    return (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.TooManyRequests,
+        ConnectionError,
+        TimeoutError,
+    )
+
+def is_retryable_error(e):
+    """Classify a Gemini error: transient (worth retrying) or permanent"""
+    return isinstance(e, retryable_errors())
+
+def retry_delay(attempt):
+    """Exponential backoff with jitter for the given (1-based) failed attempt"""
+    return RETRY_BASE_DELAY * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+
+def retry_fits(e, attempt, max_attempts, delay):
+    """Whether a failed attempt is worth retrying after delay seconds, within the deadline"""
+    if attempt == max_attempts or not is_retryable_error(e):
+        return False
+    left = remaining()
+    return left is None or left > delay
+
+def call_with_retries(call, max_attempts=None):
+    """Call a Gemini request, retrying only transient errors
+
+    call(attempts_left) is told how many attempts, itself included, may still
+    have to share the deadline.
+    """
+    max_attempts = max_attempts or STRUCTURED_MAX_ATTEMPTS
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return call(max_attempts - attempt + 1)
+        except Exception as e:
+            delay = retry_delay(attempt)
+            if not retry_fits(e, attempt, max_attempts, delay):
+                raise
+            GEMINI_RETRIES.inc(error=type(e).__name__)
+            print(f"Retrying Gemini call after {type(e).__name__} (attempt {attempt} of {max_attempts})")
+            time.sleep(delay)
+
+async def call_with_retries_async(call, max_attempts=None):
+    """Async variant of call_with_retries; call returns an awaitable"""
+    max_attempts = max_attempts or STRUCTURED_MAX_ATTEMPTS
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return await call(max_attempts - attempt + 1)
+        except Exception as e:
+            delay = retry_delay(attempt)
+            if not retry_fits(e, attempt, max_attempts, delay):
+                raise
+            GEMINI_RETRIES.inc(error=type(e).__name__)
+            print(f"Retrying Gemini call after {type(e).__name__} (attempt {attempt} of {max_attempts})")
+            await asyncio.sleep(delay)
+
+def request_structured_text(prompt, image, model_entry):
+    """Single-call structured analysis: one upload, JSON back, transient errors retried"""
+    try:
+        response = call_with_retries(
+            lambda attempts_left: generate(model_entry, model_entry.structured_model, [prompt, image], 'structured', attempts_left))
+        return extract_text_timed(response)
+    except AnalysisError:
+        raise
+    except Exception as e:
+        raise gemini_error_to_analysis_error(e)
+
+async def request_structured_text_async(prompt, image, model_entry):
+    """Async variant of request_structured_text"""
+    try:
+        response = await call_with_retries_async(
+            lambda attempts_left: generate_async(model_entry, model_entry.structured_model, [prompt, image], 'structured', attempts_left))
+        return extract_text_timed(response)
+    except AnalysisError:
+        raise
+    except Exception as e:
+        raise gemini_error_to_analysis_error(e)
+
+def request_compact_text(prompt, image, model_entry):
+    """Single-call compact analysis: short prompt, short answer, transient errors retried"""
+    try:
+        response = call_with_retries(
+            lambda attempts_left: generate(model_entry, model_entry.compact_model, [prompt, image], 'compact', attempts_left))
+        return extract_text_timed(response)
+    except AnalysisError:
+        raise
+    except Exception as e:
+        raise gemini_error_to_analysis_error(e)
+
+async def request_compact_text_async(prompt, image, model_entry):
+    """Async variant of request_compact_text"""
+    try:
+        response = await call_with_retries_async(
+            lambda attempts_left: generate_async(model_entry, model_entry.compact_model, [prompt, image], 'compact', attempts_left))
+        return extract_text_timed(response)
+    except AnalysisError:
+        raise
+    except Exception as e:
+        raise gemini_error_to_analysis_error(e)
+
+def request_text(mode, prompt, image, model_entry):
+    """Send the prompt and image to Gemini the way the analysis mode does, returning the text
+
+    All the calls it makes share one REQUEST_DEADLINE.
+    """
+    with deadline_scope(REQUEST_DEADLINE or None):
+        if mode == 'structured':
+            return request_structured_text(prompt, image, model_entry)
+        if mode == 'compact':
+            return request_compact_text(prompt, image, model_entry)
+        return request_analysis_text(prompt, image, model_entry)
+
+async def request_text_async(mode, prompt, image, model_entry):
+    """Async variant of request_text"""
+    with deadline_scope(REQUEST_DEADLINE or None):
+        if mode == 'structured':
+            return await request_structured_text_async(prompt, image, model_entry)
+        if mode == 'compact':
+            return await request_compact_text_async(prompt, image, model_entry)
+        return await request_analysis_text_async(prompt, image, model_entry)
+
+def parse_structured_text(detected_items_text):
+    """Parse a structured (JSON) response into detected items and AI suggestions"""
+    cleaned = detected_items_text.strip()
+    # Strip a ```json ... ``` fence if the model added one
+    if cleaned.startswith('```'):
+        cleaned = cleaned.split('\n', 1)[1] if '\n' in cleaned else ''
+        cleaned = cleaned.rsplit('```', 1)[0]
+    
+    try:
+        data = json.loads(cleaned)
+        items = data.get('detected_items') or []
+        suggestions = data.get('suggestions') or []
+    except (ValueError, AttributeError):
+        # Not valid JSON - fall back to the free-text parser
+        return parse_analysis_text(detected_items_text)
+    
+    detected_items = [str(item).strip() for item in items if str(item).strip()]
+    improvement_suggestions = [str(sugg).strip() for sugg in suggestions if len(str(sugg).strip()) > 10]
+    return detected_items, improvement_suggestions
+
+def parse_compact_text(detected_items_text, catalogue):
+    """Parse a compact response ("category_id: description" lines) into detected items
+
+    Compact answers carry no suggestions. An item whose description doesn't
+    mention any of its category's keywords gets the first one appended (e.g.
+    "iced green drink (matcha)"), so it scores under the category Gemini chose.
+    """
+    detected_items = []
+    for line in detected_items_text.split('\n'):
+        line = strip_list_marker(line.strip())
+        category, _, description = line.partition(':')
+        category = category.strip().strip('`*').lower()
+        description = description.strip()
+        if category in catalogue.characteristics and description:
+            if category not in catalogue.matcher.match_categories([description]):
+                description = f"{description} ({catalogue.characteristics[category]['items'][0]})"
+            detected_items.append(description)
+        elif len(line) > 2 and line.lower().rstrip('.') != 'none':
+            # Not in the requested format; keep it for keyword matching like a free-text item
+            detected_items.append(line)
+    return detected_items, []
+
+SUGGESTION_KEYWORDS = ['improvement', 'suggestions', 'to improve', 'could be added', 'missing', 'section 2']
+ITEM_HEADER_KEYWORDS = ['section', 'detected items', 'format', 'example', 'instructions']
+
+def strip_list_marker(line):
+    """Remove a leading bullet (-, •, *) or list number (1. / 1)) from a line"""
+    cleaned_line = line
+    if cleaned_line.startswith('-') or cleaned_line.startswith('•') or cleaned_line.startswith('*'):
+        cleaned_line = cleaned_line[1:].strip()
+    # Remove numbered lists (safely check string length first)
+    if cleaned_line and len(cleaned_line) > 0 and cleaned_line[0].isdigit() and ('.' in cleaned_line[:3] or ')' in cleaned_line[:3]):
+        try:
+            parts = cleaned_line.split('.', 1) if '.' in cleaned_line[:3] else cleaned_line.split(')', 1)
+            if len(parts) > 1:
+                cleaned_line = parts[1].strip()
+        except (IndexError, ValueError):
+            # If splitting fails, just use the original line
+            pass
+    return cleaned_line
+
+def starts_suggestions(line):
+    """Whether a response line is the header that starts the suggestions section"""
+    line_lower = line.lower()
+    if any(keyword in line_lower for keyword in SUGGESTION_KEYWORDS):
+        # Check if this line actually starts suggestions (not just mentions the word)
+        return 'section' in line_lower or 'improve' in line_lower or 'suggestions' in line_lower
+    return False
+
+def parse_item_line(line):
+    """Return the detected item on a line of the items section, or None"""
+    line = line.strip()
+    if line and not any(keyword in line.lower() for keyword in ITEM_HEADER_KEYWORDS):
+        cleaned_line = strip_list_marker(line)
+        if cleaned_line and len(cleaned_line) > 2:
+            return cleaned_line
+    return None
+
+def parse_analysis_text(detected_items_text):
+    """Split the Gemini response into detected items and AI improvement suggestions"""
+    detected_items = []
+    improvement_suggestions = []
+    
+    # Find the split point between detected items and suggestions
+    lines = detected_items_text.split('\n')
+    items_end_index = len(lines)
+    
+    # Find where suggestions section starts
+    for i, line in enumerate(lines):
+        if starts_suggestions(line):
+            items_end_index = i
+            break
+    
+    # Parse detected items (everything before suggestions)
+    items_section = '\n'.join(lines[:items_end_index])
+    for line in items_section.split('\n'):
+        item = parse_item_line(line)
+        if item:
+            detected_items.append(item)
+    
+    # Parse improvement suggestions (everything after the split point)
+    suggestions_section = '\n'.join(lines[items_end_index:])
+    for line in suggestions_section.split('\n'):
+        line = line.strip()
+        # Skip header lines
+        if any(keyword in line.lower() for keyword in ['section', 'format', 'example', 'instructions']):
+            continue
+        if line and (line.startswith('-') or line.startswith('•') or line.startswith('*') or 
+                    any(keyword in line.lower() for keyword in ['add', 'include', 'wear', 'display', 'take'])):
+            cleaned_line = strip_list_marker(line)
+            if cleaned_line and len(cleaned_line) > 10:  # Longer threshold for suggestions
+                improvement_suggestions.append(cleaned_line)
+    
+    # If no items parsed, try splitting by sentences (fallback)
+    if not detected_items:
+        detected_items = [s.strip() for s in items_section.split('.') if s.strip() and len(s.strip()) > 2]
+    
+    return detected_items, improvement_suggestions
+
+class ItemStreamParser:
+    """Picks detected items out of a legacy-format response while it is still streaming
+
+    Only complete lines are parsed, and parsing stops at the suggestions header.
+    The final result is always re-parsed from the full text with parse_analysis_text.
+    """
+    
+    def __init__(self):
+        self.items = []
+        self.in_suggestions = False
+        self._buffer = ""
+    
+    def feed(self, text):
+        """Add streamed text and return the items completed by it"""
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        return self._parse_lines(lines)
+    
+    def close(self):
+        """Parse whatever is left once the stream has ended"""
+        lines, self._buffer = [self._buffer], ""
+        return self._parse_lines(lines)
+    
+    def _parse_lines(self, lines):
+        new_items = []
+        for line in lines:
+            if self.in_suggestions or starts_suggestions(line):
+                self.in_suggestions = True
                 continue
-            if line and (line.startswith('-') or line.startswith('•') or line.startswith('*') or 
-                        any(keyword in line.lower() for keyword in ['add', 'include', 'wear', 'display', 'take'])):
-                # Remove bullet points, dashes, numbers, etc.
-                cleaned_line = line
-                if cleaned_line.startswith('-') or cleaned_line.startswith('•') or cleaned_line.startswith('*'):
-                    cleaned_line = cleaned_line[1:].strip()
-                # Remove numbered lists (safely check string length first)
-                if cleaned_line and len(cleaned_line) > 0 and cleaned_line[0].isdigit() and ('.' in cleaned_line[:3] or ')' in cleaned_line[:3]):
-                    try:
-                        parts = cleaned_line.split('.', 1) if '.' in cleaned_line[:3] else cleaned_line.split(')', 1)
-                        if len(parts) > 1:
-                            cleaned_line = parts[1].strip()
-                    except (IndexError, ValueError):
-                        # If splitting fails, just use the original line
-                        pass
-                if cleaned_line and len(cleaned_line) > 10:  # Longer threshold for suggestions
-                    improvement_suggestions.append(cleaned_line)
-        
-        # If no items parsed, try splitting by sentences (fallback)
-        if not detected_items:
-            detected_items = [s.strip() for s in items_section.split('.') if s.strip() and len(s.strip()) > 2]
-        
-        # If we still have no detected items and no text was extracted, return a helpful message
-        if not detected_items and not detected_items_text:
-            # This should trigger roasts since score will be 0%
-            return jsonify({
-                'percentage': 0,
-                'detected_items': ["No items could be detected from the image. The image may have been blocked or the response was empty."],
-                'detected_categories': [],
-                'category_details': [],
-                'score': 0,
-                'max_score': sum(char["weight"] for char in PERFORMATIVE_CHARACTERISTICS.values()),
-                'improvement_suggestions': generate_improvement_suggestions(set()),
-                'roasts': generate_roasts(0, set(), [])  # Score is 0%, so generate roasts
-            })
-        
-        # Calculate performativeness score
-        percentage, detected_categories, score, max_score = calculate_performativeness_score(detected_items)
+            item = parse_item_line(line)
+            if item:
+                new_items.append(item)
+        self.items.extend(new_items)
+        return new_items
+
+def build_category_details(detected_categories, catalogue):
+    """Name, keywords and weight of each detected category, for display"""
+    category_details = []
+    for category in detected_categories:
+        category_details.append({
+            "name": catalogue.category_names[category],
+            "items": catalogue.characteristics[category]["items"],
+            "weight": catalogue.weight(category)
+        })
+    return category_details
+
+def empty_analysis_result(message, catalogue):
+    """The zero-score response, with message in place of the detected items"""
+    # This should trigger roasts since score will be 0%
+    return {
+        'percentage': 0,
+        'detected_items': [message],
+        'detected_categories': [],
+        'category_details': [],
+        'score': 0,
+        'max_score': catalogue.max_possible_score,
+        'improvement_suggestions': generate_improvement_suggestions(set(), catalogue),
+        'roasts': generate_roasts(0, set(), [], catalogue)  # Score is 0%, so generate roasts
+    }
+
+def build_analysis_result(detected_items, improvement_suggestions, detected_items_text, catalogue=None):
+    """Score the detected items and assemble the JSON-serializable /analyze response"""
+    catalogue = catalogue or get_catalogue()
+    
+    # If we still have no detected items and no text was extracted, return a helpful message
+    if not detected_items and not detected_items_text:
+        return empty_analysis_result(
+            "No items could be detected from the image. The image may have been blocked or the response was empty.",
+            catalogue)
+    
+    # Calculate performativeness score
+    percentage, detected_categories, score, max_score = calculate_performativeness_score(detected_items, catalogue)
+    
+    # Log analysis quality for monitoring
+    if len(detected_items) < 2:
+        print(f"Analysis: Only {len(detected_items)} items detected - image may have limited performative elements")
+    elif len(detected_items) >= 5:
+        print(f"Analysis: Comprehensive scan - {len(detected_items)} items detected")
+    
+    # Always generate improvement suggestions based on missing categories
+    # AI suggestions are nice to have, but we'll use our own as primary source
+    generated_suggestions = generate_improvement_suggestions(detected_categories, catalogue)
+    
+    # Combine AI suggestions with generated ones
+    if improvement_suggestions:
+        # Add AI suggestions that aren't already in generated list
+        for ai_sugg in improvement_suggestions:
+            # Check if similar suggestion already exists
+            is_duplicate = any(
+                ai_sugg.lower() in gen_sugg.lower() or gen_sugg.lower() in ai_sugg.lower()
+                for gen_sugg in generated_suggestions
+            )
+            if not is_duplicate and len(ai_sugg) > 10:
+                generated_suggestions.append(ai_sugg)
+    
+    improvement_suggestions = generated_suggestions
+    
+    # Get category details
+    category_details = build_category_details(detected_categories, catalogue)
+    
+    # Generate roasts if score is below 30%
+    roasts = []
+    if percentage < 30:
+        try:
+            roasts = generate_roasts(percentage, detected_categories, detected_items, catalogue)
+            print(f"✅ Generated {len(roasts)} roasts for score {percentage}%")
+            if len(roasts) == 0:
+                print("⚠️ WARNING: generate_roasts returned empty list!")
+                roasts = ["This score is embarrassingly low. Step up your performative game."]
+        except Exception as e:
+            print(f"❌ Error generating roasts: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            roasts = ["Error generating roasts, but your score is still terrible."]
+    else:
+        print(f"ℹ️ No roasts generated - score {percentage}% is >= 30% (roasts only show for < 30%)")
+    
+    return {
+        'percentage': percentage,
+        'detected_items': detected_items,
+        'detected_categories': list(detected_categories),
+        'category_details': category_details,
+        'score': score,
+        'max_score': max_score,
+        'improvement_suggestions': improvement_suggestions,
+        'roasts': roasts
+    }
+    
+
+def lookup_cached_analysis(image_bytes, catalogue, model_entry, mode=None):
+    """Return (cache_key, prompt, cached entry or None) for an uploaded image"""
+    return lookup_cached_digest(image_digest(image_bytes), catalogue, model_entry, mode)
+
+def lookup_cached_digest(digest, catalogue, model_entry, mode=None):
+    """lookup_cached_analysis for an image known only by its digest"""
+    with timed_stage(STAGE_SECONDS, 'prompt_build'):
+        prompt = build_prompt(catalogue, mode or ANALYSIS_MODE)
+    
+    # Re-uploads and retries of the same photo are answered from the cache; the
+    # catalogue version is part of the key so results never outlive a catalogue change
+    with timed_stage(STAGE_SECONDS, 'cache_lookup'):
+        cache_key = make_cache_key(digest, prompt, model_entry.name, catalogue.version,
+                                   PREPROCESS_MAX_EDGE, PREPROCESS_FORMAT, PREPROCESS_QUALITY)
+        entry = result_cache.get(cache_key)
+    RESULT_CACHE_LOOKUPS.inc(result='miss' if entry is None else 'hit')
+    return cache_key, prompt, entry
+
+def prefilter_result(image_bytes, catalogue):
+    """The zero-score response if the pre-filter finds nothing worth a Gemini call, else None"""
+    if prefilter is None:
+        return None
+    with timed_stage(STAGE_SECONDS, 'prefilter'):
+        reason = prefilter.check(image_bytes)
+    if reason is None:
+        return None
+    PREFILTER_SKIPS.inc(reason=reason)
+    print(f"Pre-filter skipped the Gemini call: {reason}")
+    return empty_analysis_result(f"Nothing to analyze: {PREFILTER_REASONS[reason]}.", catalogue)
+
+def lookup_near_duplicate(image_bytes, cache_key, prompt, catalogue, model_entry):
+    """Return (near_key, cached entry of a near-identical earlier upload or None)
+
+    near_key is passed on to store_analysis so a fresh result gets indexed too.
+    """
+    if not (near_duplicate_index.enabled and result_cache.enabled):
+        return None, None
+    with timed_stage(STAGE_SECONDS, 'perceptual_hash'):
+        try:
+            image_hash = image_dhash(image_bytes)
+        except Exception:
+            # Not an image we can decode; prepare_image reports the error
+            return None, None
+    if image_hash is None:
+        return None, None
+    # Everything besides the image that a reusable result must share
+    namespace = make_cache_key(model_entry.name, prompt, catalogue.version,
+                               PREPROCESS_MAX_EDGE, PREPROCESS_FORMAT, PREPROCESS_QUALITY)
+    entry, distance = near_duplicate_index.lookup(namespace, image_hash,
+                                                  lambda key: result_cache.get(key, record_stats=False))
+    NEAR_DUPLICATE_LOOKUPS.inc(result='miss' if entry is None else 'hit')
+    if entry is not None:
+        print(f"Reusing the result of a near-duplicate image (hash distance {distance})")
+        # The exact bytes are answered from the cache directly next time
+        result_cache.put(cache_key, entry)
+    return (namespace, image_hash), entry
+
+def parse_response_text(detected_items_text, mode, catalogue):
+    """Parse Gemini's answer the way its analysis mode asked for it: (items, AI suggestions)"""
+    if mode == 'structured':
+        return parse_structured_text(detected_items_text)
+    if mode == 'compact':
+        return parse_compact_text(detected_items_text, catalogue)
+    return parse_analysis_text(detected_items_text)
+
+def store_analysis(cache_key, detected_items_text, mode=None, near_key=None, catalogue=None):
+    """Parse the Gemini text and cache it, returning the cached entry"""
+    mode = mode or ANALYSIS_MODE
+    catalogue = catalogue or get_catalogue()
+    with timed_stage(STAGE_SECONDS, 'parse'):
+        detected_items, improvement_suggestions = parse_response_text(detected_items_text, mode, catalogue)
+    # Per-mode detection counts, to compare modes under an ANALYSIS_MODE_WEIGHTS split
+    DETECTED_CATEGORIES.observe(len(catalogue.matcher.match_categories(detected_items)), mode=mode)
+    entry = {
+        'text': detected_items_text,
+        'detected_items': detected_items,
+        'improvement_suggestions': improvement_suggestions
+    }
+    
+    # Empty responses are usually transient (blocked or truncated), so don't cache them
+    if detected_items_text:
+        result_cache.put(cache_key, entry)
+        if near_key is not None:
+            near_duplicate_index.add(*near_key, cache_key)
+    return entry
+
+def finish_analysis(entry, catalogue):
+    """Build the /analyze response for a (possibly cached) analysis entry"""
+    with timed_stage(STAGE_SECONDS, 'score'):
+        return build_analysis_result(entry['detected_items'], entry['improvement_suggestions'], entry['text'], catalogue)
+
+def record_analysis(image_bytes, result, model_entry):
+    """Queue a finished analysis for the persistent store (written in the background)"""
+    if analysis_store is not None:
+        analysis_store.record(image_digest(image_bytes), model_entry.name, result)
+    return result
+
+def analyze_image_bytes(image_bytes, model_name=None):
+    """Run the full analysis pipeline on raw image bytes and return the response dict"""
+    return run_analysis(image_bytes, get_catalogue(), get_model_entry(model_name))
+
+def run_analysis(image_bytes, catalogue, model_entry):
+    """Analyze one image against a given catalogue and model"""
+    mode = choose_analysis_mode()
+    cache_key, prompt, entry = lookup_cached_analysis(image_bytes, catalogue, model_entry, mode)
+    if entry is None:
+        skipped = prefilter_result(image_bytes, catalogue)
+        if skipped is not None:
+            return record_analysis(image_bytes, skipped, model_entry)
+        near_key, entry = lookup_near_duplicate(image_bytes, cache_key, prompt, catalogue, model_entry)
+    if entry is None:
+        # The encoded payload is shared by every Gemini call made for this request
+        image = prepare_image(image_bytes).as_part()
+        detected_items_text = request_text(mode, prompt, image, model_entry)
+        entry = store_analysis(cache_key, detected_items_text, mode, near_key, catalogue)
+    return record_analysis(image_bytes, finish_analysis(entry, catalogue), model_entry)
+
+async def analyze_image_bytes_async(image_bytes, executor=None, model_name=None):
+    """Async variant of analyze_image_bytes; CPU-bound preprocessing runs on executor"""
+    catalogue = get_catalogue()
+    model_entry = get_model_entry(model_name)
+    mode = choose_analysis_mode()
+    cache_key, prompt, entry = lookup_cached_analysis(image_bytes, catalogue, model_entry, mode)
+    loop = asyncio.get_running_loop()
+    if entry is None:
+        # The pre-filter and hashing decode the image, so they run on the executor like preprocessing
+        skipped = await loop.run_in_executor(executor, contextvars.copy_context().run, prefilter_result, image_bytes, catalogue)
+        if skipped is not None:
+            return record_analysis(image_bytes, skipped, model_entry)
+        near_key, entry = await loop.run_in_executor(
+            executor, contextvars.copy_context().run, lookup_near_duplicate, image_bytes, cache_key, prompt, catalogue, model_entry)
+    if entry is None:
+        # Run in a copy of this context so preprocessing stages reach the request's timings
+        prepared = await loop.run_in_executor(executor, contextvars.copy_context().run, prepare_image, image_bytes)
+        detected_items_text = await request_text_async(mode, prompt, prepared.as_part(), model_entry)
+        entry = store_analysis(cache_key, detected_items_text, mode, near_key, catalogue)
+    return record_analysis(image_bytes, finish_analysis(entry, catalogue), model_entry)
+
+async def analyze_prepared_async(digest, image, catalogue, model_entry, mode=None):
+    """Analyze an image preprocessed elsewhere (score_cli.py prepares images on a process pool)
+
+    digest is image_digest() of the original bytes and image the Gemini part of
+    its PreparedImage. Like /analyze, results are cached and recorded in the
+    analysis store; the pre-filter and near-duplicate lookup are skipped, as
+    they need the original bytes.
+    """
+    mode = mode or choose_analysis_mode()
+    cache_key, prompt, entry = lookup_cached_digest(digest, catalogue, model_entry, mode)
+    if entry is None:
+        detected_items_text = await request_text_async(mode, prompt, image, model_entry)
+        entry = store_analysis(cache_key, detected_items_text, mode, None, catalogue)
+    result = finish_analysis(entry, catalogue)
+    if analysis_store is not None:
+        analysis_store.record(digest, model_entry.name, result)
+    return result
+
+def run_job(job):
+    """JobWorkers handler: the /analyze pipeline on a queued image"""
+    JOB_WAIT_SECONDS.observe(time.time() - job['created_at'])
+    try:
+        result = analyze_image_bytes(job['image'], job['model'])
+    except Exception:
+        JOBS.inc(event='failed')
+        raise
+    JOBS.inc(event='completed')
+    return result
+
+job_workers = JobWorkers(job_queue, run_job, workers=JOB_WORKERS)
+
+def compact_batch_record(record, catalogue_version):
+    """A /analyze/batch record in the compact format"""
+    if 'result' in record:
+        return dict(record, result=compact_result(record['result'], catalogue_version))
+    if 'summary' in record:
+        return {'summary': compact_result(record['summary'], catalogue_version)}
+    return record
+
+def aggregate_batch_results(results, catalogue):
+    """Score a photo set as a whole: the union of everything detected across its images"""
+    all_items = [item for result in results for item in result['detected_items']]
+    percentage, detected_categories, score, max_score = calculate_performativeness_score(all_items, catalogue)
+    percentages = [result['percentage'] for result in results]
+    return {
+        'percentage': percentage,
+        'detected_categories': [category for category in catalogue.category_priority if category in detected_categories],
+        'score': score,
+        'max_score': max_score,
+        'mean_image_percentage': round(sum(percentages) / len(percentages), 1) if percentages else 0,
+        'max_image_percentage': max(percentages, default=0),
+    }
+
+def analyze_batch(images, model_entry):
+    """Analyze a batch of images in parallel, yielding one record per image as it finishes
+
+    Identical images are analyzed once and reported for every index they appear
+    at, and images read_batch_upload() couldn't read are reported first. The
+    last record is the aggregate summary for the whole set.
+    """
+    catalogue = get_catalogue()
+    
+    # Dedupe by digest: each unique image gets one future, shared by all its indexes
+    indexes_by_digest = {}
+    unreadable = {}
+    for index, image_bytes in enumerate(images):
+        if isinstance(image_bytes, AnalysisError):
+            unreadable[index] = image_bytes
+        else:
+            indexes_by_digest.setdefault(image_digest(image_bytes), []).append(index)
+    futures = {
+        batch_executor.submit(run_analysis, images[indexes[0]], catalogue, model_entry): indexes
+        for indexes in indexes_by_digest.values()
+    }
+    
+    results = []
+    failed = len(unreadable)
+    try:
+        for index, e in unreadable.items():
+            yield {'index': index, 'error': e.message, 'status': e.status}
+        for future in as_completed(futures):
+            indexes = futures[future]
+            try:
+                result = future.result()
+            except AnalysisError as e:
+                failed += len(indexes)
+                for index in indexes:
+                    yield {'index': index, 'error': e.message, 'status': e.status}
+                continue
+            except Exception as e:
+                failed += len(indexes)
+                for index in indexes:
+                    yield {'index': index, 'error': str(e), 'status': 500}
+                continue
+            
+            results.append(result)
+            for index in indexes:
+                record = {'index': index, 'result': result}
+                if index != indexes[0]:
+                    record['duplicate_of'] = indexes[0]
+                yield record
+    finally:
+        # Client disconnected: don't start analyses nobody will read
+        for future in futures:
+            future.cancel()
+    
+    summary = aggregate_batch_results(results, catalogue)
+    summary.update({'images': len(images), 'unique_images': len(futures), 'failed': failed, 'model': model_entry.name})
+    yield {'summary': summary}
+
+def running_score(detected_items, catalogue):
+    """Score of the items detected so far, sent while a response is still streaming"""
+    percentage, detected_categories, score, max_score = calculate_performativeness_score(detected_items, catalogue)
+    return {
+        'percentage': percentage,
+        'detected_categories': list(detected_categories),
+        'score': score,
+        'max_score': max_score,
+        'category_details': build_category_details(detected_categories, catalogue)
+    }
+
+def stream_analysis(image_bytes, model_entry):
+    """Run the analysis pipeline, yielding (event, data) pairs as results become available
+
+    Events: 'start', then an 'item' per detected item with a 'score' after each
+    batch of new items, then the complete 'result' (suggestions and roasts
+    included) - or an 'error' at any point. Streaming always uses the
+    free-text prompt, since items can be parsed from it line by line.
+    """
+    catalogue = get_catalogue()
+    cache_key, prompt, entry = lookup_cached_analysis(image_bytes, catalogue, model_entry, mode='legacy')
+    if entry is None:
+        skipped = prefilter_result(image_bytes, catalogue)
+        if skipped is not None:
+            yield 'start', {'model': model_entry.name, 'cached': False}
+            yield 'result', record_analysis(image_bytes, skipped, model_entry)
+            return
+        near_key, entry = lookup_near_duplicate(image_bytes, cache_key, prompt, catalogue, model_entry)
+    yield 'start', {'model': model_entry.name, 'cached': entry is not None}
+    
+    try:
+        if entry is not None:
+            for index, item in enumerate(entry['detected_items']):
+                yield 'item', {'index': index, 'item': item}
+            yield 'score', running_score(entry['detected_items'], catalogue)
+        else:
+            image = prepare_image(image_bytes).as_part()
+            deadline = time.monotonic() + REQUEST_DEADLINE if REQUEST_DEADLINE else None
+            parser = ItemStreamParser()
+            chunks = []
+            for text in stream_analysis_text(prompt, image, model_entry, deadline):
+                chunks.append(text)
+                first_index = len(parser.items)
+                new_items = parser.feed(text)
+                for offset, item in enumerate(new_items):
+                    yield 'item', {'index': first_index + offset, 'item': item}
+                if new_items:
+                    yield 'score', running_score(parser.items, catalogue)
+            first_index = len(parser.items)
+            for offset, item in enumerate(parser.close()):
+                yield 'item', {'index': first_index + offset, 'item': item}
+            
+            with deadline_scope(None if deadline is None else deadline - time.monotonic()):
+                detected_items_text = enhance_analysis_text(''.join(chunks), image, model_entry)
+            entry = store_analysis(cache_key, detected_items_text, 'legacy', near_key, catalogue)
         
-        # Log analysis quality for monitoring
-        if len(detected_items) < 2:
-            print(f"Analysis: Only {len(detected_items)} items detected - image may have limited performative elements")
-        elif len(detected_items) >= 5:
-            print(f"Analysis: Comprehensive scan - {len(detected_items)} items detected")
+        yield 'result', record_analysis(image_bytes, finish_analysis(entry, catalogue), model_entry)
+    except AnalysisError as e:
+        yield 'error', {'error': e.message, 'status': e.status}
+    except Exception as e:
+        yield 'error', {'error': str(e), 'status': 500}
+
+def live_result(session, catalogue, changed=False, new_items=()):
+    """The /analyze-style response for everything a live session has detected so far"""
+    if session.items:
+        result = build_analysis_result(session.items, [], 'live', catalogue)
+    else:
+        result = empty_analysis_result("Nothing performative detected yet. Keep the camera moving!", catalogue)
+    result['live'] = dict(session.summary(), changed=changed, new_items=list(new_items))
+    return result
+
+def analyze_live_frame(session_id, image_bytes, model_entry):
+    """Merge one camera frame into a live session, analyzing it only if the scene changed"""
+    catalogue = get_catalogue()
+    # Claimed before it is read: a session read before the claim could be overwritten with that
+    # stale copy by save(), losing what another frame saved in between
+    if not live_sessions.claim(session_id):
+        if live_sessions.get(session_id) is None:
+            raise AnalysisError('Live session not found or expired. Please start a new one.', 404)
+        LIVE_FRAMES.inc(result='busy')
+        raise AnalysisError('A frame for this live session is still being analyzed. Send one frame at a time.', 409)
+
+    try:
+        session = live_sessions.get(session_id)
+        if session is None:
+            raise AnalysisError('Live session not found or expired. Please start a new one.', 404)
+        with timed_stage(STAGE_SECONDS, 'scene_change'):
+            try:
+                thumbnail = frame_thumbnail(image_bytes)
+            except Exception:
+                # Not an image we can decode; analyzing it reports the error
+                thumbnail = None
+        unchanged = thumbnail is not None and session.last_thumbnail is not None and \
+            thumbnail_difference(thumbnail, session.last_thumbnail) <= LIVE_CHANGE_THRESHOLD
+        session.frames += 1
+        new_items = []
+        if not unchanged:
+            result = run_analysis(image_bytes, catalogue, model_entry)
+            session.analyzed += 1
+            session.last_thumbnail = thumbnail
+            # Frames with nothing performative (including pre-filter skips) add nothing
+            if result['detected_categories']:
+                session.items, new_items = merge_items(session.items, result['detected_items'])
+        live_sessions.save(session)
+    except Exception:
+        live_sessions.release(session_id)
+        raise
+    LIVE_FRAMES.inc(result='unchanged' if unchanged else 'analyzed')
+    with timed_stage(STAGE_SECONDS, 'score'):
+        return live_result(session, catalogue, changed=not unchanged, new_items=new_items)
+
+def wants_compact():
+    """Whether the client asked for the compact response format (?format=compact)"""
+    return request.args.get('format', '').lower() == 'compact'
+
+def compact_result(result, catalogue_version):
+    """A response in the compact format: without category_details and max_score, which
+    the client looks up by category id in /catalogue/<catalogue_version> instead"""
+    compact = {key: value for key, value in result.items() if key not in ('category_details', 'max_score')}
+    compact['catalogue'] = catalogue_version
+    return compact
+
+def compress_body(data, accept_encoding):
+    """(body, encoding) to send a JSON body as: compressed if it is large and the client accepts it"""
+    if not COMPRESS_MIN_BYTES or len(data) < COMPRESS_MIN_BYTES:
+        return data, None
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return data, None
+    with timed_stage(STAGE_SECONDS, 'compress'):
+        return compress(data, encoding), encoding
+
+def format_sse(event, data):
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def load_dependencies():
+    """Import the heavy libraries and build the models and prompts, without connecting anything
+
+    Safe before fork(), so a preloading server can do it once in the master.
+    """
+    from PIL import Image
+
+    Image.init()  # Registers every format plugin; Pillow otherwise does it on first open
+    model_registry.load()
+    catalogue = get_catalogue()
+    build_analysis_prompt(catalogue)
+    build_structured_prompt(catalogue)
+    build_compact_prompt(catalogue)
+    with app.app_context():
+        index_page()
+    catalogue_asset(catalogue)
+    return catalogue
+
+warmup_lock = threading.Lock()
+warmup_seconds = None  # Set once warm_up() has finished
+
+def warm_up():
+    """Load everything a request needs and connect to Gemini; /readyz passes once this has run"""
+    global warmup_seconds
+    with warmup_lock:
+        if warmup_seconds is not None:
+            return
+        started = time.perf_counter()
+        load_dependencies()
+        if api_key:
+            model_registry.warm_up()
+        warmup_seconds = time.perf_counter() - started
+        print(f"Warmed up in {warmup_seconds * 1000:.0f} ms")
+
+@app.before_request
+def start_request_metrics():
+    start_request_timings().started_rss = memory_tracker.start()
+
+def record_request_memory(timings, endpoint):
+    # Cleared first, so a request is finished at most once
+    started_rss, timings.started_rss = timings.started_rss, None
+    peak = memory_tracker.finish(started_rss)
+    if peak is not None:
+        REQUEST_PEAK_MEMORY.observe(peak, endpoint=endpoint or 'unknown')
+
+def record_request_tokens(timings, endpoint):
+    # Requests answered without Gemini (cache hits, pre-filter skips) aren't counted
+    if timings.prompt_tokens:
+        REQUEST_TOKENS.observe(timings.prompt_tokens, endpoint=endpoint or 'unknown', kind='prompt')
+        REQUEST_TOKENS.observe(timings.output_tokens, endpoint=endpoint or 'unknown', kind='output')
+
+@app.after_request
+def record_request_metrics(response):
+    timings = current_request_timings()
+    if timings is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - timings.started,
+                                endpoint=request.endpoint or 'unknown', status=response.status_code)
+        # Streamed responses only use their tokens once the body has been sent
+        if response.is_streamed:
+            response.call_on_close(functools.partial(record_request_tokens, timings, request.endpoint))
+        else:
+            record_request_tokens(timings, request.endpoint)
+        # Streamed responses send their headers before any work has been timed
+        if SERVER_TIMING and timings.stages and not response.is_streamed:
+            response.headers['Server-Timing'] = timings.server_timing()
+    return response
+
+@app.teardown_request
+def finish_request_memory(exc):
+    # Runs even when the request raised (after_request doesn't), so the tracker's count of requests
+    # in flight always comes back down; streamed responses (stream_with_context) tear down once sent
+    timings = current_request_timings()
+    if timings is not None:
+        record_request_memory(timings, request.endpoint)
+
+@app.after_request
+def compress_response(response):
+    # Registered after record_request_metrics, so it runs first and Server-Timing includes it
+    if (response.is_streamed or response.direct_passthrough or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if not COMPRESS_MIN_BYTES or len(body) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add('Accept-Encoding')
+    data, encoding = compress_body(body, request.headers.get('Accept-Encoding'))
+    if encoding:
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+# Browsers may keep these for a year: their URLs change whenever their content does
+IMMUTABLE = 'public, max-age=31536000, immutable'
+STATIC_DIR = os.path.join(app.root_path, 'static')
+STATIC_FILES = frozenset(os.listdir(STATIC_DIR)) if os.path.isdir(STATIC_DIR) else frozenset()
+
+def send_asset(asset, cache_control):
+    """Serve a PrecompressedAsset, answering 304 when the client's copy is still current"""
+    headers = {'ETag': f'"{asset.etag}"', 'Cache-Control': cache_control, 'Vary': 'Accept-Encoding'}
+    if request.if_none_match.contains(asset.etag):
+        return Response(status=304, headers=headers)
+    encoding, body = asset.select(request.headers.get('Accept-Encoding'))
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, mimetype=asset.mimetype, headers=headers)
+
+@functools.lru_cache(maxsize=None)
+def static_asset(filename):
+    """A file in static/, read and compressed once per process"""
+    with open(os.path.join(STATIC_DIR, filename), 'rb') as f:
+        data = f.read()
+    return PrecompressedAsset(data, mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+
+@app.template_global()
+def asset_url(filename):
+    """URL of a static file, versioned by its content so it can be cached for good"""
+    return f'/static/{filename}?v={static_asset(filename).etag}'
+
+@functools.lru_cache(maxsize=1)
+def index_page():
+    """The page, rendered and compressed once per process"""
+    return PrecompressedAsset(render_template('index.html').encode('utf-8'), 'text/html')
+
+@functools.lru_cache(maxsize=4)
+def catalogue_asset(catalogue):
+    """The /catalogue document, serialized and compressed once per catalogue version"""
+    return PrecompressedAsset(json.dumps(catalogue.document()).encode('utf-8'), 'application/json')
+
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/')
+def index():
+    # Revalidated on every visit (a 304 once cached), so a deploy shows up straight away
+    return send_asset(index_page(), 'no-cache')
+
+@app.route('/static/<filename>')
+def static_file(filename):
+    if filename not in STATIC_FILES:
+        return jsonify({'error': 'Not found.'}), 404
+    asset = static_asset(filename)
+    return send_asset(asset, IMMUTABLE if request.args.get('v') == asset.etag else 'no-cache')
+
+@app.route('/catalogue')
+def current_catalogue():
+    """The current catalogue; compact results refer to its categories by id"""
+    return send_asset(catalogue_asset(get_catalogue()), 'no-cache')
+
+@app.route('/catalogue/<version>')
+def catalogue_version(version):
+    """One catalogue version, as named by compact results; it never changes, so it is cached for good"""
+    catalogue = get_catalogue()
+    if version != catalogue.version:
+        return jsonify({'error': 'This catalogue version is no longer served. The current one is at /catalogue.',
+                        'version': catalogue.version}), 404
+    return send_asset(catalogue_asset(catalogue), IMMUTABLE)
+
+@app.route('/stats')
+def stats():
+    return jsonify({
+        'catalogue': catalogue_store.stats(),
+        'models': {'default': model_registry.default_name, 'available': model_registry.names},
+        'result_cache': result_cache.stats(),
+        'near_duplicates': near_duplicate_index.stats(),
+        'analysis_store': analysis_store.stats() if analysis_store is not None else None,
+        'prefilter': prefilter.stats() if prefilter is not None else None,
+        'live_sessions': live_sessions.stats(),
+        'jobs': {**job_queue.stats(), **job_workers.stats()},
+        'scheduler': gemini_scheduler.stats(),
+        'gemini_latency_p90': gemini_latencies.stats(),
+        'preprocessing': preprocess_stats.stats(),
+        'memory': memory_tracker.stats()
+    })
+
+@app.route('/healthz')
+def healthz():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Readiness: the model client and catalogue are loaded and Gemini is connected"""
+    if not api_key:
+        return jsonify({'status': 'unavailable', 'error': 'Gemini API key not configured.'}), 503
+    if warmup_seconds is None:
+        # Nothing warmed this process up (WARMUP=0, or a server without the hook): start it now
+        if not warmup_lock.locked():
+            threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+        return jsonify({'status': 'starting'}), 503
+    return jsonify({
+        'status': 'ready',
+        'catalogue': get_catalogue().version,
+        'models': model_registry.names,
+        'warmup_seconds': round(warmup_seconds, 3),
+    })
+
+def page_limit(default, maximum=100):
+    """The ?limit= query parameter, clamped to 1..maximum"""
+    return min(max(request.args.get('limit', default, type=int), 1), maximum)
+
+@app.route('/history')
+def history():
+    """Stored analyses, newest first; ?category= filters, ?before=<next_before> pages"""
+    if analysis_store is None:
+        return jsonify({'error': 'Analysis history is not enabled. Please set ANALYSIS_STORE_PATH.'}), 404
+    limit = page_limit(20)
+    analyses = analysis_store.history(limit, before=request.args.get('before', type=int),
+                                      category=request.args.get('category'))
+    return jsonify({
+        'analyses': analyses,
+        'next_before': analyses[-1]['id'] if len(analyses) == limit else None
+    })
+
+@app.route('/leaderboard')
+def leaderboard():
+    """Highest-scoring stored analyses, one per image; ?category= filters"""
+    if analysis_store is None:
+        return jsonify({'error': 'Analysis history is not enabled. Please set ANALYSIS_STORE_PATH.'}), 404
+    return jsonify({'leaderboard': analysis_store.leaderboard(page_limit(10), category=request.args.get('category'))})
+
+@app.route('/analyze', methods=['POST'])
+def analyze_image():
+    try:
+        # Check API key
+        if not api_key:
+            return jsonify({'error': 'Gemini API key not configured. Please set GEMINI_API_KEY environment variable.'}), 500
         
-        # Always generate improvement suggestions based on missing categories
-        # AI suggestions are nice to have, but we'll use our own as primary source
-        generated_suggestions = generate_improvement_suggestions(detected_categories)
+        with timed_stage(STAGE_SECONDS, 'body_parse'):
+            image_bytes = read_image_upload()
+        result = analyze_image_bytes(image_bytes, request.args.get('model'))
+        if wants_compact():
+            result = compact_result(result, get_catalogue().version)
+        with timed_stage(STAGE_SECONDS, 'serialize'):
+            return jsonify(result)
         
-        # Combine AI suggestions with generated ones
-        if improvement_suggestions:
-            # Add AI suggestions that aren't already in generated list
-            for ai_sugg in improvement_suggestions:
-                # Check if similar suggestion already exists
-                is_duplicate = any(
-                    ai_sugg.lower() in gen_sugg.lower() or gen_sugg.lower() in ai_sugg.lower()
-                    for gen_sugg in generated_suggestions
-                )
-                if not is_duplicate and len(ai_sugg) > 10:
-                    generated_suggestions.append(ai_sugg)
+    except AnalysisError as e:
+        return jsonify({'error': e.message}), e.status
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Image too large. The maximum upload size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.'}), 413
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_image_stream():
+    """Same input as /analyze, answered with Server-Sent Events as the analysis progresses"""
+    try:
+        if not api_key:
+            return jsonify({'error': 'Gemini API key not configured. Please set GEMINI_API_KEY environment variable.'}), 500
         
-        improvement_suggestions = generated_suggestions
+        with timed_stage(STAGE_SECONDS, 'body_parse'):
+            image_bytes = read_image_upload()
+        model_entry = get_model_entry(request.args.get('model'))
+    except AnalysisError as e:
+        return jsonify({'error': e.message}), e.status
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Image too large. The maximum upload size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.'}), 413
+    
+    events = stream_analysis(image_bytes, model_entry)
+    if wants_compact():
+        version = get_catalogue().version
+        events = ((event, compact_result(data, version) if event in ('score', 'result') else data)
+                  for event, data in events)
+    events = (format_sse(event, data) for event, data in events)
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch_images():
+    """Analyze many images in one request, streaming NDJSON records as each image finishes"""
+    try:
+        if not api_key:
+            return jsonify({'error': 'Gemini API key not configured. Please set GEMINI_API_KEY environment variable.'}), 500
         
-        # Get category details
-        category_details = []
-        for category in detected_categories:
-            category_details.append({
-                "name": category.replace('_', ' ').title(),
-                "items": PERFORMATIVE_CHARACTERISTICS[category]["items"],
-                "weight": PERFORMATIVE_CHARACTERISTICS[category]["weight"]
-            })
+        images = read_batch_upload()
+        model_entry = get_model_entry(request.args.get('model'))
+    except AnalysisError as e:
+        return jsonify({'error': e.message}), e.status
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Batch too large. The maximum request size is {BATCH_MAX_UPLOAD_BYTES // (1024 * 1024)} MB.'}), 413
+    
+    records = analyze_batch(images, model_entry)
+    if wants_compact():
+        version = get_catalogue().version
+        records = (compact_batch_record(record, version) for record in records)
+    records = (json.dumps(record) + '\n' for record in records)
+    return Response(stream_with_context(records), mimetype='application/x-ndjson')
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Same input as /analyze; queues the analysis and answers 202 with the job id straight away"""
+    try:
+        if not api_key:
+            return jsonify({'error': 'Gemini API key not configured. Please set GEMINI_API_KEY environment variable.'}), 500
         
-        # Generate roasts if score is below 30%
-        roasts = []
-        if percentage < 30:
-            try:
-                roasts = generate_roasts(percentage, detected_categories, detected_items)
-                print(f"✅ Generated {len(roasts)} roasts for score {percentage}%")
-                if len(roasts) == 0:
-                    print("⚠️ WARNING: generate_roasts returned empty list!")
-                    roasts = ["This score is embarrassingly low. Step up your performative game."]
-            except Exception as e:
-                print(f"❌ Error generating roasts: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                roasts = ["Error generating roasts, but your score is still terrible."]
-        else:
-            print(f"ℹ️ No roasts generated - score {percentage}% is >= 30% (roasts only show for < 30%)")
+        with timed_stage(STAGE_SECONDS, 'body_parse'):
+            image_bytes = read_image_upload()
+        model_name = request.args.get('model')
+        get_model_entry(model_name)  # Unknown models are rejected now rather than failing the job
+        job_workers.start()
+        job_id = job_queue.submit(image_bytes, model_name)
+    except AnalysisError as e:
+        return jsonify({'error': e.message}), e.status
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Image too large. The maximum upload size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.'}), 413
+    except QueueFull:
+        JOBS.inc(event='rejected')
+        # A new job would wait about as long as the oldest queued one already has
+        retry_after = min(max(int(job_queue.depth()[1]), 1), 60)
+        return jsonify({'error': 'Too many queued analyses. Please try again later.'}), 503, {'Retry-After': str(retry_after)}
+    
+    JOBS.inc(event='submitted')
+    url = f'/jobs/{job_id}'
+    return jsonify({'job': job_id, 'status': 'queued', 'url': url}), 202, {'Location': url}
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """A job's status, and its result once done; ?wait=<seconds> long-polls until it has finished"""
+    # Servers that start the workers with the process (gunicorn, ASGI, app.run) make this a no-op
+    job_workers.start()
+    wait = min(max(request.args.get('wait', 0, type=float), 0), JOB_MAX_WAIT)
+    job = job_queue.wait(job_id, wait) if wait else job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired.'}), 404
+    if job.get('result') and wants_compact():
+        job['result'] = compact_result(job['result'], get_catalogue().version)
+    return jsonify(job)
+
+@app.route('/live', methods=['POST'])
+def start_live_session():
+    """Start a live camera session; its frames go to /live/<session>/frame"""
+    session = live_sessions.create()
+    return jsonify({'session': session.id, 'ttl_seconds': live_sessions.ttl_seconds}), 201
+
+@app.route('/live/<session_id>', methods=['GET'])
+def get_live_session(session_id):
+    """Everything a live session has detected so far, without sending a frame"""
+    session = live_sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Live session not found or expired. Please start a new one.'}), 404
+    catalogue = get_catalogue()
+    result = live_result(session, catalogue)
+    return jsonify(compact_result(result, catalogue.version) if wants_compact() else result)
+
+@app.route('/live/<session_id>', methods=['DELETE'])
+def end_live_session(session_id):
+    live_sessions.delete(session_id)
+    return '', 204
+
+@app.route('/live/<session_id>/frame', methods=['POST'])
+def analyze_live_frame_route(session_id):
+    """Same input as /analyze; answers with the session's merged result"""
+    try:
+        if not api_key:
+            return jsonify({'error': 'Gemini API key not configured. Please set GEMINI_API_KEY environment variable.'}), 500
         
-        return jsonify({
-            'percentage': percentage,
-            'detected_items': detected_items,
-            'detected_categories': list(detected_categories),
-            'category_details': category_details,
-            'score': score,
-            'max_score': max_score,
-            'improvement_suggestions': improvement_suggestions,
-            'roasts': roasts
-        })
+        with timed_stage(STAGE_SECONDS, 'body_parse'):
+            image_bytes = read_image_upload()
+        result = analyze_live_frame(session_id, image_bytes, get_model_entry(request.args.get('model')))
+        if wants_compact():
+            result = compact_result(result, get_catalogue().version)
+        with timed_stage(STAGE_SECONDS, 'serialize'):
+            return jsonify(result)
         
+    except AnalysisError as e:
+        return jsonify({'error': e.message}), e.status
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Image too large. The maximum upload size is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.'}), 413
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    if WARMUP:
+        warm_up()
+    # Resume jobs left in the queue without waiting for a request. With the reloader, only
+    # in the child process that serves (the parent just watches files)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        job_workers.start()
     app.run(debug=True, port=5001)
-
@@ -0,0 +1,229 @@
+"""ASGI entry point: serves /analyze on an event loop instead of blocking threads.
+
+POST /analyze is handled natively with Gemini's async API, so hundreds of
+in-flight analyses share one event loop plus a small executor for image
+preprocessing. Every other route is delegated to the Flask app.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 5001
+
+Admission control: at most ASYNC_MAX_CONCURRENCY analyses run at once and up
+to ASYNC_MAX_QUEUE more wait for a slot. Anything beyond that is rejected
+immediately with a 503 and a Retry-After header.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import app as analyzer
+from metrics import start_request_timings, timed_stage
+
+ASYNC_MAX_CONCURRENCY = int(os.getenv('ASYNC_MAX_CONCURRENCY', '100'))
+ASYNC_MAX_QUEUE = int(os.getenv('ASYNC_MAX_QUEUE', '200'))
+ASYNC_RETRY_AFTER = int(os.getenv('ASYNC_RETRY_AFTER', '5'))
+ASYNC_PREPROCESS_THREADS = int(os.getenv('ASYNC_PREPROCESS_THREADS', str(min(4, os.cpu_count() or 1))))
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded wait queue; callers beyond both are shed"""
+
+    def __init__(self, max_concurrency, max_queue):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.admitted = 0
+        self.rejected = 0
+        self._semaphore = None
+
+    def try_admit(self):
+        """Reserve a slot (running or queued), or return False if both are full"""
+        if self.admitted >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            return False
+        self.admitted += 1
+        return True
+
+    def release(self):
+        self.admitted -= 1
+
+    @property
+    def semaphore(self):
+        # Created lazily so it binds to the server's running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def stats(self):
+        running = min(self.admitted, self.max_concurrency)
+        return {
+            'running': running,
+            'queued': self.admitted - running,
+            'rejected': self.rejected,
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+        }
+
+
+admission = AdmissionController(ASYNC_MAX_CONCURRENCY, ASYNC_MAX_QUEUE)
+preprocess_executor = ThreadPoolExecutor(max_workers=ASYNC_PREPROCESS_THREADS,
+                                         thread_name_prefix='preprocess')
+flask_application = WsgiToAsgi(analyzer.app)
+
+
+def build_environ(scope, body):
+    """Build a minimal WSGI environ so Flask can parse the buffered request body"""
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': BytesIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'CONTENT_LENGTH':
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def read_body(receive, limit):
+    """Buffer the request body, refusing anything larger than limit bytes"""
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if len(body) > limit:
+            raise RequestEntityTooLarge()
+        if not message.get('more_body', False):
+            return bytes(body)
+
+
+async def send_json(send, payload, status=200, headers=None, accept_encoding=None):
+    with analyzer.app.app_context():
+        body = analyzer.app.json.dumps(payload).encode('utf-8') + b'\n'
+    body, encoding = analyzer.compress_body(body, accept_encoding)
+    response_headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('latin-1')),
+        (b'access-control-allow-origin', b'*'),
+        (b'vary', b'Accept-Encoding'),
+    ]
+    if encoding:
+        response_headers.append((b'content-encoding', encoding.encode('latin-1')))
+    for name, value in (headers or {}).items():
+        response_headers.append((name.lower().encode('latin-1'), str(value).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def timed_send(send, timings, endpoint):
+    """Wrap send to record the request latency (and Server-Timing) when the response starts"""
+    async def wrapper(message):
+        if message['type'] == 'http.response.start':
+            analyzer.REQUEST_SECONDS.observe(time.perf_counter() - timings.started,
+                                             endpoint=endpoint, status=message['status'])
+            if analyzer.SERVER_TIMING and timings.stages:
+                message['headers'].append((b'server-timing', timings.server_timing().encode('latin-1')))
+        await send(message)
+    return wrapper
+
+
+async def analyze(scope, receive, send):
+    timings = start_request_timings()
+    timings.started_rss = analyzer.memory_tracker.start()
+    try:
+        await handle_analyze(scope, receive, timed_send(send, timings, 'analyze_image'))
+    finally:
+        # Once the response has been sent, as the Flask app records them
+        analyzer.record_request_tokens(timings, 'analyze_image')
+        analyzer.record_request_memory(timings, 'analyze_image')
+
+
+async def handle_analyze(scope, receive, send):
+    if not analyzer.api_key:
+        await send_json(send, {'error': 'Gemini API key not configured. Please set GEMINI_API_KEY environment variable.'}, 500)
+        return
+
+    if not admission.try_admit():
+        await send_json(send, {'error': 'Server is busy. Please try again shortly.'}, 503,
+                        {'Retry-After': ASYNC_RETRY_AFTER})
+        return
+
+    try:
+        try:
+            body = await read_body(receive, analyzer.MAX_UPLOAD_BYTES)
+        except RequestEntityTooLarge:
+            await send_json(send, {'error': f'Image too large. The maximum upload size is {analyzer.MAX_UPLOAD_BYTES // (1024 * 1024)} MB.'}, 413)
+            return
+        if body is None:
+            return  # Client went away while uploading
+
+        try:
+            with analyzer.app.request_context(build_environ(scope, body)), timed_stage(analyzer.STAGE_SECONDS, 'body_parse'):
+                image_bytes = analyzer.read_image_upload()
+                model_name = analyzer.request.args.get('model')
+                compact = analyzer.wants_compact()
+                accept_encoding = analyzer.request.headers.get('Accept-Encoding')
+            del body
+
+            async with admission.semaphore:
+                result = await analyzer.analyze_image_bytes_async(image_bytes, preprocess_executor, model_name)
+            if compact:
+                result = analyzer.compact_result(result, analyzer.get_catalogue().version)
+        except analyzer.AnalysisError as e:
+            headers = {'Retry-After': ASYNC_RETRY_AFTER} if e.status == 429 else None
+            await send_json(send, {'error': e.message}, e.status, headers)
+            return
+        except Exception as e:
+            await send_json(send, {'error': str(e)}, 500)
+            return
+
+        await send_json(send, result, accept_encoding=accept_encoding)
+    finally:
+        admission.release()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if analyzer.WARMUP:
+                await asyncio.get_running_loop().run_in_executor(None, analyzer.warm_up)
+            analyzer.job_workers.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await asyncio.get_running_loop().run_in_executor(None, analyzer.job_workers.stop)
+            preprocess_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http' and scope['path'] == '/analyze' and scope['method'] == 'POST':
+        await analyze(scope, receive, send)
+    elif scope['type'] == 'http' and scope['path'] == '/stats/async':
+        await send_json(send, admission.stats())
+    else:
+        await flask_application(scope, receive, send)
@@ -0,0 +1,144 @@
+"""Run the benchmark suites and write one machine-readable results file.
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --suites micro,load --baseline results.json --tolerance 0.15
+
+Everything runs offline against the fake Gemini model. With --baseline, every
+metric is compared with the same metric in an earlier results file, and the
+command exits with status 1 if any got worse by more than --tolerance
+(a fraction: 0.15 = 15%), so it can gate a change in CI.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+os.environ.setdefault('GEMINI_API_KEY', 'offline-benchmark')
+
+SUITES = ('startup', 'micro', 'scoring', 'structured', 'prompts', 'store', 'live', 'hedging', 'memory', 'payload', 'load')
+
+# Metrics compared against a baseline, and which direction is better
+LOWER_IS_BETTER = ('per_call_us', 'compiled_us', 'p50_ms', 'p95_ms', 'p99_ms',
+                   'upstream_calls_per_request', 'prompt_tokens_per_request', 'output_tokens_per_request',
+                   'upstream_calls_per_minute', 'import_ms', 'time_to_ready_ms', 'time_to_first_response_ms',
+                   'first_request_ms', 'peak_rss_mb', 'response_bytes')
+HIGHER_IS_BETTER = ('throughput_rps', 'rows_per_s', 'recall')
+
+
+def run_suite(name):
+    """Return the result rows of one suite; every row has a unique 'name'"""
+    if name == 'startup':
+        from benchmarks import bench_startup
+        return bench_startup.run()
+    if name == 'micro':
+        from benchmarks import bench_micro
+        return bench_micro.run()
+    if name == 'scoring':
+        from benchmarks import bench_scoring
+        return bench_scoring.run()
+    if name == 'structured':
+        from benchmarks import bench_structured
+        return bench_structured.run()[0]
+    if name == 'prompts':
+        from benchmarks import bench_prompts
+        return bench_prompts.run()
+    if name == 'store':
+        from benchmarks import bench_store
+        return bench_store.run()
+    if name == 'live':
+        from benchmarks import bench_live
+        return bench_live.run()
+    if name == 'hedging':
+        from benchmarks import bench_hedging
+        return bench_hedging.run()
+    if name == 'memory':
+        from benchmarks import bench_memory
+        return bench_memory.run()
+    if name == 'payload':
+        from benchmarks import bench_payload
+        return bench_payload.run()
+    if name == 'load':
+        from benchmarks import bench_load
+        parser = argparse.ArgumentParser()
+        bench_load.add_arguments(parser)
+        args = parser.parse_args([])
+        from benchmarks.fake_gemini import RECORDINGS_PATH
+        args.recordings = RECORDINGS_PATH
+        url, server = bench_load.start_local_server(args)
+        try:
+            return [bench_load.run(url + '/analyze', bench_load.make_images(args.images),
+                                   rps=5, duration=10, concurrency=args.concurrency)]
+        finally:
+            server.shutdown()
+    raise ValueError(f'Unknown suite: {name}')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of (suite, name, metric, old, new, change) that regressed beyond tolerance"""
+    regressions = []
+    for suite, rows in results['suites'].items():
+        old_rows = {row['name']: row for row in baseline.get('suites', {}).get(suite, [])}
+        for row in rows:
+            old = old_rows.get(row['name'])
+            if old is None:
+                continue
+            for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+                if not old.get(metric) or row.get(metric) is None:
+                    continue
+                change = (row[metric] - old[metric]) / old[metric]
+                worse = change > tolerance if metric in LOWER_IS_BETTER else change < -tolerance
+                if worse:
+                    regressions.append((suite, row['name'], metric, old[metric], row[metric], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--suites', default=','.join(SUITES), help=f"Comma-separated subset of {', '.join(SUITES)}")
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative slowdown before failing')
+    args = parser.parse_args()
+
+    results = {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'suites': {},
+    }
+    for suite in args.suites.split(','):
+        suite = suite.strip()
+        print(f"Running {suite} benchmarks...", file=sys.stderr)
+        results['suites'][suite] = run_suite(suite)
+
+    print(json.dumps(results['suites'], indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for suite, name, metric, old, new, change in regressions:
+            print(f"REGRESSION {suite}/{name} {metric}: {old} -> {new} ({change:+.0%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Benchmark of tail latency with request deadlines and hedged calls.
+
+The fake primary model answers most calls in about a second, but a few
+(--tail-rate) straggle for --tail-latency seconds more, like a hung upstream
+call. The same requests (legacy mode: first call, fallback) are run with:
+
+- no_deadline: REQUEST_DEADLINE=0, so a straggler holds its request until it answers
+- deadline:    REQUEST_DEADLINE, so the first call is abandoned at half of it
+               and the fallback gets the rest
+- hedged:      the deadline, plus GEMINI_HEDGE_MODEL: a call still running
+               after the primary's p90 is also sent to a faster model
+
+    python -m benchmarks.bench_hedging [--requests 300] [--output hedging.json]
+
+Latencies are simulated milliseconds (--time-scale shrinks the real sleeps).
+Each setting first sends --warmup requests, so the hedge delay has latencies
+to start from.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('GEMINI_API_KEY', 'offline-benchmark')
+
+import app
+from benchmarks import fake_gemini
+from benchmarks.bench_structured import percentile
+from deadlines import LatencyTracker
+
+HEDGE_MODEL = 'gemini-2.5-flash-lite'
+
+
+def analyze(prompt, index, model_entry):
+    """One legacy analysis of a distinct fake image; returns seconds taken, or None if it failed"""
+    image = {'mime_type': 'image/jpeg', 'data': index.to_bytes(4, 'big') * 4096}
+    started = time.perf_counter()
+    try:
+        app.request_text('legacy', prompt, image, model_entry)
+    except app.AnalysisError:
+        return None
+    return time.perf_counter() - started
+
+
+def run_setting(name, deadline, hedge, requests, warmup, concurrency, fake_options, time_scale):
+    stats = fake_gemini.install(app.model_registry, time_scale=time_scale, seed=7, **fake_options)
+    app.gemini_latencies = LatencyTracker()
+    app.REQUEST_DEADLINE = deadline * time_scale
+    app.GEMINI_HEDGE_MODEL = HEDGE_MODEL if hedge else ''
+    app.GEMINI_HEDGE_MIN_DELAY = 0.5 * time_scale
+    hedges_before = {winner: app.GEMINI_HEDGES.value(call='first', winner=winner) for winner in ('primary', 'hedge')}
+    prompt = app.build_prompt(app.get_catalogue(), 'legacy')
+    model_entry = app.model_registry.get()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda index: analyze(prompt, index, model_entry), range(warmup)))
+        calls_before = stats.as_dict()['calls']
+        latencies = list(executor.map(lambda index: analyze(prompt, index, model_entry),
+                                      range(warmup, warmup + requests)))
+    # Abandoned stragglers are still running; let them finish so their calls are counted
+    time.sleep((fake_options['tail_latency'] + 5) * time_scale)
+
+    succeeded = [seconds / time_scale * 1000 for seconds in latencies if seconds is not None]
+    hedges = {winner: app.GEMINI_HEDGES.value(call='first', winner=winner) - hedges_before[winner]
+              for winner in hedges_before}
+    return {
+        'name': name,
+        'requests': requests,
+        'failures': requests - len(succeeded),
+        'p50_ms': round(percentile(succeeded, 50) or 0, 1),
+        'p95_ms': round(percentile(succeeded, 95) or 0, 1),
+        'p99_ms': round(percentile(succeeded, 99) or 0, 1),
+        'max_ms': round(max(succeeded, default=0), 1),
+        'upstream_calls_per_request': round((stats.as_dict()['calls'] - calls_before) / requests, 3),
+        'hedged': round(sum(hedges.values())),
+        'hedge_wins': round(hedges['hedge']),
+    }
+
+
+def run(requests=300, warmup=40, concurrency=8, deadline=10.0, tail_rate=0.03, tail_latency=20.0, time_scale=0.05):
+    if HEDGE_MODEL not in app.model_registry.names:
+        app.model_registry.register(HEDGE_MODEL, {}, [])
+    fake_options = {
+        'latency': 0.8, 'latency_jitter': 0.4, 'per_output_token': 0.0005,
+        'tail_rate': tail_rate, 'tail_latency': tail_latency,
+        'models': {HEDGE_MODEL: {'latency': 0.4, 'latency_jitter': 0.2, 'tail_rate': 0}},
+    }
+    saved = app.REQUEST_DEADLINE, app.GEMINI_HEDGE_MODEL, app.GEMINI_HEDGE_MIN_DELAY, app.gemini_latencies
+    try:
+        return [
+            run_setting(name, setting_deadline, hedge, requests, warmup, concurrency, fake_options, time_scale)
+            for name, setting_deadline, hedge in (('no_deadline', 0, False), ('deadline', deadline, False),
+                                                  ('hedged', deadline, True))
+        ]
+    finally:
+        app.REQUEST_DEADLINE, app.GEMINI_HEDGE_MODEL, app.GEMINI_HEDGE_MIN_DELAY, app.gemini_latencies = saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--warmup', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--deadline', type=float, default=10.0, help='Simulated REQUEST_DEADLINE in seconds')
+    parser.add_argument('--tail-rate', type=float, default=0.03, help='Share of primary calls that straggle')
+    parser.add_argument('--tail-latency', type=float, default=20.0, help='Extra seconds a straggler takes')
+    parser.add_argument('--time-scale', type=float, default=0.05)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    rows = run(args.requests, args.warmup, args.concurrency, args.deadline, args.tail_rate, args.tail_latency,
+               args.time_scale)
+    print(json.dumps(rows, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Benchmark of the live camera mode: upstream calls per minute of camera use.
+
+Simulates a webcam pointed at a changing scene, sampled twice a second: a
+few scenes held for a while each (sensor noise, small camera shake and a
+subject moving within the frame), with a pan of a second or two between
+them. The same footage is replayed through three clients:
+
+- periodic:    send every sample to /analyze whenever no request is in flight
+- server_gate: send every sample to a live session, which only analyzes
+               frames that differ from the last one it analyzed (live_sessions.py)
+- client_gate: the browser's change detector (a port of the one in
+               static/app.js) decides which samples to send at all
+
+    python -m benchmarks.bench_live --minutes 5 [--output live.json]
+
+Time is simulated: a request that reaches Gemini keeps the client busy for
+--latency seconds, one answered without a call for 0.1 s.
+"""
+import argparse
+import json
+import os
+import random
+from io import BytesIO
+
+os.environ.setdefault('GEMINI_API_KEY', 'offline-benchmark')
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+
+import app
+from benchmarks import fake_gemini
+from live_sessions import THUMBNAIL_SIZE, thumbnail_difference
+from near_duplicates import NearDuplicateIndex
+from result_cache import ResultCache
+
+FRAME_SIZE = (640, 480)
+SAMPLE_SECONDS = 0.5
+
+# The client-side detector's thresholds, as in static/app.js
+CHANGE_THRESHOLD = 12
+STABLE_THRESHOLD = 6
+
+
+def render_scene(seed):
+    """A photo-like backdrop, a little larger than the frame so the camera can shake"""
+    rng = random.Random(seed)
+    width, height = FRAME_SIZE[0] + 16, FRAME_SIZE[1] + 16
+    scene = Image.new('RGB', (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(scene)
+    for _ in range(12):
+        x, y, size = rng.randrange(width), rng.randrange(height), rng.randrange(40, 240)
+        draw.ellipse((x - size, y - size, x + size, y + size), fill=tuple(rng.randrange(256) for _ in range(3)))
+    return scene.filter(ImageFilter.GaussianBlur(2))
+
+
+def camera_frames(minutes, seed=7, hold=(15, 45), pan_seconds=1.5):
+    """Yield (time in seconds, JPEG bytes, PIL frame) for each sample"""
+    rng = random.Random(seed)
+    scene_index = 0
+    scene = render_scene(seed * 1000 + scene_index)
+    hold_until = rng.uniform(*hold)
+    pan_from = None
+    subject = [FRAME_SIZE[0] / 2, FRAME_SIZE[1] / 2]
+    for step in range(int(minutes * 60 / SAMPLE_SECONDS)):
+        now = step * SAMPLE_SECONDS
+        if pan_from is None and now >= hold_until:
+            scene_index += 1
+            pan_from, scene = scene, render_scene(seed * 1000 + scene_index)
+            pan_started = now
+        if pan_from is not None:
+            # The new scene slides in from the right while the camera turns
+            progress = min(1.0, (now - pan_started) / pan_seconds)
+            offset = int(progress * pan_from.width)
+            backdrop = Image.new('RGB', scene.size)
+            backdrop.paste(pan_from.crop((offset, 0, pan_from.width, pan_from.height)), (0, 0))
+            backdrop.paste(scene.crop((0, 0, offset, scene.height)), (pan_from.width - offset, 0))
+            if progress >= 1.0:
+                pan_from = None
+                hold_until = now + rng.uniform(*hold)
+        else:
+            backdrop = scene
+
+        dx, dy = rng.randint(0, 4), rng.randint(0, 4)
+        frame = backdrop.crop((6 + dx, 6 + dy, 6 + dx + FRAME_SIZE[0], 6 + dy + FRAME_SIZE[1]))
+        # Someone in front of the camera, shifting around a little
+        subject[0] = min(max(subject[0] + rng.uniform(-6, 6), 160), FRAME_SIZE[0] - 160)
+        subject[1] = min(max(subject[1] + rng.uniform(-4, 4), 160), FRAME_SIZE[1] - 120)
+        draw = ImageDraw.Draw(frame)
+        draw.ellipse((subject[0] - 70, subject[1] - 150, subject[0] + 70, subject[1] + 120), fill=(90, 70, 60))
+        noise = Image.effect_noise(FRAME_SIZE, 8).convert('RGB')
+        frame = ImageChops.add(frame, noise, 1.0, -128)
+
+        output = BytesIO()
+        frame.save(output, format='JPEG', quality=85)
+        yield now, output.getvalue(), frame
+
+
+def thumbnail(frame):
+    return frame.convert('L').resize(THUMBNAIL_SIZE, Image.BILINEAR).tobytes()
+
+
+def reset_caches():
+    """Fresh result caches and near-duplicate index, so every client starts cold"""
+    app.result_cache = ResultCache(max_entries=1024)
+    app.near_duplicate_index = NearDuplicateIndex(max_entries=4096, max_distance=app.near_duplicate_index.max_distance)
+
+
+def run_client(name, frames, minutes, latency):
+    reset_caches()
+    stats = fake_gemini.install(app.model_registry, latency=0.001, latency_jitter=0, per_output_token=0, seed=7)
+    client = app.app.test_client()
+    session = client.post('/live').get_json()['session']
+    busy_until = 0.0
+    last_sent = previous = None
+    sent = 0
+    result = None
+    for now, image_bytes, frame in frames:
+        thumb = thumbnail(frame) if name == 'client_gate' else None
+        last_previous, previous = previous, thumb
+        if now < busy_until:
+            continue
+        if name == 'client_gate':
+            changed = last_sent is None or thumbnail_difference(thumb, last_sent) > CHANGE_THRESHOLD
+            stable = last_previous is not None and thumbnail_difference(thumb, last_previous) < STABLE_THRESHOLD
+            if not (changed and stable):
+                continue
+            last_sent = thumb
+
+        calls_before = stats.as_dict()['calls']
+        url = '/analyze' if name == 'periodic' else f'/live/{session}/frame'
+        response = client.post(url, data=image_bytes, content_type='image/jpeg')
+        result = response.get_json()
+        sent += 1
+        busy_until = now + (latency if stats.as_dict()['calls'] > calls_before else 0.1)
+
+    calls = stats.as_dict()['calls']
+    return {
+        'name': name,
+        'minutes': minutes,
+        'frames_sampled': len(frames),
+        'frames_sent': sent,
+        'upstream_calls': calls,
+        'upstream_calls_per_minute': round(calls / minutes, 2),
+        'final_percentage': result.get('percentage') if result else None,
+    }
+
+
+def run(minutes=3, latency=3.0, seed=7):
+    frames = list(camera_frames(minutes, seed))
+    rows = [run_client(name, frames, minutes, latency) for name in ('periodic', 'server_gate', 'client_gate')]
+    reset_caches()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--minutes', type=float, default=3, help='Simulated minutes of camera use')
+    parser.add_argument('--latency', type=float, default=3.0, help='Simulated seconds per analysis that calls Gemini')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    rows = run(args.minutes, args.latency, args.seed)
+    print(json.dumps(rows, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""End-to-end load generator for POST /analyze.
+
+Sends requests at a fixed target rate (open loop: a slow server doesn't slow
+the sender down, so queueing shows up in the latencies) and reports achieved
+throughput, p50/p95/p99 latency and errors.
+
+By default the app is served in-process on a local port with every Gemini
+model replaced by the fake from fake_gemini.py, replaying recordings.jsonl:
+
+    python -m benchmarks.bench_load --rps 20 --duration 15 --output load.json
+
+Pass --url to drive an already running server instead. Note that a server
+configured with a real API key will call (and bill) Gemini for every request.
+
+Latency is measured from each request's scheduled send time, so time spent
+waiting for a free client thread counts against the server.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+os.environ.setdefault('GEMINI_API_KEY', 'offline-benchmark')
+
+from PIL import Image, ImageDraw
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def make_images(count, width=2016, height=1512):
+    """Distinct photo-like JPEGs (gradients, shapes and grain)
+
+    Each has its own shapes, so requests turn into neither exact nor
+    near-duplicate cache hits.
+    """
+    images = []
+    gradient = Image.linear_gradient('L').resize((width, height))
+    for index in range(count):
+        rng = random.Random(index)
+        grain = Image.blend(gradient, Image.effect_noise((width, height), 64), 0.2)
+        image = Image.merge('RGB', (gradient, grain, gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(8):
+            x, y, size = rng.randrange(width), rng.randrange(height), rng.randrange(height // 8, height // 2)
+            draw.ellipse((x - size, y - size, x + size, y + size), fill=tuple(rng.randrange(256) for _ in range(3)))
+        output = BytesIO()
+        image.save(output, format='JPEG', quality=90)
+        images.append(output.getvalue())
+    return images
+
+
+def start_local_server(args):
+    """Serve the app on a free local port with fake Gemini models; returns (url, server)"""
+    from werkzeug.serving import make_server
+
+    import app
+    from benchmarks import fake_gemini
+    from result_cache import ResultCache
+
+    fake_gemini.install(
+        app.model_registry,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+        recordings=fake_gemini.load_recordings(args.recordings)
+    )
+    if not args.cache:
+        app.result_cache = ResultCache(max_entries=0)
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server
+
+
+def send(url, image_bytes, timeout):
+    request = urllib.request.Request(url, data=image_bytes, method='POST',
+                                     headers={'Content-Type': 'image/jpeg'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except Exception:
+        return 'connection_error'
+
+
+def run(url, images, rps, duration, concurrency, timeout=60):
+    """Drive url at rps for duration seconds; returns a summary dict"""
+    total = int(rps * duration)
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def one(index, scheduled):
+        status = send(url, images[index % len(images)], timeout)
+        latency = time.perf_counter() - scheduled
+        with lock:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status == 200:
+                latencies.append(latency)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for index in range(total):
+            scheduled = started + index / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(one, index, scheduled)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'name': 'analyze',
+        'target_rps': rps,
+        'requests': total,
+        'succeeded': len(latencies),
+        'statuses': statuses,
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument('--url', help='Base URL of a running server (default: serve the app in-process with fakes)')
+    parser.add_argument('--rps', type=float, default=10, help='Target requests per second')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds to send requests for')
+    parser.add_argument('--concurrency', type=int, default=64, help='Client threads (max requests in flight)')
+    parser.add_argument('--images', type=int, default=20, help='Distinct test images to cycle through')
+    parser.add_argument('--latency', type=float, default=0.8, help='Fake model: seconds to first token')
+    parser.add_argument('--latency-jitter', type=float, default=0.4)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fake model: probability of a 503 upstream')
+    parser.add_argument('--recordings', default=None, help='Fake model: recordings JSONL or result cache SQLite file')
+    parser.add_argument('--cache', action='store_true', help='Keep the result cache enabled in the in-process server')
+    parser.add_argument('--seed', type=int, default=7)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    from benchmarks.fake_gemini import RECORDINGS_PATH
+    args.recordings = args.recordings or RECORDINGS_PATH
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        base_url, server = start_local_server(args)
+    try:
+        result = run(base_url.rstrip('/') + '/analyze', make_images(args.images),
+                     args.rps, args.duration, args.concurrency)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': [result]}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Benchmark of peak memory per request: how far one /analyze raises a fresh process's peak RSS.
+
+Each case runs in its own interpreter: the app is imported with the fake
+Gemini model, one small request warms everything up, then the process's peak
+RSS (VmHWM) is reset and a single large upload is analyzed. Reported is the
+peak above the RSS just before the request, in MB; the test client's copy of
+the request body is included. Linux only (it reads /proc/self/status).
+
+    python -m benchmarks.bench_memory [--output memory.json]
+
+- jpeg_48mp: an 8000x6000 JPEG sent as the raw body
+- png_24mp:  a 6000x4000 PNG sent as the raw body
+- json_12mp: a 4000x3000 JPEG sent base64-encoded in a JSON body
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = (
+    ('jpeg_48mp', (8000, 6000), 'JPEG', 'raw'),
+    ('png_24mp', (6000, 4000), 'PNG', 'raw'),
+    ('json_12mp', (4000, 3000), 'JPEG', 'json'),
+)
+
+REQUEST_SCRIPT = """
+import json, os, sys
+from benchmarks import fake_gemini
+from benchmarks.bench_load import make_images
+import app
+
+def status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+
+fake_gemini.install(app.model_registry, latency=0, latency_jitter=0, per_output_token=0)
+client = app.app.test_client()
+client.post('/analyze', data=make_images(1, 640, 480)[0], content_type='image/jpeg')
+with open(sys.argv[1], 'rb') as f:
+    body = f.read()
+content_type = sys.argv[2]
+before = status_kb('VmRSS')
+with open('/proc/self/clear_refs', 'w') as f:
+    f.write('5')
+response = client.post('/analyze', data=body, content_type=content_type)
+print(json.dumps({'status': response.status_code, 'peak_kb': status_kb('VmHWM') - before}))
+"""
+
+
+def make_upload(size, image_format, encoding):
+    """A photo-like image (gradients, shapes and grain) of the given size, as (body, content type)"""
+    width, height = size
+    rng = random.Random(width)
+    gradient = Image.linear_gradient('L').resize(size)
+    image = Image.merge('RGB', (gradient, gradient.transpose(Image.FLIP_TOP_BOTTOM),
+                                gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y, radius = rng.randrange(width), rng.randrange(height), rng.randrange(height // 8, height // 2)
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=tuple(rng.randrange(256) for _ in range(3)))
+    if image_format == 'JPEG':
+        # Grain, so the files are about as large as camera photos of that size
+        grain = Image.frombytes('RGB', size, rng.randbytes(width * height * 3))
+        image = Image.blend(image, grain, 0.1)
+    output = BytesIO()
+    image.save(output, format=image_format, quality=92)
+    data = output.getvalue()
+    if encoding == 'json':
+        encoded = 'data:image/jpeg;base64,' + base64.b64encode(data).decode('ascii')
+        return json.dumps({'image': encoded}).encode(), 'application/json'
+    return data, f'image/{image_format.lower()}'
+
+
+def measure(body, content_type):
+    with tempfile.NamedTemporaryFile(suffix='.body') as f:
+        f.write(body)
+        f.flush()
+        env = dict(os.environ, GEMINI_API_KEY='offline-benchmark', RESULT_CACHE_SIZE='0',
+                   NEAR_DUPLICATE_CACHE_SIZE='0', MAX_UPLOAD_BYTES=str(64 * 1024 * 1024))
+        output = subprocess.run([sys.executable, '-c', REQUEST_SCRIPT, f.name, content_type], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run():
+    rows = []
+    for name, size, image_format, encoding in CASES:
+        body, content_type = make_upload(size, image_format, encoding)
+        result = measure(body, content_type)
+        rows.append({
+            'name': name,
+            'body_mb': round(len(body) / 2**20, 1),
+            'status': result['status'],
+            'peak_rss_mb': round(result['peak_kb'] / 1024, 1),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    rows = run()
+    print(json.dumps(rows, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
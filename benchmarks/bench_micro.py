@@ -0,0 +1,105 @@
+"""Micro-benchmarks for the CPU-bound steps of an analysis.
+
+Covers scoring, response parsing (free-text, JSON and streamed), image
+decoding / preprocessing, perceptual hashing and the pre-filter, using the recorded responses in recordings.jsonl.
+
+Run from the project root:
+    python -m benchmarks.bench_micro [--output micro.json]
+"""
+import argparse
+import base64
+import json
+import os
+import timeit
+from io import BytesIO
+
+os.environ.setdefault('GEMINI_API_KEY', 'offline-benchmark')
+
+from PIL import Image
+
+import app
+from benchmarks.fake_gemini import load_recordings
+from near_duplicates import image_dhash
+from prefilter import Prefilter
+from preprocessing import preprocess_image
+
+
+def make_image(width, height, image_format='JPEG'):
+    """A noisy image, so encoders and decoders do realistic work"""
+    output = BytesIO()
+    Image.effect_noise((width, height), 40).convert('RGB').save(output, format=image_format)
+    return output.getvalue()
+
+
+def time_call(func, min_time=0.2):
+    """Best-of-5 seconds per call, with the loop count picked so each repeat takes ~min_time"""
+    number, elapsed = timeit.Timer(func).autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def stream_parse(text):
+    parser = app.ItemStreamParser()
+    for start in range(0, len(text), 80):
+        parser.feed(text[start:start + 80])
+    parser.close()
+    return parser.items
+
+
+def cases():
+    """(name, callable) pairs to benchmark"""
+    recordings = load_recordings()
+    legacy_texts = recordings['legacy']
+    structured_texts = recordings['structured']
+    catalogue = app.get_catalogue()
+    parsed = [app.parse_analysis_text(text) for text in legacy_texts]
+
+    yield 'score_recorded_items', lambda: [app.calculate_performativeness_score(items, catalogue) for items, _ in parsed]
+    yield 'build_result_recorded', lambda: [app.build_analysis_result(items, suggestions, 'x', catalogue)
+                                            for items, suggestions in parsed]
+    yield 'parse_legacy_recorded', lambda: [app.parse_analysis_text(text) for text in legacy_texts]
+    yield 'parse_structured_recorded', lambda: [app.parse_structured_text(text) for text in structured_texts]
+    yield 'parse_stream_recorded', lambda: [stream_parse(text) for text in legacy_texts]
+
+    prefilter = Prefilter()
+    for label, (width, height), image_format in [
+        ('phone_jpeg', (4032, 3024), 'JPEG'),
+        ('small_jpeg', (1200, 900), 'JPEG'),
+        ('screenshot_png', (1170, 2532), 'PNG'),
+    ]:
+        image_bytes = make_image(width, height, image_format)
+        encoded = base64.b64encode(image_bytes).decode('ascii')
+        yield f'base64_decode_{label}', lambda encoded=encoded: app.decode_image_data(encoded)
+        yield f'image_open_{label}', lambda image_bytes=image_bytes: Image.open(BytesIO(image_bytes)).size
+        yield f'preprocess_{label}', lambda image_bytes=image_bytes: preprocess_image(image_bytes)
+        yield f'perceptual_hash_{label}', lambda image_bytes=image_bytes: image_dhash(image_bytes)
+        yield f'prefilter_{label}', lambda image_bytes=image_bytes: prefilter.check(image_bytes)
+
+
+def run(only=None):
+    results = []
+    for name, func in cases():
+        if only and only not in name:
+            continue
+        func()  # Warm caches (prompt, catalogue, lazy imports) outside the timing
+        results.append({'name': name, 'per_call_us': round(time_call(func) * 1e6, 2)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', help='Only run benchmarks whose name contains this string')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = run(args.only)
+    print(f"{'benchmark':<32} {'per call (us)':>14}")
+    for row in results:
+        print(f"{row['name']:<32} {row['per_call_us']:>14}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
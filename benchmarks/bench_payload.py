@@ -0,0 +1,90 @@
+"""Benchmark of bytes on the wire: analysis responses and page loads.
+
+Analyses are answered by the fake model replaying the recorded responses, so
+response sizes are those of real results. Reported per request:
+
+- analyze_*: POST /analyze in the full and compact formats, with and without
+             compression (the full, uncompressed response is what every
+             client got before compact responses existed)
+- stream_*:  POST /analyze/stream as the web UI uses it; events aren't
+             compressed, so only the format changes their size
+- catalogue: GET /catalogue, which a compact client fetches once per catalogue version
+- page_*:    the page and its assets on a first visit, and on a repeat visit
+             with everything cached (the page is revalidated, the assets aren't requested)
+
+    python -m benchmarks.bench_payload [--images 12] [--output payload.json]
+"""
+import argparse
+import json
+import os
+import re
+
+os.environ.setdefault('GEMINI_API_KEY', 'offline-benchmark')
+
+import app
+from benchmarks import fake_gemini
+from benchmarks.bench_load import make_images
+from compression import ENCODINGS
+
+
+def analysis_bytes(client, images, path, encoding):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    sizes = [len(client.post(path, data=image, content_type='image/jpeg', headers=headers).data) for image in images]
+    return round(sum(sizes) / len(sizes))
+
+
+def page_bytes(client, encoding, cached=None):
+    """(requests, bytes) for loading the page; cached: ETag of the page the browser already has"""
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    if cached:
+        # Assets have immutable, versioned URLs, so only the page itself is revalidated
+        response = client.get('/', headers=dict(headers, **{'If-None-Match': cached}))
+        return 1, len(response.data)
+    page = client.get('/', headers=headers)
+    html = client.get('/').get_data(as_text=True)
+    assets = [client.get(url, headers=headers) for url in re.findall(r'"(/static/[^"]+)"', html)]
+    return 1 + len(assets), len(page.data) + sum(len(asset.data) for asset in assets)
+
+
+def run(images=12):
+    fake_gemini.install(app.model_registry, recordings=fake_gemini.load_recordings(), match_images=True,
+                        latency=0, latency_jitter=0, per_output_token=0, seed=7)
+    client = app.app.test_client()
+    uploads = make_images(images, 1024, 768)
+    rows = []
+    for name, path, encoding in (
+            ('analyze_full', '/analyze', None),
+            ('analyze_compact', '/analyze?format=compact', None),
+            *((f'analyze_compact_{encoding}', '/analyze?format=compact', encoding) for encoding in ENCODINGS),
+            ('stream_full', '/analyze/stream', None),
+            ('stream_compact', '/analyze/stream?format=compact', None)):
+        rows.append({'name': name, 'requests': images, 'response_bytes': analysis_bytes(client, uploads, path, encoding)})
+
+    for encoding in (None, *ENCODINGS):
+        response = client.get('/catalogue', headers={'Accept-Encoding': encoding} if encoding else {})
+        rows.append({'name': f'catalogue_{encoding or "identity"}', 'requests': 1, 'response_bytes': len(response.data)})
+
+    etag = client.get('/').headers['ETag']
+    for encoding in (None, *ENCODINGS):
+        requests, size = page_bytes(client, encoding)
+        rows.append({'name': f'page_first_visit_{encoding or "identity"}', 'requests': requests, 'response_bytes': size})
+    requests, size = page_bytes(client, None, cached=etag)
+    rows.append({'name': 'page_repeat_visit', 'requests': requests, 'response_bytes': size})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=12)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    rows = run(args.images)
+    print(json.dumps(rows, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
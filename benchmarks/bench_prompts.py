@@ -0,0 +1,144 @@
+"""Benchmark: the compact prompt vs the full free-text prompt on an image set.
+
+Every image is analyzed with each prompt. Per prompt, the benchmark reports
+latency, upstream calls and prompt/output tokens per image (from the
+responses' usage metadata), and categories detected per image. Recall is the
+share of the reference categories of each image that a prompt detected. The
+reference is the first mode's detections, or hand labels with --labels (a
+JSON object mapping image file names to lists of category ids).
+
+    python -m benchmarks.bench_prompts                            # offline, fake model
+    python -m benchmarks.bench_prompts --images photos/ --live    # real Gemini (GEMINI_API_KEY)
+
+Offline, the fake model replays recordings.jsonl, giving each image the
+recordings at the same position in every mode, and latencies are simulated
+milliseconds (--time-scale shrinks the real sleeps).
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+os.environ.setdefault('GEMINI_API_KEY', 'offline-benchmark')
+
+import app
+from benchmarks import fake_gemini
+from benchmarks.bench_load import make_images
+from benchmarks.bench_structured import percentile
+from metrics import start_request_timings
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.heic')
+
+
+def load_images(directory):
+    """(file name, bytes) of every image in a directory, by name"""
+    paths = sorted(path for path in glob.glob(os.path.join(directory, '*'))
+                   if path.lower().endswith(IMAGE_EXTENSIONS))
+    images = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            images.append((os.path.basename(path), f.read()))
+    return images
+
+
+def analyze_all(mode, parts, catalogue, model_entry, time_scale):
+    """Analyze every (name, image part) with one mode; returns per-image measurements"""
+    prompt = app.build_prompt(catalogue, mode)
+    outcomes = []
+    for name, part in parts:
+        timings = start_request_timings()
+        started = time.perf_counter()
+        try:
+            text = app.request_text(mode, prompt, part, model_entry)
+        except app.AnalysisError as e:
+            print(f"{mode}: {name} failed: {e.message}")
+            continue
+        latency_ms = (time.perf_counter() - started) / time_scale * 1000
+        items, _ = app.parse_response_text(text, mode, catalogue)
+        outcomes.append({
+            'name': name,
+            'latency_ms': latency_ms,
+            'calls': sum(1 for stage, _ in timings.stages if stage.startswith('gemini_')),
+            'prompt_tokens': timings.prompt_tokens,
+            'output_tokens': timings.output_tokens,
+            'categories': catalogue.matcher.match_categories(items),
+        })
+    return outcomes
+
+
+def recall(outcomes, reference):
+    """Share of the reference categories (per image name) that were detected"""
+    expected = found = 0
+    for outcome in outcomes:
+        categories = reference.get(outcome['name'])
+        if categories is None:
+            continue
+        expected += len(categories)
+        found += len(categories & outcome['categories'])
+    return round(found / expected, 3) if expected else None
+
+
+def run(images=None, modes=('legacy', 'compact'), labels=None, live=False, time_scale=0.05, seed=7):
+    """Analyze images ((name, bytes) pairs; synthetic ones by default) with every mode"""
+    if not live:
+        fake_gemini.install(app.model_registry, recordings=fake_gemini.load_recordings(), match_images=True,
+                            time_scale=time_scale, seed=seed)
+    else:
+        time_scale = 1.0
+    if images is None:
+        images = [(f'synthetic-{index}.jpg', data) for index, data in enumerate(make_images(12, 1024, 768))]
+    catalogue = app.get_catalogue()
+    model_entry = app.model_registry.get()
+    parts = [(name, app.prepare_image(data).as_part()) for name, data in images]
+
+    results = {mode: analyze_all(mode, parts, catalogue, model_entry, time_scale) for mode in modes}
+    if labels:
+        reference = {name: set(categories) for name, categories in labels.items()}
+    else:
+        reference = {outcome['name']: outcome['categories'] for outcome in results[modes[0]]}
+
+    rows = []
+    for mode, outcomes in results.items():
+        count = len(outcomes) or 1
+        latencies = [outcome['latency_ms'] for outcome in outcomes]
+        rows.append({
+            'name': mode,
+            'mode': mode,
+            'images': len(outcomes),
+            'p50_ms': round(percentile(latencies, 50) or 0, 1),
+            'p95_ms': round(percentile(latencies, 95) or 0, 1),
+            'upstream_calls_per_request': round(sum(o['calls'] for o in outcomes) / count, 3),
+            'prompt_tokens_per_request': round(sum(o['prompt_tokens'] for o in outcomes) / count, 1),
+            'output_tokens_per_request': round(sum(o['output_tokens'] for o in outcomes) / count, 1),
+            'categories_per_image': round(sum(len(o['categories']) for o in outcomes) / count, 2),
+            'recall': recall(outcomes, reference),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', help='Directory of images (default: synthetic images)')
+    parser.add_argument('--labels', help='JSON file mapping image file names to expected category ids')
+    parser.add_argument('--modes', default='legacy,compact', help='Comma-separated analysis modes; the first is the recall reference')
+    parser.add_argument('--live', action='store_true', help='Call the real Gemini API instead of the fake model')
+    parser.add_argument('--time-scale', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    labels = None
+    if args.labels:
+        with open(args.labels) as f:
+            labels = json.load(f)
+    rows = run(load_images(args.images) if args.images else None, tuple(args.modes.split(',')), labels,
+               args.live, args.time_scale, args.seed)
+    print(json.dumps(rows, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Micro-benchmark: pre-compiled keyword matcher vs the original nested-loop scorer.
+
+Run from the project root:
+    python -m benchmarks.bench_scoring
+
+Every run first checks that both implementations return identical results
+on each generated item list, then reports the time per call.
+"""
+import random
+import timeit
+
+from app import calculate_performativeness_score, get_catalogue
+
+PERFORMATIVE_CHARACTERISTICS = get_catalogue().characteristics
+
+NOISE_WORDS = [
+    "black", "hoodie", "wooden", "table", "window", "sneakers", "phone", "lamp",
+    "striped", "shirt", "glass", "of", "water", "poster", "on", "wall", "chair",
+]
+
+
+def legacy_calculate_performativeness_score(detected_items):
+    """The original implementation, kept verbatim for comparison"""
+    total_score = 0
+    max_possible_score = sum(char["weight"] for char in PERFORMATIVE_CHARACTERISTICS.values())
+
+    detected_categories = set()
+
+    item_category_matches = {}
+    for item_desc in detected_items:
+        item_lower = item_desc.lower()
+        matching_categories = []
+
+        for category, data in PERFORMATIVE_CHARACTERISTICS.items():
+            for keyword in data["items"]:
+                if keyword.lower() in item_lower:
+                    matching_categories.append(category)
+                    break
+
+        if matching_categories:
+            item_category_matches[item_desc] = matching_categories
+
+    category_priority = sorted(
+        PERFORMATIVE_CHARACTERISTICS.items(),
+        key=lambda x: x[1]["weight"],
+        reverse=True
+    )
+
+    for category, data in category_priority:
+        if category in detected_categories:
+            continue
+
+        for item_desc, matching_categories in item_category_matches.items():
+            if category in matching_categories:
+                total_score += data["weight"]
+                detected_categories.add(category)
+                break
+
+    percentage = min((total_score / max_possible_score) * 100, 100)
+    return round(percentage, 1), detected_categories, total_score, max_possible_score
+
+
+def generate_items(count, keyword_rate, rng):
+    """Generate item descriptions where roughly keyword_rate of them contain a keyword"""
+    keywords = [k for data in PERFORMATIVE_CHARACTERISTICS.values() for k in data["items"]]
+    items = []
+    for _ in range(count):
+        words = rng.sample(NOISE_WORDS, rng.randint(2, 6))
+        if rng.random() < keyword_rate:
+            keyword = rng.choice(keywords)
+            words.insert(rng.randint(0, len(words)), keyword.upper() if rng.random() < 0.2 else keyword)
+        items.append(' '.join(words))
+    return items
+
+
+def run(sizes=(10, 100, 1000, 10000), keyword_rate=0.05, seed=1234):
+    rng = random.Random(seed)
+    results = []
+    for size in sizes:
+        items = generate_items(size, keyword_rate, rng)
+        assert calculate_performativeness_score(items) == legacy_calculate_performativeness_score(items), size
+
+        number = max(1, 20000 // size)
+        legacy = min(timeit.repeat(lambda: legacy_calculate_performativeness_score(items), number=number, repeat=5)) / number
+        compiled = min(timeit.repeat(lambda: calculate_performativeness_score(items), number=number, repeat=5)) / number
+        results.append({
+            'name': f'{size}_items',
+            'items': size,
+            'legacy_us': round(legacy * 1e6, 2),
+            'compiled_us': round(compiled * 1e6, 2),
+            'speedup': round(legacy / compiled, 2),
+        })
+    return results
+
+
+def main():
+    print(f"{'items':>8} {'legacy (us)':>14} {'compiled (us)':>14} {'speedup':>8}")
+    for row in run():
+        print(f"{row['items']:>8} {row['legacy_us']:>14} {row['compiled_us']:>14} {row['speedup']:>7}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Benchmark of cold starts: import time, warm-up and time to the first answer.
+
+- import: `import app` in a fresh interpreter, and how long the libraries it
+  defers to first use (the Gemini client library, Pillow) then take to load
+- warmup / lazy: a one-worker gunicorn server with the fake model (see
+  fake_server.py), started with WARMUP=1 and WARMUP=0. Reported are the
+  milliseconds from launch until /healthz answers, until /readyz passes and
+  until the first /analyze has been answered, and that request's latency
+
+    python -m benchmarks.bench_startup [--runs 3] [--output startup.json]
+
+The lazy server answers its first /analyze before /readyz is polled, since
+polling /readyz starts the warm-up. Its first request does not import the
+Gemini client library, because the fake model stands in for it; against the
+real API it would also take about deferred_load_ms longer.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.bench_load import make_images, send
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCRIPT = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.load_dependencies()
+print(json.dumps({'import_ms': (imported - started) * 1000,
+                  'deferred_load_ms': (time.perf_counter() - imported) * 1000}))
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_import():
+    env = dict(os.environ, GEMINI_API_KEY='offline-benchmark')
+    output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def wait_for(url, started, timeout, status=200):
+    """Poll url until it answers with status; returns milliseconds since started"""
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == status:
+                    return (time.perf_counter() - started) * 1000
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f'{url} did not answer within {timeout} s')
+
+
+def measure_server(warmup, image, timeout=60):
+    """Launch a fresh server and time its milestones"""
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            GEMINI_API_KEY='offline-benchmark',
+            WARMUP='1' if warmup else '0',
+            FAKE_GEMINI_LATENCY='0',
+            FAKE_GEMINI_LATENCY_JITTER='0',
+            RESULT_CACHE_PATH=os.path.join(directory, 'cache.sqlite'),
+            LIVE_SESSION_PATH=os.path.join(directory, 'live.sqlite'),
+            GUNICORN_ACCESS_LOG='/dev/null',
+        )
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', 'benchmarks.fake_server:app', '-w', '1', '-b', f'127.0.0.1:{port}'],
+            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            live_ms = wait_for(url + '/healthz', started, timeout)
+            if warmup:
+                ready_ms = wait_for(url + '/readyz', started, timeout)
+            sent = time.perf_counter()
+            status = send(url + '/analyze', image, timeout)
+            request_ms = (time.perf_counter() - sent) * 1000
+            first_ms = (time.perf_counter() - started) * 1000
+            if not warmup:
+                ready_ms = wait_for(url + '/readyz', started, timeout)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return {'status': status, 'live_ms': live_ms, 'ready_ms': ready_ms, 'first_response_ms': first_ms,
+            'first_request_ms': request_ms}
+
+
+def median_of(samples, key):
+    return round(statistics.median(sample[key] for sample in samples), 1)
+
+
+def run(runs=3):
+    imports = [measure_import() for _ in range(runs)]
+    rows = [{
+        'name': 'import',
+        'runs': runs,
+        'import_ms': median_of(imports, 'import_ms'),
+        'deferred_load_ms': median_of(imports, 'deferred_load_ms'),
+    }]
+    image = make_images(1, 1024, 768)[0]
+    for name, warmup in (('warmup', True), ('lazy', False)):
+        samples = [measure_server(warmup, image) for _ in range(runs)]
+        rows.append({
+            'name': name,
+            'runs': runs,
+            'failures': sum(1 for sample in samples if sample['status'] != 200),
+            'time_to_live_ms': median_of(samples, 'live_ms'),
+            'time_to_ready_ms': median_of(samples, 'ready_ms'),
+            'time_to_first_response_ms': median_of(samples, 'first_response_ms'),
+            'first_request_ms': median_of(samples, 'first_request_ms'),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3, help='Fresh processes per measurement (the median is reported)')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    rows = run(args.runs)
+    print(json.dumps(rows, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark of the persistent analysis store (analysis_store.py).
+
+Fills a temporary database with synthetic analyses through the background
+writer, reporting write throughput, then times the /history and /leaderboard
+queries against it:
+
+    python -m benchmarks.bench_store --rows 1000000 [--output store.json]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+os.environ.setdefault('GEMINI_API_KEY', 'offline-benchmark')
+
+from analysis_store import AnalysisStore
+from benchmarks.bench_micro import time_call
+from catalogue import load_catalogue
+
+
+def synthetic_results(count, categories, seed=7):
+    """(image_hash, result) pairs; about one image in ten is analyzed more than once"""
+    rng = random.Random(seed)
+    for index in range(count):
+        detected = rng.sample(categories, rng.randint(0, min(6, len(categories))))
+        yield f'{rng.randrange(count * 9 // 10 or 1):064x}', {
+            'percentage': round(rng.uniform(0, 100), 1),
+            'score': len(detected) * 5,
+            'max_score': 100,
+            'detected_categories': detected,
+            'detected_items': [f'item {index}-{n}' for n in range(len(detected))],
+        }
+
+
+def run(rows=100000, batch_size=500):
+    categories = list(load_catalogue(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                  'catalogue.json')).category_priority)
+    with tempfile.TemporaryDirectory() as directory:
+        store = AnalysisStore(os.path.join(directory, 'analyses.db'), batch_size=batch_size, max_queue=0)
+        started = time.perf_counter()
+        for image_hash, result in synthetic_results(rows, categories):
+            store.record(image_hash, 'gemini-2.5-flash', result)
+        store.flush()
+        elapsed = time.perf_counter() - started
+
+        deep_page = store.history(1, before=rows // 2)[0]['id']
+        category = categories[0]
+        cases = [
+            ('history_first_page', lambda: store.history(20)),
+            ('history_deep_page', lambda: store.history(20, before=deep_page)),
+            ('history_category', lambda: store.history(20, category=category)),
+            ('leaderboard_top10', lambda: store.leaderboard(10)),
+            ('leaderboard_category', lambda: store.leaderboard(10, category=category)),
+        ]
+        results = [{'name': 'store_write', 'rows': rows, 'rows_per_s': round(rows / elapsed)}]
+        for name, func in cases:
+            results.append({'name': name, 'rows': rows, 'per_call_us': round(time_call(func) * 1e6, 2)})
+        store.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='Analyses to write before timing queries')
+    parser.add_argument('--batch-size', type=int, default=500, help="Writer's rows per transaction")
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = run(args.rows, args.batch_size)
+    print(f"{'benchmark':<24} {'result':>16}")
+    for row in results:
+        value = f"{row['rows_per_s']} rows/s" if 'rows_per_s' in row else f"{row['per_call_us']} us"
+        print(f"{row['name']:<24} {value:>16}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
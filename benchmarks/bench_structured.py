@@ -0,0 +1,140 @@
+"""Benchmark: single-call structured output vs the legacy multi-call flow.
+
+Drives the app's real request functions against the local fake model with
+identical latency and fault settings, and reports latency percentiles,
+upstream calls and tokens per request for both flows.
+
+Run from the project root:
+    python -m benchmarks.bench_structured --requests 300 --error-rate 0.05 --short-rate 0.2
+
+Latencies are reported in simulated milliseconds; --time-scale shrinks the
+real sleeps so a run takes seconds rather than minutes.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+os.environ.setdefault('GEMINI_API_KEY', 'offline-benchmark')
+
+from PIL import Image
+
+import app
+from benchmarks import fake_gemini
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def make_test_image(width=3024, height=4032):
+    """A phone-sized noisy JPEG, so upload size is realistic"""
+    output = BytesIO()
+    Image.effect_noise((width, height), 30).convert('RGB').save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+
+def run_flow(mode, image_part, requests, concurrency, error_rate, short_rate, time_scale, seed):
+    stats = fake_gemini.install(
+        app.model_registry,
+        error_rate=error_rate,
+        short_rate=short_rate,
+        time_scale=time_scale,
+        seed=seed
+    )
+    catalogue = app.get_catalogue()
+    entry = app.model_registry.get()
+    if mode == 'structured':
+        prompt = app.build_structured_prompt(catalogue)
+        request = app.request_structured_text
+    else:
+        prompt = app.build_analysis_prompt(catalogue)
+        request = app.request_analysis_text
+
+    def one(_):
+        started = time.perf_counter()
+        try:
+            request(prompt, image_part, entry)
+            failed = False
+        except app.AnalysisError:
+            failed = True
+        return (time.perf_counter() - started) / time_scale * 1000, failed
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(requests)))
+
+    latencies = [latency for latency, _ in outcomes]
+    counters = stats.as_dict()
+    return {
+        'name': mode,
+        'mode': mode,
+        'requests': requests,
+        'failures': sum(1 for _, failed in outcomes if failed),
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p99_ms': round(percentile(latencies, 99), 1),
+        'upstream_calls_per_request': round(counters['calls'] / requests, 3),
+        'prompt_tokens_per_request': round(counters['prompt_tokens'] / requests, 1),
+        'output_tokens_per_request': round(counters['output_tokens'] / requests, 1),
+        'upload_bytes_per_request': round(counters['upload_bytes'] / requests),
+    }
+
+
+def run(requests=200, concurrency=16, error_rate=0.05, short_rate=0.2, time_scale=0.05, seed=7):
+    """Run both flows with identical fake settings; returns (results, summary)"""
+    # Scale the retry backoff along with the simulated latency
+    base_delay = app.RETRY_BASE_DELAY
+    app.RETRY_BASE_DELAY = base_delay * time_scale
+    try:
+        image_part = app.prepare_image(make_test_image()).as_part()
+        results = [
+            run_flow(mode, image_part, requests, concurrency, error_rate, short_rate, time_scale, seed)
+            for mode in ('legacy', 'structured')
+        ]
+    finally:
+        app.RETRY_BASE_DELAY = base_delay
+
+    legacy, structured = results
+    summary = {
+        'p50_saved_ms': round(legacy['p50_ms'] - structured['p50_ms'], 1),
+        'p99_saved_ms': round(legacy['p99_ms'] - structured['p99_ms'], 1),
+        'tokens_saved_per_request': round(
+            legacy['prompt_tokens_per_request'] + legacy['output_tokens_per_request']
+            - structured['prompt_tokens_per_request'] - structured['output_tokens_per_request'], 1),
+    }
+    return results, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--error-rate', type=float, default=0.05, help='Probability an upstream call fails transiently')
+    parser.add_argument('--short-rate', type=float, default=0.2, help='Probability a free-text answer is too short')
+    parser.add_argument('--time-scale', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    results, summary = run(args.requests, args.concurrency, args.error_rate, args.short_rate,
+                           args.time_scale, args.seed)
+
+    columns = ['mode', 'failures', 'p50_ms', 'p99_ms', 'upstream_calls_per_request',
+               'prompt_tokens_per_request', 'output_tokens_per_request']
+    print(' '.join(f'{c:>14}' for c in ['mode', 'failures', 'p50 ms', 'p99 ms', 'calls/req', 'in tok/req', 'out tok/req']))
+    for row in results:
+        print(' '.join(f'{row[c]:>14}' for c in columns))
+    print(json.dumps(summary))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results, 'summary': summary}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""Local stand-in for google.generativeai.GenerativeModel.
+
+FakeGenerativeModel answers generate_content / generate_content_async with
+canned responses after a simulated latency (chunk by chunk with stream=True),
+and can inject transient
+upstream errors and too-short answers. Instead of the built-in canned texts
+it can replay recorded responses (see load_recordings). install() swaps it
+into every model of the app's registry so the real pipeline can be measured
+offline.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from google.api_core import exceptions as google_exceptions
+
+# Gemini bills a fixed number of tokens for each image part
+IMAGE_TOKENS = 258
+
+LEGACY_TEXT = """SECTION 1 - DETECTED ITEMS:
+- A matcha latte in a clear glass on the table
+- Canvas tote bag with a bookstore logo hanging off the chair
+- Stack of books including bell hooks' All About Love
+- Baggy light-wash jeans
+- Film camera on a strap
+- Indie cafe setting with exposed brick
+
+SECTION 2 - IMPROVEMENT SUGGESTIONS:
+- Maybe add a Phoebe Bridgers vinyl record somewhere in the shot
+- Could throw in a couple of houseplants or succulents for the plant parent vibe
+- A Labubu keychain clipped to the tote bag might help
+- Thrifted or vintage layers would round out the outfit"""
+
+SHORT_TEXT = """- matcha latte
+- tote bag"""
+
+STRUCTURED_TEXT = json.dumps({
+    "detected_items": [
+        "A matcha latte in a clear glass on the table",
+        "Canvas tote bag with a bookstore logo hanging off the chair",
+        "Stack of books including bell hooks' All About Love",
+        "Baggy light-wash jeans",
+        "Film camera on a strap",
+        "Indie cafe setting with exposed brick",
+    ],
+    "suggestions": [
+        "Maybe add a Phoebe Bridgers vinyl record somewhere in the shot",
+        "Could throw in a couple of houseplants or succulents",
+    ],
+})
+
+
+COMPACT_TEXT = """matcha_latte: matcha latte in a clear glass
+tote_bag: canvas tote with a bookstore logo
+feminist_literature: bell hooks' All About Love
+baggy_jeans: light-wash baggy jeans
+aesthetic_items: film camera on a strap
+coffee_shop_aesthetic: indie cafe with exposed brick"""
+
+
+RECORDINGS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recordings.jsonl')
+
+
+def is_structured_text(text):
+    return text.lstrip().startswith(('{', '```'))
+
+
+def is_compact_text(text):
+    """Whether every line is "category_id: ..." (or the whole answer is "none")"""
+    lines = [line.strip() for line in text.strip().split('\n') if line.strip()]
+    return text.strip().lower() == 'none' or all(re.match(r'[a-z_]+:', line) for line in lines)
+
+
+def load_recordings(path=RECORDINGS_PATH):
+    """Load recorded Gemini response texts, split into {'legacy': [...], 'structured': [...], 'compact': [...]}
+
+    path is either a JSONL file with one {"text": "..."} object per line, or the
+    SQLite file of a persistent result cache (RESULT_CACHE_PATH), whose entries
+    keep the raw response text of every analysis served.
+    """
+    texts = []
+    if path.endswith('.jsonl'):
+        with open(path) as f:
+            texts = [json.loads(line)['text'] for line in f if line.strip()]
+    else:
+        conn = sqlite3.connect(path)
+        try:
+            texts = [json.loads(value).get('text', '') for (value,) in conn.execute('SELECT value FROM results')]
+        finally:
+            conn.close()
+    texts = [text for text in texts if text]
+    compact = [text for text in texts if is_compact_text(text)]
+    return {
+        'legacy': [text for text in texts if not is_structured_text(text) and text not in compact] or [LEGACY_TEXT],
+        'structured': [text for text in texts if is_structured_text(text)] or [STRUCTURED_TEXT],
+        'compact': compact or [COMPACT_TEXT],
+    }
+
+
+def estimate_tokens(text):
+    """Rough token count for text (about four characters per token)"""
+    return max(1, len(text) // 4)
+
+
+class FakeUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class FakeResponse:
+    """Quacks like GenerateContentResponse for the parts the app reads"""
+
+    def __init__(self, text, prompt_tokens, output_tokens=None):
+        self.text = text
+        self.prompt_feedback = None
+        self.candidates = []
+        self.usage_metadata = FakeUsage(prompt_tokens, estimate_tokens(text) if output_tokens is None else output_tokens)
+
+
+# Characters per streamed chunk (roughly what Gemini sends per chunk)
+STREAM_CHUNK_CHARS = 80
+
+
+class FakeStats:
+    """Counters shared by every fake model installed together"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.upload_bytes = 0
+
+    def record(self, prompt_tokens=0, output_tokens=0, upload_bytes=0, error=False):
+        with self._lock:
+            self.calls += 1
+            self.errors += int(error)
+            self.prompt_tokens += prompt_tokens
+            self.output_tokens += output_tokens
+            self.upload_bytes += upload_bytes
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'prompt_tokens': self.prompt_tokens,
+                'output_tokens': self.output_tokens,
+                'upload_bytes': self.upload_bytes,
+            }
+
+
+class FakeQuota:
+    """Upstream per-minute request quota shared by a set of fakes; over it, calls get a 429"""
+
+    def __init__(self, rpm, window=60.0):
+        self.rpm = rpm
+        self.window = window
+        self._lock = threading.Lock()
+        self._calls = []
+        self.throttled = 0
+
+    def check(self, time_scale=1.0):
+        window = self.window * time_scale
+        with self._lock:
+            now = time.monotonic()
+            self._calls = [t for t in self._calls if now - t < window]
+            if len(self._calls) >= self.rpm:
+                self.throttled += 1
+                raise google_exceptions.TooManyRequests('Fake quota exceeded: requests per minute')
+            self._calls.append(now)
+
+
+class FakeGenerativeModel:
+    """Drop-in replacement for genai.GenerativeModel with simulated latency and faults
+
+    latency:          base seconds per call, plus up to latency_jitter extra
+    tail_rate:        probability a call is a straggler, taking tail_latency seconds longer
+    per_output_token: extra seconds per generated token
+    upload_bandwidth: bytes per second for the image upload
+    error_rate:       probability a call raises ServiceUnavailable
+    short_rate:       probability a free-text answer is too short (< 100 chars)
+    time_scale:       multiplier applied to every sleep, to run simulations faster
+    recordings:       responses to replay, as returned by load_recordings()
+    match_images:     pick each response by a checksum of the image instead of at random,
+                      so an image gets the recording at the same position in every mode
+    quota:            optional FakeQuota enforced before each call
+    """
+
+    def __init__(self, model_name='fake-gemini', generation_config=None, safety_settings=None,
+                 latency=0.8, latency_jitter=0.4, tail_rate=0.0, tail_latency=10.0, per_output_token=0.004,
+                 upload_bandwidth=2_000_000, error_rate=0.0, short_rate=0.0, time_scale=1.0, seed=None, stats=None, recordings=None,
+                 match_images=False, quota=None):
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.per_output_token = per_output_token
+        self.upload_bandwidth = upload_bandwidth
+        self.error_rate = error_rate
+        self.short_rate = short_rate
+        self.time_scale = time_scale
+        self.recordings = recordings or {'legacy': [LEGACY_TEXT], 'structured': [STRUCTURED_TEXT], 'compact': [COMPACT_TEXT]}
+        self.match_images = match_images
+        self.stats = stats or FakeStats()
+        self.quota = quota
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _plan(self, contents):
+        """Decide the response (or error) and how long it takes"""
+        prompt = ' '.join(part for part in contents if isinstance(part, str))
+        upload_bytes = sum(len(part['data']) for part in contents if isinstance(part, dict) and 'data' in part)
+        prompt_tokens = estimate_tokens(prompt) + IMAGE_TOKENS * sum(1 for part in contents if not isinstance(part, str))
+
+        with self._lock:
+            failed = self._rng.random() < self.error_rate
+            short = self._rng.random() < self.short_rate
+            jitter = self._rng.random() * self.latency_jitter
+            if self._rng.random() < self.tail_rate:
+                jitter += self.tail_latency
+            if 'JSON' in prompt:
+                text = self._choose('structured', contents)
+            elif '<category id>' in prompt:
+                text = self._choose('compact', contents)
+            elif short and 'another look' not in prompt:
+                text = SHORT_TEXT
+            else:
+                text = self._choose('legacy', contents)
+
+        # Time to first token; generation time is added per output token
+        delay = self.latency + jitter + upload_bytes / self.upload_bandwidth
+        return text, prompt_tokens, upload_bytes, failed, delay * self.time_scale
+
+    def _choose(self, kind, contents):
+        recordings = self.recordings[kind]
+        if self.match_images:
+            checksum = sum(zlib.crc32(part['data']) for part in contents if isinstance(part, dict) and 'data' in part)
+            return recordings[checksum % len(recordings)]
+        return self._rng.choice(recordings)
+
+    def _generation_time(self, text):
+        return estimate_tokens(text) * self.per_output_token * self.time_scale
+
+    def _finish(self, text, prompt_tokens, upload_bytes, failed):
+        if failed:
+            self.stats.record(prompt_tokens=prompt_tokens, upload_bytes=upload_bytes, error=True)
+            raise google_exceptions.ServiceUnavailable('Fake upstream is overloaded')
+        response = FakeResponse(text, prompt_tokens)
+        self.stats.record(prompt_tokens, response.usage_metadata.candidates_token_count, upload_bytes)
+        return response
+
+    def _stream(self, text, prompt_tokens, upload_bytes):
+        for start in range(0, len(text), STREAM_CHUNK_CHARS):
+            chunk = text[start:start + STREAM_CHUNK_CHARS]
+            time.sleep(self._generation_time(chunk))
+            # Like Gemini, each chunk reports the usage of the stream so far
+            yield FakeResponse(chunk, prompt_tokens, estimate_tokens(text[:start + len(chunk)]))
+        self.stats.record(prompt_tokens, estimate_tokens(text), upload_bytes)
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        if self.quota is not None:
+            self.quota.check(self.time_scale)
+        text, prompt_tokens, upload_bytes, failed, delay = self._plan(contents)
+        time.sleep(delay)
+        if stream and not failed:
+            return self._stream(text, prompt_tokens, upload_bytes)
+        if not failed:
+            time.sleep(self._generation_time(text))
+        return self._finish(text, prompt_tokens, upload_bytes, failed)
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        if self.quota is not None:
+            self.quota.check(self.time_scale)
+        text, prompt_tokens, upload_bytes, failed, delay = self._plan(contents)
+        if not failed:
+            delay += self._generation_time(text)
+        await asyncio.sleep(delay)
+        return self._finish(text, prompt_tokens, upload_bytes, failed)
+
+
+def install(registry, **options):
+    """Replace every model in a ModelRegistry with fakes sharing one FakeStats
+
+    models: per model name, options overriding the shared ones, e.g.
+    {'gemini-2.5-flash-lite': {'latency': 0.3}}
+    """
+    stats = options.pop('stats', None) or FakeStats()
+    seed = options.pop('seed', None)
+    per_model = options.pop('models', None) or {}
+    shared = options
+    for entry in registry.entries:
+        options = {**shared, **per_model.get(entry.name, {})}
+        entry.model = FakeGenerativeModel(entry.name, stats=stats, seed=seed, **options)
+        entry.fallback_model = FakeGenerativeModel(entry.name, stats=stats,
+                                                   seed=None if seed is None else seed + 1, **options)
+        entry.structured_model = FakeGenerativeModel(entry.name, stats=stats,
+                                                     seed=None if seed is None else seed + 2, **options)
+        entry.compact_model = FakeGenerativeModel(entry.name, stats=stats,
+                                                  seed=None if seed is None else seed + 3, **options)
+    # Nothing to connect: keep warm_up() from opening a real Gemini channel
+    registry.warmed = True
+    return stats
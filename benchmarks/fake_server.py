@@ -0,0 +1,29 @@
+"""The app with every Gemini model replaced by the fake, for load-testing real servers offline.
+
+    gunicorn benchmarks.fake_server:app
+    python -m benchmarks.bench_load --url http://127.0.0.1:5001 --rps 20
+
+The fake's behaviour is set with FAKE_GEMINI_LATENCY (seconds to first token,
+default 0.8), FAKE_GEMINI_LATENCY_JITTER (default 0.4),
+FAKE_GEMINI_TAIL_RATE and FAKE_GEMINI_TAIL_LATENCY (the share of calls that
+straggle, default 0, and by how many seconds, default 10) and
+FAKE_GEMINI_ERROR_RATE (default 0). Responses are replayed from
+recordings.jsonl.
+"""
+import os
+
+os.environ.setdefault('GEMINI_API_KEY', 'offline-benchmark')
+
+import app as analyzer
+from benchmarks import fake_gemini
+
+fake_stats = fake_gemini.install(
+    analyzer.model_registry,
+    latency=float(os.getenv('FAKE_GEMINI_LATENCY', '0.8')),
+    latency_jitter=float(os.getenv('FAKE_GEMINI_LATENCY_JITTER', '0.4')),
+    tail_rate=float(os.getenv('FAKE_GEMINI_TAIL_RATE', '0')),
+    tail_latency=float(os.getenv('FAKE_GEMINI_TAIL_LATENCY', '10')),
+    error_rate=float(os.getenv('FAKE_GEMINI_ERROR_RATE', '0')),
+    recordings=fake_gemini.load_recordings()
+)
+app = analyzer.app
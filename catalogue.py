@@ -0,0 +1,143 @@
+"""Versioned, hot-reloadable catalogue of performative characteristics.
+
+The categories (keywords, weights, improvement suggestions) and the roast
+lines live in catalogue.json. Everything derived from them - the keyword
+matcher, the weight-sorted priority, the maximum score and the prompts'
+characteristics lists - is built once per catalogue version. When the file
+changes on disk the next request picks up a freshly built Catalogue, swapped
+in as a single reference so requests never see a half-updated catalogue.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from keyword_matcher import KeywordMatcher
+
+
+class Catalogue:
+    """An immutable catalogue version plus every artefact derived from it"""
+
+    def __init__(self, data, version):
+        self.version = version
+        categories = data['categories']
+
+        self.characteristics = {
+            category: {'items': list(entry['items']), 'weight': entry['weight']}
+            for category, entry in categories.items()
+        }
+        self.suggestions = {
+            category: entry['suggestion']
+            for category, entry in categories.items() if entry.get('suggestion')
+        }
+        self.missing_roasts = {
+            category: entry['missing_roast']
+            for category, entry in categories.items() if entry.get('missing_roast')
+        }
+        self.roasts = list(data.get('roasts', []))
+
+        # Derived artefacts
+        self.matcher = KeywordMatcher(self.characteristics)
+        self.max_possible_score = sum(char['weight'] for char in self.characteristics.values())
+        # Highest weight first; ties keep catalogue order
+        self.category_priority = sorted(
+            self.characteristics,
+            key=lambda category: self.characteristics[category]['weight'],
+            reverse=True
+        )
+        self.category_names = {
+            category: category.replace('_', ' ').title() for category in self.characteristics
+        }
+        self.characteristics_list = '\n'.join(
+            f"- {self.category_names[category]}: {', '.join(char['items'])}"
+            for category, char in self.characteristics.items()
+        )
+        # The compact prompt names categories by id with a short description instead of every keyword
+        self.descriptions = {
+            category: entry.get('description') or ', '.join(entry['items'][:3])
+            for category, entry in categories.items()
+        }
+        self.compact_list = '\n'.join(
+            f"- {category}: {description}" for category, description in self.descriptions.items()
+        )
+
+    def weight(self, category):
+        return self.characteristics[category]['weight']
+
+    def document(self):
+        """The catalogue as served by GET /catalogue: what a client needs to display categories by id"""
+        return {
+            'version': self.version,
+            'max_score': self.max_possible_score,
+            'categories': {
+                category: {
+                    'name': self.category_names[category],
+                    'items': char['items'],
+                    'weight': char['weight'],
+                    'description': self.descriptions[category],
+                }
+                for category, char in self.characteristics.items()
+            },
+        }
+
+
+def load_catalogue(path):
+    """Load and build a Catalogue from a JSON file"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    data = json.loads(raw)
+    # The content hash distinguishes edits made without bumping "version"
+    version = f"{data.get('version', '0')}-{hashlib.sha256(raw).hexdigest()[:12]}"
+    return Catalogue(data, version)
+
+
+class CatalogueStore:
+    """Serves the current Catalogue, reloading it when the file changes"""
+
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._signature = self._stat()
+        self._catalogue = load_catalogue(path)
+        self._last_check = time.monotonic()
+
+    def _stat(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self):
+        """Return the current Catalogue, checking the file at most every check_interval seconds"""
+        if time.monotonic() - self._last_check >= self.check_interval:
+            self._maybe_reload()
+        return self._catalogue
+
+    def _maybe_reload(self):
+        if not self._lock.acquire(blocking=False):
+            return  # Another thread is already checking
+        try:
+            self._last_check = time.monotonic()
+            try:
+                signature = self._stat()
+                if signature == self._signature:
+                    return
+                catalogue = load_catalogue(self.path)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # Keep serving the last good catalogue if the file is missing or malformed
+                print(f"Warning: Could not reload catalogue from {self.path}: {str(e)}")
+                return
+            self._signature = signature
+            self._catalogue = catalogue
+            self.reloads += 1
+            print(f"Loaded catalogue version {catalogue.version}")
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'version': self._catalogue.version,
+            'reloads': self.reloads,
+        }
@@ -0,0 +1,83 @@
+"""Response compression: content negotiation, and payloads compressed once and served many times.
+
+JSON responses above a size threshold are compressed per request with a fast
+setting. Content that doesn't change between requests (the page, its assets,
+the catalogue) is compressed once at the highest setting and kept as a
+PrecompressedAsset, so serving it costs nothing but the write.
+
+Brotli is used when the brotli package is installed and the client accepts
+it; gzip otherwise.
+"""
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# In order of preference
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def accepted_encodings(accept_encoding):
+    """{coding: quality} from an Accept-Encoding header, lower-cased; q=0 marks a coding as refused"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        param = params.strip()
+        if param.startswith('q='):
+            try:
+                quality = float(param[2:])
+            except ValueError:
+                continue
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(accept_encoding, enabled=ENCODINGS):
+    """The preferred encoding out of enabled that the client accepts, or None to send it uncompressed
+
+    A coding the header names is taken at its own quality, so "gzip;q=0, *"
+    refuses gzip; "*" only covers the codings it doesn't name.
+    """
+    accepted = accepted_encodings(accept_encoding)
+    for encoding in enabled:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding, fast=True):
+    """data compressed with encoding; fast trades ratio for speed, for bodies compressed per request"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=4 if fast else 11)
+    if encoding == 'gzip':
+        # mtime=0 keeps the output (and so any ETag derived from it) identical between runs
+        return gzip.compress(data, compresslevel=5 if fast else 9, mtime=0)
+    raise ValueError(f'Unsupported content encoding: {encoding}')
+
+
+class PrecompressedAsset:
+    """A fixed response body plus its compressed variants and an ETag, built once"""
+
+    def __init__(self, data, mimetype):
+        self.data = data
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(data).hexdigest()[:16]
+        self.variants = {}
+        for encoding in ENCODINGS:
+            compressed = compress(data, encoding, fast=False)
+            # Tiny bodies can come out larger; those are always sent as they are
+            if len(compressed) < len(data):
+                self.variants[encoding] = compressed
+
+    def select(self, accept_encoding):
+        """(encoding or None, body) to send to a client with this Accept-Encoding header"""
+        encoding = choose_encoding(accept_encoding, tuple(self.variants))
+        return encoding, self.variants[encoding] if encoding else self.data
+
+    def sizes(self):
+        return {'identity': len(self.data), **{encoding: len(body) for encoding, body in self.variants.items()}}
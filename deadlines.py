@@ -0,0 +1,181 @@
+"""Deadlines and hedging for upstream Gemini calls.
+
+An analysis gets one time budget (deadline_scope) that every Gemini call it
+makes draws from: queueing for rate limit capacity, retries, the fallback call
+and the enhanced follow-up. attempt_budget() splits what is left between the
+calls that may still have to fit in it, so a slow first call leaves time for
+the fallback instead of using the whole budget.
+
+A call past its budget raises DeadlineExceeded. Sync calls run on a thread
+pool and are waited for with a timeout (call_with_timeout); the client library
+can't interrupt a blocking call, so a late one is abandoned and its answer
+discarded when it arrives. Async calls are cancelled.
+
+Hedging: LatencyTracker keeps the recent latencies of each model's calls.
+When a call hasn't answered by the model's observed p90, hedged() sends the
+same request a second time (usually to a faster model) and returns whichever
+answer comes first. Only the slowest tenth of calls are hedged, so the extra
+upstream calls stay around ten percent.
+"""
+import asyncio
+import collections
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextlib import contextmanager
+
+_deadline = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """A Gemini call did not answer within its share of the deadline"""
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """Give the enclosed Gemini calls seconds in total (None = no deadline)
+
+    Scopes don't nest: inside an existing scope the outer deadline applies.
+    """
+    if seconds is None or _deadline.get() is not None:
+        yield
+        return
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left until the current deadline, or None outside a deadline_scope"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def attempt_budget(attempts_left=1):
+    """Seconds the next call may take when attempts_left calls may still have to share what is left
+
+    None outside a deadline_scope; raises DeadlineExceeded once the deadline has passed.
+    """
+    left = remaining()
+    if left is None:
+        return None
+    if left <= 0:
+        raise DeadlineExceeded('The analysis ran out of time')
+    return left / max(1, attempts_left)
+
+
+def call_with_timeout(executor, call, timeout):
+    """Return call() run on executor, or raise DeadlineExceeded after timeout seconds (None = no limit)"""
+    if timeout is None:
+        return call()
+    future = executor.submit(contextvars.copy_context().run, call)
+    done, _ = wait([future], timeout)
+    if not done:
+        raise DeadlineExceeded(f'No answer from Gemini within {timeout:.1f} s')
+    return future.result()
+
+
+async def wait_for_deadline(awaitable, timeout):
+    """Async variant of call_with_timeout: the awaitable is cancelled after timeout seconds"""
+    if timeout is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except DeadlineExceeded:
+        raise
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f'No answer from Gemini within {timeout:.1f} s')
+
+
+def hedged(executor, primary, hedge, hedge_after, timeout):
+    """Run primary(); if it hasn't finished after hedge_after seconds, also run hedge()
+
+    Returns (result, winner): winner is 'primary' or 'hedge' when a hedge was
+    sent, None when primary answered (or failed) before hedge_after. If one of
+    the two fails, the other is still awaited; if both fail, primary's error is
+    raised. Raises DeadlineExceeded after timeout seconds (None = no limit).
+    """
+    started = time.monotonic()
+    first = executor.submit(contextvars.copy_context().run, primary)
+    done, _ = wait([first], hedge_after if timeout is None else min(hedge_after, timeout))
+    if done:
+        return first.result(), None
+
+    second = executor.submit(contextvars.copy_context().run, hedge)
+    names = {first: 'primary', second: 'hedge'}
+    pending = set(names)
+    while pending:
+        left = None if timeout is None else timeout - (time.monotonic() - started)
+        if left is not None and left <= 0:
+            break
+        done, pending = wait(pending, left, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result(), names[future]
+    if not pending:
+        raise first.exception()
+    raise DeadlineExceeded(f'No answer from Gemini within {timeout:.1f} s')
+
+
+async def hedged_async(primary, hedge, hedge_after, timeout):
+    """Async variant of hedged; primary and hedge return awaitables. The call that loses is cancelled"""
+    started = time.monotonic()
+    first = asyncio.ensure_future(primary())
+    names = {first: 'primary'}
+    try:
+        done, _ = await asyncio.wait([first], timeout=hedge_after if timeout is None else min(hedge_after, timeout))
+        if done:
+            return first.result(), None
+
+        names[asyncio.ensure_future(hedge())] = 'hedge'
+        pending = set(names)
+        while pending:
+            left = None if timeout is None else timeout - (time.monotonic() - started)
+            if left is not None and left <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=left, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), names[task]
+        if not pending:
+            raise first.exception()
+        raise DeadlineExceeded(f'No answer from Gemini within {timeout:.1f} s')
+    finally:
+        for task in names:
+            task.cancel()
+
+
+class LatencyTracker:
+    """Latencies of the last window successful calls per key (model, call), for percentile estimates
+
+    min_samples: calls a key needs before percentile() estimates anything
+    """
+
+    def __init__(self, window=200, min_samples=20):
+        self.window = window
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples = {}
+
+    def observe(self, key, seconds):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = collections.deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, key, pct):
+        """The pct-th percentile of key's recent latencies, or None with too few samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+    def stats(self, pct=90):
+        with self._lock:
+            keys = list(self._samples)
+        return {'/'.join(key): round(self.percentile(key, pct) or 0, 3) for key in keys}
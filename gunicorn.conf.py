@@ -0,0 +1,78 @@
+"""Production server configuration: gunicorn reads this file automatically.
+
+    gunicorn app:app
+
+- Prefork: WEB_CONCURRENCY worker processes (default: one per CPU core, since
+  image preprocessing is CPU-bound), each with GUNICORN_THREADS threads to
+  keep many multi-second Gemini calls in flight.
+- The app is imported once in the master before forking (preload_app). With
+  WARMUP on (the default), the master also imports the Gemini client library
+  and Pillow and builds the models, the catalogue's keyword matcher and the
+  prompts, all shared copy-on-write by every worker.
+- Each worker then connects its own Gemini gRPC channel (channels must not
+  cross fork()) before it takes requests.
+- Results are cached in a SQLite file shared by all workers
+  (RESULT_CACHE_PATH, defaulting to one in the temp directory), so a result
+  computed by one worker is a cache hit in every other. Live camera sessions
+  are shared the same way (LIVE_SESSION_PATH), since a session's frames can
+  reach any worker. The job queue (JOB_QUEUE_PATH, jobs.sqlite3 next to app.py by default)
+  is a shared file too: every worker starts its job threads as it is forked
+  and runs jobs from it, so jobs left queued by a restart resume on their own.
+
+Graceful restarts: `kill -HUP <master pid>` replaces the workers one
+generation at a time, and in-flight requests get up to GUNICORN_GRACEFUL_TIMEOUT
+seconds to finish. Because the app is preloaded, HUP does not pick up code
+changes. To deploy new code without dropping requests, send USR2 (which starts
+a new master alongside the old one), then QUIT to the old master.
+"""
+import os
+import tempfile
+
+# Must be set before the app is imported below, when it creates the result cache and live session store
+os.environ.setdefault('RESULT_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'performative-analyzer-cache.sqlite'))
+os.environ.setdefault('LIVE_SESSION_PATH', os.path.join(tempfile.gettempdir(), 'performative-analyzer-live.sqlite'))
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5001')
+workers = int(os.getenv('WEB_CONCURRENCY', str(os.cpu_count() or 1)))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '16'))
+preload_app = True
+
+# A request can legitimately spend tens of seconds queued for and talking to Gemini
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '60'))
+keepalive = 5
+
+# Recycle workers after this many requests (plus jitter, so they don't all restart at once); 0 = never
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+
+
+def when_ready(server):
+    """In the master, after the preloaded app is imported: build what workers will share"""
+    import app
+
+    if not app.WARMUP:
+        return
+    catalogue = app.load_dependencies()
+    server.log.info(f"Preloaded catalogue {catalogue.version}; result cache at {os.environ.get('RESULT_CACHE_PATH') or 'memory only'}")
+
+
+def post_fork(server, worker):
+    """In each new worker: connect its own Gemini channel and start its job workers before it takes requests"""
+    import app
+
+    if app.WARMUP:
+        app.warm_up()
+    app.job_workers.start()
+
+
+def worker_exit(server, worker):
+    """Finish or requeue running jobs, and write out analyses still queued for the store, before the worker goes away"""
+    import app
+
+    app.job_workers.stop(timeout=server.cfg.graceful_timeout / 2)
+    if app.analysis_store is not None:
+        app.analysis_store.close()
@@ -0,0 +1,291 @@
+"""Queued analyses: POST /jobs accepts an image and answers at once, workers analyze it later.
+
+Jobs are rows in SQLite. With a file path (JOB_QUEUE_PATH) the queue is shared
+by every worker process and survives restarts: jobs still queued are picked up
+when the server comes back, and a job whose worker died mid-analysis is
+claimed again once its lease lapses (up to max_attempts times).
+
+Each process runs a small pool of JobWorkers threads that claim the oldest
+queued job, run the handler on it and store the result (or error). The
+uploaded image is dropped once the job has finished, and finished jobs are
+deleted after ttl_seconds.
+"""
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+class QueueFull(Exception):
+    """The queue already holds max_queued jobs"""
+
+
+class JobQueue:
+    """Persistent FIFO of analysis jobs
+
+    max_queued:     jobs allowed to wait; submit() raises QueueFull beyond that
+    lease_seconds:  how long a claimed job may run before another worker may take it over
+    max_attempts:   claims before a job that keeps losing its worker is failed
+    ttl_seconds:    how long finished jobs (and their results) are kept
+    poll_interval:  how often waiters re-check the file for changes made by other processes
+    """
+
+    def __init__(self, path=':memory:', max_queued=1000, lease_seconds=300, max_attempts=3, ttl_seconds=3600,
+                 poll_interval=0.5):
+        self.path = path
+        self.max_queued = max_queued
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.ttl_seconds = ttl_seconds
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._conn = None
+        self._pid = None
+        self.submitted = 0
+        self.rejected = 0
+
+    def _connect(self):
+        # Caller holds self._lock. Connections must not cross fork(), so each process opens its own
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10, isolation_level=None)
+            if self.path != ':memory:':
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, model TEXT, image BLOB, result TEXT, "
+                "error TEXT, error_status INTEGER, attempts INTEGER NOT NULL DEFAULT 0, claim TEXT, "
+                "lease_until REAL NOT NULL DEFAULT 0, created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at)")
+            self._pid = os.getpid()
+        return self._conn
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def submit(self, image_bytes, model=None):
+        """Queue an image for analysis and return the job id"""
+        job_id = secrets.token_urlsafe(12)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                             (DONE, FAILED, now - self.ttl_seconds))
+                queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+                if queued >= self.max_queued:
+                    self.rejected += 1
+                    raise QueueFull(f'{queued} jobs are already queued')
+                conn.execute("INSERT INTO jobs (id, status, model, image, created_at) VALUES (?, ?, ?, ?, ?)",
+                             (job_id, QUEUED, model, image_bytes, now))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self.submitted += 1
+        self._notify()
+        return job_id
+
+    def claim(self):
+        """Take the oldest runnable job: a dict with id, image, model, created_at and claim, or None
+
+        Jobs whose lease lapsed (their worker died) are runnable again, and are
+        failed instead once they have used up max_attempts.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, error_status = 500, image = NULL, finished_at = ? "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (FAILED, 'The analysis did not finish. Please submit the image again.', now,
+                     RUNNING, now, self.max_attempts)
+                )
+                row = conn.execute(
+                    "SELECT id, image, model, created_at FROM jobs "
+                    "WHERE status = ? OR (status = ? AND lease_until < ?) ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                claim = secrets.token_hex(8)
+                conn.execute(
+                    "UPDATE jobs SET status = ?, claim = ?, lease_until = ?, attempts = attempts + 1, "
+                    "started_at = ? WHERE id = ?",
+                    (RUNNING, claim, now + self.lease_seconds, now, row[0])
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        job_id, image, model, created_at = row
+        return {'id': job_id, 'image': image, 'model': model, 'created_at': created_at, 'claim': claim}
+
+    def finish(self, job, result=None, error=None, error_status=None):
+        """Store a claimed job's result, or its error; ignored if the claim was lost meanwhile"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, error_status = ?, image = NULL, "
+                "lease_until = 0, finished_at = ? WHERE id = ? AND claim = ?",
+                (FAILED if error else DONE, None if error else json.dumps(result), error, error_status,
+                 time.time(), job['id'], job['claim'])
+            )
+        self._notify()
+
+    def release(self, job):
+        """Put a claimed job back at the front of the queue"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("UPDATE jobs SET status = ?, lease_until = 0 WHERE id = ? AND claim = ? AND status = ?",
+                         (QUEUED, job['id'], job['claim'], RUNNING))
+        self._notify()
+
+    def get(self, job_id):
+        """The job's public state (no image), or None if unknown or expired"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT status, model, result, error, error_status, attempts, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, model, result, error, error_status, attempts, created_at, started_at, finished_at = row
+        job = {'job': job_id, 'status': status, 'model': model, 'attempts': attempts, 'created_at': created_at}
+        if started_at is not None:
+            job['wait_seconds'] = round(started_at - created_at, 3)
+        if status == DONE:
+            job['result'] = json.loads(result)
+        elif status == FAILED:
+            job['error'] = error
+            job['error_status'] = error_status
+        if finished_at is not None:
+            job['finished_at'] = finished_at
+        return job
+
+    def wait(self, job_id, timeout):
+        """Like get(), but waits up to timeout seconds for the job to finish"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] in (DONE, FAILED) or remaining <= 0:
+                return job
+            with self._changed:
+                # Woken by this process's workers; jobs finished by other processes are seen on the next poll
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def wait_for_work(self, timeout):
+        """Block until something was submitted or released in this process, or timeout"""
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def depth(self):
+        """(jobs queued, seconds the oldest has been waiting)"""
+        with self._lock:
+            count, oldest = self._connect().execute(
+                "SELECT COUNT(*), MIN(created_at) FROM jobs WHERE status = ?", (QUEUED,)
+            ).fetchone()
+        return count, (time.time() - oldest) if oldest is not None else 0.0
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        queued, oldest_wait = self.depth()
+        return {
+            'queued': queued,
+            'running': counts.get(RUNNING, 0),
+            'done': counts.get(DONE, 0),
+            'failed': counts.get(FAILED, 0),
+            'oldest_wait_seconds': round(oldest_wait, 3),
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+            'max_queued': self.max_queued,
+        }
+
+
+class JobWorkers:
+    """A pool of threads running handler(job) on claimed jobs
+
+    The handler returns the result dict; an exception fails the job with its
+    `message` and `status` attributes (str(e) and 500 by default).
+    """
+
+    def __init__(self, queue, handler, workers=4):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self._threads = []
+        self._running = {}  # thread name -> claimed job
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the threads (again in a forked child, whose parent's threads didn't survive fork())"""
+        with self._lock:
+            if self._pid == os.getpid() or self.workers <= 0:
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = [threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True)
+                             for index in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+
+    @property
+    def started(self):
+        return self._pid == os.getpid()
+
+    def _work(self):
+        name = threading.current_thread().name
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error as e:
+                print(f"Warning: Could not claim a job: {str(e)}")
+                job = None
+            if job is None:
+                self.queue.wait_for_work(self.queue.poll_interval * 2)
+                continue
+            self._running[name] = job
+            try:
+                result = self.handler(job)
+            except Exception as e:
+                self.failed += 1
+                self.queue.finish(job, error=getattr(e, 'message', str(e)), error_status=getattr(e, 'status', 500))
+            else:
+                self.completed += 1
+                self.queue.finish(job, result=result)
+            finally:
+                self._running.pop(name, None)
+
+    def stop(self, timeout=30):
+        """Stop claiming jobs, wait up to timeout for the running ones, and requeue any left"""
+        self._stopping.set()
+        self.queue._notify()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        for job in list(self._running.values()):
+            self.queue.release(job)
+
+    def stats(self):
+        return {
+            'workers': self.workers if self.started else 0,
+            'busy': len(self._running),
+            'completed': self.completed,
+            'failed': self.failed,
+        }
@@ -0,0 +1,75 @@
+"""Pre-compiled keyword matcher for the performativeness categories.
+
+All category keywords are compiled once into a single regex, so a list of
+detected items is scanned in one pass and the matched categories come out
+directly as a set.
+
+Matching has the same semantics as the original nested loop, which checked
+`keyword.lower() in item.lower()` for every item, category and keyword. The
+regex is a zero-width lookahead over a character trie of every keyword, so it
+reports the longest keyword starting at each position. A shorter keyword from
+another category that starts at the same position (e.g. "vintage" inside
+"vintage shop") is a substring of the reported one. Each keyword therefore
+maps to every category that has a keyword contained in it.
+"""
+import re
+
+
+def trie_pattern(keywords):
+    """Build a regex alternation from a character trie, preferring longer matches
+
+    Factoring shared prefixes means the engine checks one branch per position
+    instead of trying every keyword in turn.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}  # End-of-keyword marker
+
+    def build(node):
+        ends_here = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if ends_here:
+            # Greedy optional: the longer keyword wins, falling back to the shorter one
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+class KeywordMatcher:
+    """Maps free-text item descriptions to the categories whose keywords they contain"""
+
+    def __init__(self, characteristics):
+        keyword_categories = {}
+        for category, data in characteristics.items():
+            for keyword in data["items"]:
+                keyword_categories.setdefault(keyword.lower(), set()).add(category)
+
+        # A keyword implies every category with a keyword that is a substring of it
+        self._categories = {}
+        for keyword in keyword_categories:
+            implied = set()
+            for other, categories in keyword_categories.items():
+                if other in keyword:
+                    implied |= categories
+            self._categories[keyword] = frozenset(implied)
+
+        self._pattern = re.compile('(?=(' + trie_pattern(keyword_categories) + '))')
+        self._category_count = len(characteristics)
+
+    def match_categories(self, items):
+        """Return the set of categories matched by any of the items"""
+        # Keywords never contain a newline, so joining can't create cross-item matches
+        text = '\n'.join(items).lower()
+        found = set()
+        for match in self._pattern.finditer(text):
+            found |= self._categories[match.group(1)]
+            if len(found) == self._category_count:
+                break
+        return found
@@ -0,0 +1,190 @@
+"""Sessions for the live camera mode: detections merged across frames.
+
+A live session accumulates every item detected in the frames a client has
+sent, so its score only ever grows as the camera sees more of the scene.
+It also keeps a tiny grayscale thumbnail of the last frame it analyzed, so a
+frame showing the same scene is answered from the merged state instead of
+being analyzed again, and a lease so only one frame per session is analyzed
+at a time. The thumbnail comparison is the same one the browser runs before
+sending a frame (static/app.js): mean brightness difference is robust
+to sensor noise and camera shake, which flip many bits of a perceptual hash.
+
+Sessions live in SQLite: ':memory:' (the default) keeps them per process,
+while a file path shares them between worker processes.
+"""
+import json
+import os
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from io import BytesIO
+
+# Most items a session keeps; later ones are ignored
+MAX_SESSION_ITEMS = 200
+
+# Size of the grayscale thumbnails frames are compared by
+THUMBNAIL_SIZE = (32, 24)
+
+
+def frame_thumbnail(image_bytes):
+    """Grayscale THUMBNAIL_SIZE thumbnail of an encoded frame, as bytes"""
+    from PIL import Image
+
+    image = Image.open(BytesIO(image_bytes))
+    # JPEGs decode straight at a fraction of their size
+    image.draft('L', (THUMBNAIL_SIZE[0] * 4, THUMBNAIL_SIZE[1] * 4))
+    return image.convert('L').resize(THUMBNAIL_SIZE, Image.BILINEAR).tobytes()
+
+
+def thumbnail_difference(a, b):
+    """Mean absolute brightness difference (0-255) between two thumbnails"""
+    return sum(abs(x - y) for x, y in zip(a, b)) / len(a)
+
+
+def normalize_item(item):
+    """Comparison key for an item, so the same thing seen in two frames is merged"""
+    return re.sub(r'[^a-z0-9]+', ' ', item.lower()).strip()
+
+
+def merge_items(items, new_items, limit=MAX_SESSION_ITEMS):
+    """Return (merged items, the new items that were actually added)"""
+    seen = {normalize_item(item) for item in items}
+    merged = list(items)
+    added = []
+    for item in new_items:
+        key = normalize_item(item)
+        if not key or key in seen or len(merged) >= limit:
+            continue
+        seen.add(key)
+        merged.append(item)
+        added.append(item)
+    return merged, added
+
+
+class LiveSession:
+    """Merged state of one client's live camera session"""
+
+    def __init__(self, session_id, items=None, frames=0, analyzed=0, last_thumbnail=None,
+                 created_at=None, updated_at=None):
+        self.id = session_id
+        self.items = items or []
+        self.frames = frames
+        self.analyzed = analyzed
+        self.last_thumbnail = last_thumbnail
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+
+    def summary(self):
+        return {
+            'session': self.id,
+            'frames': self.frames,
+            'analyzed': self.analyzed,
+            'unchanged': self.frames - self.analyzed,
+            'duration': round(self.updated_at - self.created_at, 1),
+        }
+
+
+class LiveSessionStore:
+    """Live sessions kept in SQLite, expiring after ttl_seconds without a frame"""
+
+    def __init__(self, path=':memory:', ttl_seconds=900):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self.created = 0
+        self.expired = 0
+
+    def _connect(self):
+        # Caller holds self._lock. Connections must not cross fork(), so each process opens its own
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            if self.path != ':memory:':
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS live_sessions ("
+                "id TEXT PRIMARY KEY, items TEXT NOT NULL, frames INTEGER NOT NULL, analyzed INTEGER NOT NULL, "
+                "last_thumbnail BLOB, created_at REAL NOT NULL, updated_at REAL NOT NULL, busy_until REAL NOT NULL DEFAULT 0)"
+            )
+            self._conn.commit()
+            self._pid = os.getpid()
+        return self._conn
+
+    def create(self):
+        """Start a new session (and drop expired ones)"""
+        session = LiveSession(secrets.token_urlsafe(12))
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute("DELETE FROM live_sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+            self.expired += cursor.rowcount
+            self.created += 1
+        self.save(session)
+        return session
+
+    def get(self, session_id):
+        """Return the session, or None if it doesn't exist or has expired"""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT items, frames, analyzed, last_thumbnail, created_at, updated_at FROM live_sessions WHERE id = ?",
+                (session_id,)
+            ).fetchone()
+        if row is None or row[5] < time.time() - self.ttl_seconds:
+            return None
+        items, frames, analyzed, last_thumbnail, created_at, updated_at = row
+        return LiveSession(session_id, json.loads(items), frames, analyzed, last_thumbnail, created_at, updated_at)
+
+    def claim(self, session_id, lease_seconds=120):
+        """Mark the session busy with a frame; False if another frame holds it
+
+        The lease is released by save() or release(), and lapses after
+        lease_seconds in case its holder died.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                "UPDATE live_sessions SET busy_until = ? WHERE id = ? AND busy_until < ?",
+                (now + lease_seconds, session_id, now)
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+
+    def release(self, session_id):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("UPDATE live_sessions SET busy_until = 0 WHERE id = ?", (session_id,))
+            conn.commit()
+
+    def save(self, session):
+        """Write the session back, releasing its lease"""
+        session.updated_at = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO live_sessions (id, items, frames, analyzed, last_thumbnail, created_at, updated_at, busy_until) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                (session.id, json.dumps(session.items), session.frames, session.analyzed,
+                 session.last_thumbnail, session.created_at, session.updated_at)
+            )
+            conn.commit()
+
+    def delete(self, session_id):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM live_sessions WHERE id = ?", (session_id,))
+            conn.commit()
+
+    def stats(self):
+        with self._lock:
+            active = self._connect().execute(
+                "SELECT COUNT(*) FROM live_sessions WHERE updated_at >= ?", (time.time() - self.ttl_seconds,)
+            ).fetchone()[0]
+            return {
+                'active': active,
+                'created': self.created,
+                'expired': self.expired,
+                'ttl_seconds': self.ttl_seconds,
+            }
@@ -0,0 +1,94 @@
+"""Process memory readings: resident set size, and its peak while a request is handled.
+
+Linux keeps a high-water mark of each process's RSS (VmHWM) and lets the
+process reset it (/proc/self/clear_refs). PeakMemoryTracker resets it when a
+request starts with no other request in flight, and reads it when the request
+finishes, so each request reports how far it pushed the process's memory
+above where it started. Requests handled at the same time share one peak, so
+with several threads per worker their figures include each other's.
+
+Elsewhere (no /proc) only the current RSS is reported, from getrusage().
+"""
+import os
+import resource
+import threading
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes():
+    """The process's resident set size right now"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        # Not Linux: the lifetime peak is the best available reading (kB on Linux, bytes on macOS)
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == 'Darwin' else maxrss * 1024
+
+
+def peak_rss_bytes():
+    """The process's RSS high-water mark since it started or was last reset, or None without /proc"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Reset the high-water mark to the current RSS; False where that isn't possible"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class PeakMemoryTracker:
+    """Peak RSS per request, from the kernel's resettable high-water mark"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = 0
+        self.enabled = reset_peak_rss()
+        self.process_peak = peak_rss_bytes() or 0
+
+    def start(self):
+        """A request starts: returns the RSS it starts from, or None when peaks can't be measured"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self._active == 0:
+                self._note_peak()
+                reset_peak_rss()
+            self._active += 1
+        return rss_bytes()
+
+    def finish(self, started_rss):
+        """A request finished: returns how many bytes its peak RSS was above started_rss"""
+        if started_rss is None:
+            return None
+        with self._lock:
+            self._active -= 1
+            peak = self._note_peak()
+        return max(0, peak - started_rss)
+
+    def _note_peak(self):
+        # Caller holds self._lock. Kept across resets, as the process's peak since it started
+        peak = peak_rss_bytes() or 0
+        self.process_peak = max(self.process_peak, peak)
+        return peak
+
+    def stats(self):
+        with self._lock:
+            process_peak = max(self.process_peak, peak_rss_bytes() or 0)
+        return {
+            'rss_bytes': rss_bytes(),
+            'peak_rss_bytes': process_peak or None,
+            'per_request_peaks': self.enabled,
+        }
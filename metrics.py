@@ -0,0 +1,208 @@
+"""Minimal Prometheus-style metrics: counters, histograms, gauges and per-request stage timings.
+
+Metrics live in a MetricsRegistry and are rendered in the Prometheus text
+exposition format by render(), which the app serves at /metrics. Stage
+timings and Gemini token counts recorded while a request is being handled are
+also collected on a RequestTimings object (tracked per request with a context
+variable), so the response can carry a Server-Timing header and the tokens a
+request used can be observed when it finishes.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; spans in-memory stages (sub-millisecond) up to slow Gemini calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label set"""
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}_total{format_labels(self.labelnames, key)} {format_value(value)}'
+
+
+class Histogram:
+    """Observations bucketed by upper bound, with a running sum and count per label set"""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> [bucket counts..., sum]
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(state) for key, state in self._values.items()}
+        for key, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = [('le', format_value(bound))]
+                yield f'{self.name}_bucket{format_labels(self.labelnames, key, le)} {cumulative}'
+            yield f'{self.name}_sum{format_labels(self.labelnames, key)} {format_value(state[-1])}'
+            yield f'{self.name}_count{format_labels(self.labelnames, key)} {cumulative}'
+
+
+class Gauge:
+    """A current value, read by a function each time metrics are rendered"""
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, read):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def samples(self):
+        yield f'{self.name} {format_value(self.read())}'
+
+
+class MetricsRegistry:
+    """A set of metrics rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, documentation, read):
+        metric = Gauge(name, documentation, read)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            exposed_name = f'{metric.name}_total' if metric.type == 'counter' else metric.name
+            lines.append(f'# HELP {exposed_name} {metric.documentation}')
+            lines.append(f'# TYPE {exposed_name} {metric.type}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+class RequestTimings:
+    """Stage durations (in order) and Gemini tokens recorded while handling one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.started_rss = None  # Set when peak memory is tracked (memory.PeakMemoryTracker)
+
+    def add(self, stage, seconds):
+        self.stages.append((stage, seconds))
+
+    def server_timing(self):
+        """Format the stages as a Server-Timing header value (durations in ms)"""
+        entries = [f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in self.stages]
+        entries.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(entries)
+
+
+_current_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def start_request_timings():
+    """Begin collecting stage timings for the request being handled in this context"""
+    timings = RequestTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+def current_request_timings():
+    return _current_timings.get()
+
+
+def add_request_timing(stage, seconds):
+    """Add a duration to the current request's timings, if one is being collected"""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+def add_request_tokens(prompt_tokens, output_tokens):
+    """Add a Gemini call's token usage to the current request, if one is being collected"""
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.prompt_tokens += prompt_tokens
+        timings.output_tokens += output_tokens
+
+
+def record_stage(histogram, stage, seconds, **labels):
+    """Observe a stage duration and add it to the current request's timings"""
+    histogram.observe(seconds, stage=stage, **labels)
+    add_request_timing(stage, seconds)
+
+
+@contextmanager
+def timed_stage(histogram, stage, **labels):
+    """Time the enclosed block as a stage (recorded even if it raises)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(histogram, stage, time.perf_counter() - started, **labels)
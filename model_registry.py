@@ -0,0 +1,165 @@
+"""Long-lived registry of configured Gemini models.
+
+Each model variant is constructed once at startup with its generation config
+and safety settings baked in, so requests don't rebuild models, configs or
+safety enums. All models share the library's process-wide client, whose gRPC
+channel can be connected ahead of the first request with warm_up().
+
+The client library takes most of a second to import, so it is imported (and
+configured with the API key) only when the first model is built: on the first
+request, or ahead of it by warm_up().
+
+Traffic can be pinned to a model by name or split across variants by weight.
+"""
+import functools
+import random
+import threading
+
+_genai_lock = threading.Lock()
+_configured_api_key = None
+
+
+def load_genai(api_key=None):
+    """Import google.generativeai, configuring it with api_key the first time it is given"""
+    global _configured_api_key
+    import google.generativeai as genai
+
+    with _genai_lock:
+        if api_key is not None and api_key != _configured_api_key:
+            genai.configure(api_key=api_key)
+            _configured_api_key = api_key
+    return genai
+
+
+@functools.lru_cache(maxsize=None)
+def supports_generation_field(name):
+    """Whether the installed client library knows a GenerationConfig field"""
+    import google.ai.generativelanguage as glm
+
+    return name in glm.GenerationConfig.meta.fields
+
+
+def _resolve(value):
+    return value() if callable(value) else value
+
+
+class ModelEntry:
+    """A configured model variant
+
+    Its models are built on first use. The safety settings and the structured
+    and compact configs may be zero-argument callables, called then, so
+    building them can use the client library without importing it at startup.
+    """
+
+    def __init__(self, name, generation_config, safety_settings, structured_generation_config=None,
+                 compact_generation_config=None, api_key=None):
+        self.name = name
+        self.generation_config = generation_config
+        self.safety_settings = safety_settings
+        self.api_key = api_key
+        self._structured_generation_config = structured_generation_config
+        self._compact_generation_config = compact_generation_config
+
+    def _build(self, generation_config, safety_settings=None):
+        genai = load_genai(self.api_key)
+        return genai.GenerativeModel(
+            self.name,
+            generation_config=_resolve(generation_config) or self.generation_config,
+            safety_settings=_resolve(safety_settings)
+        )
+
+    @functools.cached_property
+    def model(self):
+        return self._build(self.generation_config, self.safety_settings)
+
+    @functools.cached_property
+    def fallback_model(self):
+        # Same model without the safety override, used when a call with it fails
+        return self._build(self.generation_config)
+
+    @functools.cached_property
+    def structured_model(self):
+        # Same model asking for JSON output, used by the single-call structured mode
+        return self._build(self._structured_generation_config, self.safety_settings)
+
+    @functools.cached_property
+    def compact_model(self):
+        # Same model with a tighter output cap, used by the compact prompt
+        return self._build(self._compact_generation_config, self.safety_settings)
+
+    @property
+    def models(self):
+        return [self.model, self.fallback_model, self.structured_model, self.compact_model]
+
+
+class ModelRegistry:
+    """Named model variants plus weighted routing between them"""
+
+    def __init__(self, default_name, api_key=None):
+        self.default_name = default_name
+        self.api_key = api_key
+        self._entries = {}
+        self._weights = {}
+        self._warm_lock = threading.Lock()
+        self.warmed = False
+
+    def register(self, name, generation_config, safety_settings, weight=0, structured_generation_config=None,
+                 compact_generation_config=None):
+        self._entries[name] = ModelEntry(name, generation_config, safety_settings, structured_generation_config,
+                                         compact_generation_config, self.api_key)
+        if weight > 0:
+            self._weights[name] = weight
+        return self._entries[name]
+
+    @property
+    def names(self):
+        return list(self._entries)
+
+    @property
+    def entries(self):
+        return list(self._entries.values())
+
+    def get(self, name=None):
+        """Return the entry for name, or route by weight (falling back to the default)"""
+        if name:
+            return self._entries[name]  # KeyError for unknown models
+        if self._weights:
+            names = list(self._weights)
+            return self._entries[random.choices(names, weights=[self._weights[n] for n in names])[0]]
+        return self._entries[self.default_name]
+
+    def load(self):
+        """Import the client library and build every model, without connecting anything
+
+        Safe before fork(), so a preloading server can do it once for all workers.
+        """
+        load_genai(self.api_key)
+        for entry in self._entries.values():
+            entry.models  # Built on first access
+
+    def warm_up(self, timeout=5):
+        """Create the shared clients and connect their channels before the first request
+
+        Call this in each serving process (after any fork): gRPC channels must
+        not be shared across fork().
+        """
+        with self._warm_lock:
+            if self.warmed:
+                return
+            load_genai(self.api_key)
+            from google.generativeai import client as genai_client
+
+            generative_client = genai_client.get_default_generative_client()
+            for entry in self._entries.values():
+                for model in entry.models:
+                    model._client = generative_client
+
+            channel = getattr(getattr(generative_client, '_transport', None), 'grpc_channel', None)
+            if channel is not None:
+                try:
+                    import grpc
+                    grpc.channel_ready_future(channel).result(timeout=timeout)
+                except Exception as e:
+                    # Not fatal: the first request will connect instead
+                    print(f"Warning: Gemini channel warm-up did not complete: {str(e)}")
+            self.warmed = True
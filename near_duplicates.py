@@ -0,0 +1,176 @@
+"""Perceptual-hash index for reusing results across near-identical uploads.
+
+The exact result cache only helps when the same bytes come back. The same photo
+re-captured through the camera canvas, re-compressed by a messaging app or
+cropped slightly has different bytes but almost the same difference hash
+(dHash): a 64-bit fingerprint of the brightness gradients in a tiny grayscale
+thumbnail. Re-encoding flips a few of its bits at most, a different photo
+about half of them.
+
+NearDuplicateIndex keeps the hashes of previously analyzed images and finds
+the closest one within a Hamming-distance threshold.
+"""
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+# Thumbnails whose brightness varies less than this have no real gradients: their
+# hash is mostly noise (or all zeros), so blank and near-blank frames are never matched
+MIN_CONTRAST = 16
+
+
+def dhash(image, hash_size=HASH_SIZE, min_contrast=MIN_CONTRAST):
+    """Difference hash of a Pillow image as an int of hash_size * hash_size bits
+
+    Returns None for images too flat to fingerprint.
+    """
+    from PIL import Image
+
+    thumbnail = image.convert('L').resize((hash_size + 1, hash_size), Image.BOX)
+    low, high = thumbnail.getextrema()
+    if high - low < min_contrast:
+        return None
+    pixels = list(thumbnail.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def image_dhash(image_bytes):
+    """dHash of encoded image bytes, taken upright (EXIF orientation applied), or None"""
+    from PIL import Image, ImageOps
+
+    image = Image.open(BytesIO(image_bytes))
+    # JPEGs decode at 1/8 scale: the hash only needs a 9x8 thumbnail
+    image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+    return dhash(ImageOps.exif_transpose(image))
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def band_masks(max_distance, bits=HASH_BITS):
+    """Split the hash into max_distance + 1 bit ranges, as (shift, mask) pairs
+
+    Two hashes within max_distance bits of each other differ in at most
+    max_distance of the bands, so they agree exactly on at least one.
+    """
+    bands = max(1, min(bits, max_distance + 1))
+    width, extra = divmod(bits, bands)
+    masks = []
+    shift = 0
+    for band in range(bands):
+        band_width = width + (1 if band < extra else 0)
+        masks.append((shift, (1 << band_width) - 1))
+        shift += band_width
+    return masks
+
+
+class NearDuplicateIndex:
+    """Bounded LRU of perceptual hashes, searchable by Hamming distance
+
+    Every entry lives in a namespace (the prompt, model, catalogue version...
+    its result depends on) and points at a target, e.g. a result cache key.
+    Entries are bucketed by each band of their hash, so a lookup only compares
+    against entries sharing at least one band instead of scanning them all.
+    """
+
+    def __init__(self, max_entries=4096, max_distance=4):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._masks = band_masks(max_distance)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # target -> (namespace, hash)
+        self._buckets = {}  # (namespace, band, band value) -> set of targets
+
+        self.lookups = 0
+        self.hits = 0
+        self.stale = 0
+        self.hit_distances = {}
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _band_keys(self, namespace, value):
+        for band, (shift, mask) in enumerate(self._masks):
+            yield namespace, band, (value >> shift) & mask
+
+    def _remove(self, target):
+        # Caller holds self._lock
+        namespace, value = self._entries.pop(target)
+        for key in self._band_keys(namespace, value):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(target)
+                if not bucket:
+                    del self._buckets[key]
+
+    def add(self, namespace, value, target):
+        """Index value under namespace, pointing at target"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if target in self._entries:
+                self._remove(target)
+            self._entries[target] = (namespace, value)
+            for key in self._band_keys(namespace, value):
+                self._buckets.setdefault(key, set()).add(target)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def candidates(self, namespace, value):
+        """Return [(distance, target)] within max_distance, nearest first"""
+        with self._lock:
+            targets = set()
+            for key in self._band_keys(namespace, value):
+                targets.update(self._buckets.get(key, ()))
+            found = []
+            for target in targets:
+                distance = hamming_distance(value, self._entries[target][1])
+                if distance <= self.max_distance:
+                    found.append((distance, target))
+        return sorted(found)
+
+    def lookup(self, namespace, value, resolve):
+        """Return (resolve(target), distance) for the nearest entry resolve() still has, or (None, None)
+
+        Targets that resolve() returns None for (e.g. expired from the result
+        cache) are dropped from the index.
+        """
+        for distance, target in self.candidates(namespace, value):
+            resolved = resolve(target)
+            with self._lock:
+                if resolved is None:
+                    if target in self._entries:
+                        self._remove(target)
+                        self.stale += 1
+                    continue
+                if target in self._entries:
+                    self._entries.move_to_end(target)
+                self.lookups += 1
+                self.hits += 1
+                self.hit_distances[distance] = self.hit_distances.get(distance, 0) + 1
+            return resolved, distance
+        with self._lock:
+            self.lookups += 1
+        return None, None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'stale': self.stale,
+                'hit_distances': dict(sorted(self.hit_distances.items())),
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'max_distance': self.max_distance,
+            }
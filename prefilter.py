@@ -0,0 +1,133 @@
+"""CPU-only pre-filter that spots uploads with obviously nothing to detect.
+
+Blank frames (lens cap, black or white screens), near-uniform colour and
+captures too blurry to make anything out are recognised from cheap statistics
+of a small grayscale copy, so they can get the zero-score answer without a
+multi-second Gemini call:
+
+- contrast: standard deviation of brightness (0-255)
+- entropy: Shannon entropy of the brightness histogram, in bits (0-8)
+- sharpness: variance of an edge-filtered copy; blur removes edges
+
+A local classifier can be plugged in for what statistics can't tell apart
+(e.g. screenshots with no people or objects): any callable that takes a
+Pillow RGB image and returns the probability (0-1) that it shows something
+worth analyzing.
+"""
+import importlib
+import threading
+from io import BytesIO
+
+# Longest edge of the copy the statistics are computed on, so thresholds
+# don't depend on the upload's resolution
+STATS_EDGE = 256
+
+# Why an image was skipped, as shown to the user
+REASONS = {
+    'uniform': 'the image is blank or a single flat colour',
+    'low_entropy': 'the image is almost empty',
+    'blurry': 'the image is too blurry to make anything out',
+    'classifier': "the image doesn't seem to show anything worth analyzing",
+}
+
+
+def load_classifier(spec):
+    """Import a 'module:function' classifier, or return None if spec is empty"""
+    if not spec:
+        return None
+    module_name, _, attribute = spec.partition(':')
+    return getattr(importlib.import_module(module_name), attribute or 'classify')
+
+
+def image_statistics(image):
+    """Contrast, entropy and sharpness of a Pillow image, measured in grayscale"""
+    from PIL import ImageFilter, ImageStat
+
+    gray = image.convert('L')
+    edges = gray.filter(ImageFilter.FIND_EDGES)
+    # The filter's outermost pixels compare against the border, not the image
+    edges = edges.crop((1, 1, max(2, edges.width - 1), max(2, edges.height - 1)))
+    return {
+        'contrast': ImageStat.Stat(gray).stddev[0],
+        'entropy': gray.entropy(),
+        'sharpness': ImageStat.Stat(edges).var[0],
+    }
+
+
+class Prefilter:
+    """Decides whether an upload is worth a Gemini call
+
+    min_contrast / min_entropy / min_sharpness: an image below any of these is skipped
+    classifier:            optional callable(image) -> probability the image is worth analyzing
+    classifier_threshold:  images the classifier scores below this are skipped
+    """
+
+    def __init__(self, min_contrast=4.0, min_entropy=1.0, min_sharpness=3.0, classifier=None,
+                 classifier_threshold=0.1):
+        self.min_contrast = min_contrast
+        self.min_entropy = min_entropy
+        self.min_sharpness = min_sharpness
+        self.classifier = classifier
+        self.classifier_threshold = classifier_threshold
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.skipped = {}
+        self.classifier_errors = 0
+
+    def check(self, image_bytes):
+        """Return the reason to skip the image (a REASONS key), or None to analyze it
+
+        Images Pillow can't open are passed through, so the normal pipeline
+        reports the error.
+        """
+        from PIL import Image
+
+        try:
+            image = Image.open(BytesIO(image_bytes))
+            # JPEGs decode straight at a fraction of their size
+            image.draft('RGB', (STATS_EDGE, STATS_EDGE))
+            image = image.convert('RGB')
+            image.thumbnail((STATS_EDGE, STATS_EDGE))
+        except Exception:
+            return None
+
+        statistics = image_statistics(image)
+        reason = None
+        if statistics['contrast'] < self.min_contrast:
+            reason = 'uniform'
+        elif statistics['entropy'] < self.min_entropy:
+            reason = 'low_entropy'
+        elif statistics['sharpness'] < self.min_sharpness:
+            reason = 'blurry'
+        elif self.classifier is not None:
+            try:
+                if self.classifier(image) < self.classifier_threshold:
+                    reason = 'classifier'
+            except Exception as e:
+                # A broken classifier must never block analyses
+                print(f"Warning: Pre-filter classifier failed: {str(e)}")
+                with self._lock:
+                    self.classifier_errors += 1
+
+        with self._lock:
+            self.checked += 1
+            if reason is not None:
+                self.skipped[reason] = self.skipped.get(reason, 0) + 1
+        return reason
+
+    def stats(self):
+        with self._lock:
+            return {
+                'checked': self.checked,
+                'skipped': dict(self.skipped),
+                # Each skipped image is at least one Gemini call not made
+                'saved_calls': sum(self.skipped.values()),
+                'classifier': self.classifier is not None,
+                'classifier_errors': self.classifier_errors,
+                'thresholds': {
+                    'min_contrast': self.min_contrast,
+                    'min_entropy': self.min_entropy,
+                    'min_sharpness': self.min_sharpness,
+                    'classifier_threshold': self.classifier_threshold,
+                },
+            }
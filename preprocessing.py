@@ -0,0 +1,165 @@
+"""Server-side image preprocessing before the Gemini call.
+
+Uploads are oriented according to their EXIF data, fitted to a maximum edge
+length, converted to RGB and re-encoded once. The encoded payload is what gets
+sent upstream, so every Gemini call made for a request reuses the same small
+blob instead of re-encoding a full-resolution Pillow image each time.
+
+check_pixel_budget() reads only an image's header, so oversized images (and
+decompression bombs, whose few kilobytes expand to gigabytes of pixels) are
+refused before anything allocates their bitmap.
+"""
+import threading
+import time
+from io import BytesIO
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+}
+
+
+class ImageTooLarge(ValueError):
+    """Decoding the image would take more pixels than allowed"""
+
+
+class PreparedImage:
+    """An encoded image ready to send to Gemini, plus what it cost to produce"""
+
+    def __init__(self, data, mime_type, width, height, bytes_in, timings=None):
+        self.data = data
+        self.mime_type = mime_type
+        self.width = width
+        self.height = height
+        self.bytes_in = bytes_in
+        # Seconds spent per step: 'image_open', 'image_resize', 'image_encode'
+        self.timings = timings or {}
+
+    @property
+    def bytes_out(self):
+        return len(self.data)
+
+    def as_part(self):
+        """Return the image as a Gemini content part (a blob dict)"""
+        return {'mime_type': self.mime_type, 'data': self.data}
+
+
+class PreprocessStats:
+    """Running totals of how much preprocessing shrank the uploads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.passthrough = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def record(self, prepared, passthrough=False):
+        with self._lock:
+            self.images += 1
+            self.passthrough += int(passthrough)
+            self.bytes_in += prepared.bytes_in
+            self.bytes_out += prepared.bytes_out
+
+    def stats(self):
+        with self._lock:
+            return {
+                'images': self.images,
+                'passthrough': self.passthrough,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'ratio': round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+            }
+
+
+def fit_size(size, max_edge):
+    """Scale (width, height) down so the longest edge is at most max_edge"""
+    width, height = size
+    longest = max(width, height)
+    if not max_edge or longest <= max_edge:
+        return width, height
+    scale = max_edge / longest
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def check_pixel_budget(image_bytes, max_pixels, max_edge=None):
+    """Raise ImageTooLarge if decoding image_bytes takes more than max_pixels; returns the decoded size
+
+    Only the header is read. JPEGs count at the size draft() decodes them at
+    for max_edge (as little as 1/8 of each side), so large photos pass; other
+    formats can only be decoded in full. Unreadable data passes, and decoding
+    it later reports the error.
+    """
+    from PIL import Image
+
+    try:
+        image = Image.open(BytesIO(image_bytes))
+    except Image.DecompressionBombError as e:
+        # Over twice Pillow's own limit: refused before its size is even known here
+        raise ImageTooLarge(str(e))
+    except Exception:
+        return None
+    width, height = image.size
+    if max_edge and image.format == 'JPEG':
+        image.draft('RGB', fit_size(image.size, max_edge))
+    if max_pixels and image.width * image.height > max_pixels:
+        raise ImageTooLarge(f'The image is {width}x{height} pixels; at most {max_pixels / 1e6:.0f} megapixels can be decoded.')
+    return image.size
+
+
+def preprocess_image(image_bytes, max_edge=1536, image_format='JPEG', quality=85, stats=None):
+    """Orient, downscale and re-encode raw upload bytes into a PreparedImage
+
+    Large JPEGs are decoded with draft() so libjpeg scales them down by 1/2, 1/4
+    or 1/8 while decoding, and the final resize goes through thumbnail(), which
+    uses Image.reduce() before resampling. The full-resolution bitmap of a phone
+    photo is never materialized. The image is shrunk before it is rotated and
+    converted, so only one full-size bitmap is held at a time.
+    """
+    image_format = image_format.upper()
+    if image_format not in MIME_TYPES:
+        raise ValueError(f'Unsupported preprocessing format: {image_format}')
+
+    from PIL import Image, ImageOps
+
+    started = time.perf_counter()
+    image = Image.open(BytesIO(image_bytes))
+    source_format = image.format
+    orientation = image.getexif().get(0x0112, 1)  # EXIF Orientation tag
+    timings = {'image_open': time.perf_counter() - started}
+
+    # Images already in the target format, upright and small enough are sent as-is
+    if (source_format == image_format and orientation == 1 and image.mode == 'RGB'
+            and fit_size(image.size, max_edge) == image.size):
+        prepared = PreparedImage(image_bytes, MIME_TYPES[image_format],
+                                 image.width, image.height, len(image_bytes), timings)
+        if stats is not None:
+            stats.record(prepared, passthrough=True)
+        return prepared
+
+    started = time.perf_counter()
+    if max_edge and source_format == 'JPEG':
+        # Request the aspect-correct target so draft() picks the largest safe scale
+        image.draft('RGB', fit_size(image.size, max_edge))
+
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        # Palette and bilevel images can only be resized with NEAREST, so they are converted first
+        image = image.convert('RGB')
+    if max_edge:
+        # In place, and the box is square, so rotating afterwards gives the same size
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS, reducing_gap=2.0)
+    ImageOps.exif_transpose(image, in_place=True)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    # Decoding is lazy, so this includes the actual (draft-reduced) JPEG decode
+    timings['image_resize'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    output = BytesIO()
+    image.save(output, format=image_format, quality=quality)
+    timings['image_encode'] = time.perf_counter() - started
+    prepared = PreparedImage(output.getvalue(), MIME_TYPES[image_format],
+                             image.width, image.height, len(image_bytes), timings)
+    if stats is not None:
+        stats.record(prepared)
+    return prepared
@@ -0,0 +1,213 @@
+"""Content-addressed cache for Gemini analysis results.
+
+Entries are keyed on a digest of the uploaded image bytes together with the
+prompt and model name, so a re-upload or retry of the same photo can skip the
+upstream call entirely. There is a bounded in-process LRU tier with a TTL and
+an optional SQLite tier that survives restarts.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def image_digest(image_bytes):
+    """Return the hex SHA-256 digest of the raw image bytes"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def make_cache_key(digest, *parts):
+    """Combine an image digest with the prompt, model name, etc. into one key"""
+    key = hashlib.sha256(digest.encode('utf-8'))
+    for part in parts:
+        key.update(b'\0')
+        key.update(str(part).encode('utf-8'))
+    return key.hexdigest()
+
+
+class _DiskTier:
+    """SQLite-backed second tier, shared by every process pointing at the same file
+
+    The file is in WAL mode so worker processes read it concurrently while one
+    writes. Connections must not cross fork(), so each process opens its own
+    on first use. Every trim_every writes, a process deletes the expired rows
+    and, beyond max_entries, the oldest ones, so the file stays bounded.
+    """
+
+    def __init__(self, path, ttl_seconds, max_entries=100000, trim_every=256):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.trim_every = trim_every
+        self.expirations = 0
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        # Every entry has the same TTL, so expiry order is also write order
+        conn.execute("CREATE INDEX IF NOT EXISTS results_by_expiry ON results (expires_at)")
+        conn.commit()
+
+    def _connect(self):
+        # Caller holds self._lock, or is __init__
+        if self._pid != os.getpid():
+            # A connection inherited from the parent process is abandoned, never used or closed
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key):
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value, expires_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < time.time():
+            return None
+        return json.loads(value), expires_at
+
+    def put(self, key, value, expires_at):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires_at)
+            )
+            self._writes += 1
+            if self._writes % self.trim_every == 0:
+                self._purge_expired(conn)
+                self._evict_oldest(conn)
+            conn.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            conn = self._connect()
+            purged = self._purge_expired(conn)
+            conn.commit()
+        return purged
+
+    def _purge_expired(self, conn):
+        # Caller holds self._lock and commits
+        purged = conn.execute("DELETE FROM results WHERE expires_at < ?", (time.time(),)).rowcount
+        self.expirations += purged
+        return purged
+
+    def _evict_oldest(self, conn):
+        # Caller holds self._lock and commits
+        excess = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.evictions += conn.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY expires_at LIMIT ?)", (excess,)
+            ).rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+
+class ResultCache:
+    """Two-tier (memory LRU + optional SQLite) cache of JSON-serializable results"""
+
+    def __init__(self, max_entries=1024, ttl_seconds=86400, disk_path=None, disk_max_entries=100000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._disk = _DiskTier(disk_path, ttl_seconds, disk_max_entries) if disk_path else None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 or self._disk is not None
+
+    def get(self, key, record_stats=True):
+        """Return the cached value for key, or None on a miss
+
+        record_stats=False leaves the hit/miss counters alone, for secondary
+        lookups that aren't a request's own cache check.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += int(record_stats)
+                    return value
+                # Stale entry - drop it and fall through to the disk tier
+                del self._entries[key]
+                self.expirations += 1
+
+        if self._disk is not None:
+            found = self._disk.get(key)
+            if found is not None:
+                value, expires_at = found
+                with self._lock:
+                    self.disk_hits += int(record_stats)
+                    self._store(key, value, expires_at)
+                return value
+
+        with self._lock:
+            self.misses += int(record_stats)
+        return None
+
+    def put(self, key, value):
+        """Store value under key in every enabled tier"""
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self._disk is not None:
+            try:
+                self._disk.put(key, value, expires_at)
+            except sqlite3.Error as e:
+                print(f"Warning: Could not write result cache entry to disk: {str(e)}")
+
+    def _store(self, key, value, expires_at):
+        # Caller holds self._lock
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """Return hit/miss/eviction counters for both tiers"""
+        with self._lock:
+            stats = {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+            }
+        if self._disk is not None:
+            stats['disk_path'] = self._disk.path
+            stats['disk_size'] = len(self._disk)
+            stats['disk_max_entries'] = self._disk.max_entries
+            stats['disk_expirations'] = self._disk.expirations
+            stats['disk_evictions'] = self._disk.evictions
+        return stats
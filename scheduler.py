@@ -0,0 +1,231 @@
+"""Rate-limit-aware scheduler for upstream Gemini calls.
+
+Every generate_content call goes through one GeminiScheduler, which:
+
+- enforces requests-per-minute and tokens-per-minute budgets with token
+  buckets. Callers reserve capacity up front and are told how long to wait,
+  so queued calls start in arrival order instead of stampeding whenever
+  capacity frees up;
+- rejects a call immediately if its reserved start time would be past its
+  deadline, so queueing stays bounded;
+- treats an upstream 429 as a signal: it pauses everyone for a jittered,
+  exponentially growing backoff, halves the send rate and then recovers it
+  gradually, and retries the call within its deadline;
+- coalesces identical in-flight calls (same key), so concurrent requests
+  for the same image and prompt share a single upstream call.
+"""
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+
+def too_many_requests_error():
+    """google.api_core's 429 exception, imported on first use (it is slow to import)"""
+    from google.api_core.exceptions import TooManyRequests
+    return TooManyRequests
+
+
+class SchedulerTimeout(Exception):
+    """A call could not be started before its deadline"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills at rate tokens per second up to capacity; reservations may overdraw it"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now, rate_scale):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate * rate_scale)
+        self.updated = now
+
+    def reserve(self, amount, now, rate_scale=1.0):
+        """Take amount tokens and return how many seconds until they are actually available"""
+        self._refill(now, rate_scale)
+        self.tokens -= amount
+        return max(0.0, -self.tokens / (self.rate * rate_scale))
+
+    def cancel(self, amount):
+        """Return a reservation that will not be used"""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class GeminiScheduler:
+    """Admission, adaptive backoff and coalescing for upstream calls
+
+    rpm / tpm:       per-minute request and token budgets (0 = unlimited)
+    queue_timeout:   default seconds a call may wait to start (its deadline)
+    backoff_base:    first pause after a 429, doubled on each consecutive one
+    backoff_max:     longest pause after a 429
+    min_rate_scale:  lowest fraction of the configured rate adaptive backoff may drop to
+    wait_histogram:  optional histogram observing each call's queueing delay
+    """
+
+    def __init__(self, rpm=0, tpm=0, queue_timeout=20.0, backoff_base=1.0, backoff_max=30.0,
+                 min_rate_scale=0.1, wait_histogram=None):
+        # Both buckets allow a burst of up to ten seconds' worth of budget
+        self.request_bucket = TokenBucket(rpm / 60.0, max(1.0, rpm / 6.0)) if rpm else None
+        self.token_bucket = TokenBucket(tpm / 60.0, tpm / 6.0) if tpm else None
+        self.queue_timeout = queue_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.min_rate_scale = min_rate_scale
+        self.wait_histogram = wait_histogram
+
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.rate_scale = 1.0
+        self.paused_until = 0.0
+        self.last_throttled_at = 0.0
+        self.consecutive_throttles = 0
+
+        self.calls = 0
+        self.coalesced = 0
+        self.throttled = 0
+        self.rejected = 0
+
+    def _reserve(self, tokens, deadline):
+        """Reserve capacity for one call; return its delay or raise SchedulerTimeout"""
+        with self._lock:
+            now = time.monotonic()
+            delays = [max(0.0, self.paused_until - now)]
+            if self.request_bucket:
+                delays.append(self.request_bucket.reserve(1, now, self.rate_scale))
+            if self.token_bucket:
+                delays.append(self.token_bucket.reserve(min(tokens, self.token_bucket.capacity), now, self.rate_scale))
+            delay = max(delays)
+            if now + delay > deadline:
+                # Give the capacity back: this call will never use it
+                if self.request_bucket:
+                    self.request_bucket.cancel(1)
+                if self.token_bucket:
+                    self.token_bucket.cancel(min(tokens, self.token_bucket.capacity))
+                self.rejected += 1
+                raise SchedulerTimeout('Gemini rate limit queue is full. Please try again shortly.',
+                                       retry_after=max(1, round(delay)))
+        if self.wait_histogram is not None:
+            self.wait_histogram.observe(delay)
+        return delay
+
+    def _on_throttled(self, started):
+        """Upstream said 429: pause all calls and slow down"""
+        with self._lock:
+            self.throttled += 1
+            if started < self.last_throttled_at:
+                # Sent before the previous 429 was handled: part of the same burst, already backing off
+                return
+            self.last_throttled_at = time.monotonic()
+            self.consecutive_throttles += 1
+            self.rate_scale = max(self.min_rate_scale, self.rate_scale / 2)
+            backoff = min(self.backoff_max, self.backoff_base * 2 ** (self.consecutive_throttles - 1))
+            self.paused_until = max(self.paused_until, time.monotonic() + backoff * random.uniform(0.5, 1.5))
+
+    def _on_success(self):
+        with self._lock:
+            self.calls += 1
+            self.consecutive_throttles = 0
+            if self.rate_scale < 1.0:
+                # Recover additively: 20 good calls bring a halved rate back to full
+                self.rate_scale = min(1.0, self.rate_scale + 0.05)
+
+    def _join_or_lead(self, key):
+        """Return (future, is_leader) for a coalescing key"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _run(self, call, tokens, deadline):
+        while True:
+            time.sleep(self._reserve(tokens, deadline))
+            started = time.monotonic()
+            try:
+                result = call()
+            except too_many_requests_error():
+                self._on_throttled(started)
+                continue  # _reserve raises SchedulerTimeout once the deadline can't be met
+            self._on_success()
+            return result
+
+    async def _run_async(self, call, tokens, deadline):
+        while True:
+            await asyncio.sleep(self._reserve(tokens, deadline))
+            started = time.monotonic()
+            try:
+                result = await call()
+            except too_many_requests_error():
+                self._on_throttled(started)
+                continue
+            self._on_success()
+            return result
+
+    def submit(self, call, key=None, tokens=0, timeout=None):
+        """Run call() once capacity allows, sharing the result with identical in-flight calls"""
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        if key is None:
+            return self._run(call, tokens, deadline)
+
+        future, is_leader = self._join_or_lead(key)
+        if not is_leader:
+            return future.result()
+        try:
+            result = self._run(call, tokens, deadline)
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def submit_async(self, call, key=None, tokens=0, timeout=None):
+        """Async variant of submit; call returns an awaitable"""
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        if key is None:
+            return await self._run_async(call, tokens, deadline)
+
+        future, is_leader = self._join_or_lead(key)
+        if not is_leader:
+            # Shielded: a follower that is cancelled (past its deadline) must not cancel the shared call
+            return await asyncio.shield(asyncio.wrap_future(future))
+        try:
+            result = await self._run_async(call, tokens, deadline)
+        except asyncio.CancelledError:
+            # The leader was cancelled; its followers get an error they may retry
+            self._finish(key, future, error=TimeoutError('The shared Gemini call was cancelled'))
+            raise
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'throttled': self.throttled,
+                'rejected': self.rejected,
+                'inflight': len(self._inflight),
+                'rate_scale': round(self.rate_scale, 3),
+                'paused_for': round(max(0.0, self.paused_until - time.monotonic()), 2),
+            }
@@ -0,0 +1,407 @@
+"""Bulk scoring from the command line: analyze a directory, glob or JSONL file of images offline.
+
+    python score_cli.py photos/ -o results.jsonl
+    python score_cli.py 'archive/**/*.jpg' -o results.parquet --workers 8 --concurrency 16
+    python score_cli.py uploads.jsonl -o results.jsonl --model gemini-2.5-flash-lite
+    python score_cli.py results.jsonl --rescore-only -o rescored.jsonl
+
+Inputs (any number, mixed):
+- a directory: every image file under it, recursively
+- a glob pattern (quoted, so the shell leaves it alone; ** matches subdirectories)
+- a .jsonl file: one JSON object per line with "image" (base64 or a data URL)
+  or "path" (relative to the file), and optionally "id"; other lines are skipped
+- an image file
+
+Images are read, decoded and preprocessed on a pool of --workers processes,
+and only the small re-encoded payload comes back to the main process. At most
+--concurrency Gemini calls are in flight at once. They go through the same
+scheduler, deadlines, retries and result cache as the server (app.py), so
+GEMINI_RPM / GEMINI_TPM and the rest of its configuration apply, and results
+are recorded in the analysis store when ANALYSIS_STORE_PATH is set.
+
+Each result is appended to the output as one JSON line as soon as it is
+ready: the compact response format plus "id", "image_hash" and "model", or
+"id" and "error" for an image that failed. The output is also the
+checkpoint. Rerunning the same command skips every id already in it, so an
+interrupted run resumes where it stopped. --retry-errors also reruns the ids
+that failed (a later line for an id supersedes earlier ones), and --restart
+starts over. Parquet output (.parquet, needs pyarrow) is collected in
+<output>.partial.jsonl the same way and converted once the run completes.
+
+--rescore-only reruns calculate_performativeness_score over detected items
+that are already stored, without calling Gemini: a previous output (JSONL or
+Parquet) or an analysis store database (ANALYSIS_STORE_PATH). Scores, and the
+improvement suggestions and roasts that depend on them, are recomputed
+against the current catalogue, or the one given with --catalogue.
+"""
+import argparse
+import asyncio
+import base64
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+from preprocessing import ImageTooLarge, check_pixel_budget, preprocess_image
+from result_cache import image_digest
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.tif', '.tiff')
+PROGRESS_INTERVAL = 10  # Seconds between progress lines
+RESCORE_CHUNK = 500  # Rows per process pool task in --rescore-only
+PARQUET_BATCH = 10000  # Rows per Parquet row group
+
+
+def is_glob(source):
+    return any(char in source for char in '*?[')
+
+
+def iter_jsonl(path):
+    """The JSON objects in a JSONL file, skipping lines that aren't one"""
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                yield number, record
+
+
+def iter_images(sources):
+    """(id, path, base64 text) for every image the sources name; one of path and base64 text is None"""
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        path = os.path.join(root, name)
+                        yield path, path, None
+        elif source.endswith('.jsonl'):
+            base = os.path.dirname(source)
+            for number, record in iter_jsonl(source):
+                record_id = str(record.get('id', f'{source}:{number}'))
+                if record.get('image'):
+                    yield record_id, None, record['image']
+                elif record.get('path'):
+                    yield record_id, os.path.join(base, record['path']), None
+        elif is_glob(source):
+            for path in sorted(glob.glob(source, recursive=True)):
+                if os.path.isfile(path):
+                    yield path, path, None
+        else:
+            yield source, source, None
+
+
+def prepare_image_file(path, encoded, max_pixels, max_edge, image_format, quality):
+    """Process pool task: read (or base64-decode) one image and preprocess it; returns (digest, PreparedImage)"""
+    if encoded is not None:
+        image_bytes = base64.b64decode(encoded[encoded.index(',') + 1:] if ',' in encoded else encoded)
+    else:
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+    check_pixel_budget(image_bytes, max_pixels, max_edge)
+    return image_digest(image_bytes), preprocess_image(image_bytes, max_edge, image_format, quality)
+
+
+def rescore_result(row, catalogue):
+    """A stored result scored against catalogue, with suggestions and roasts made for the new score
+
+    Stored suggestions mix generated ones with Gemini's and can't be told
+    apart, so both lists are replaced rather than merged as /analyze does.
+    """
+    import app
+
+    percentage, detected_categories, score, _ = app.calculate_performativeness_score(row['detected_items'], catalogue)
+    row = {key: value for key, value in row.items() if key not in ('category_details', 'max_score')}
+    row.update(
+        percentage=percentage,
+        score=score,
+        detected_categories=list(detected_categories),
+        improvement_suggestions=app.generate_improvement_suggestions(detected_categories, catalogue),
+        roasts=app.generate_roasts(percentage, detected_categories, row['detected_items'], catalogue),
+        catalogue=catalogue.version,
+    )
+    return row
+
+
+def rescore_rows(rows):
+    """Process pool task: recompute stored results against the current catalogue"""
+    import app
+
+    catalogue = app.get_catalogue()
+    return [rescore_result(row, catalogue) for row in rows]
+
+
+def iter_stored_results(sources):
+    """Stored results with detected items: previous outputs (JSONL or Parquet) or analysis store databases"""
+    for source in sources:
+        if source.endswith('.parquet'):
+            import pyarrow.parquet as pq
+
+            for batch in pq.ParquetFile(source).iter_batches():
+                for row in batch.to_pylist():
+                    # Columns a row doesn't have are null in Parquet (a result's "error", say)
+                    yield {key: value for key, value in row.items() if value is not None}
+        elif is_sqlite(source):
+            from analysis_store import AnalysisStore
+
+            for row in AnalysisStore(source).iter_analyses():
+                yield dict(row, id=str(row['id']))
+        else:
+            for _, record in iter_jsonl(source):
+                yield record
+
+
+def is_sqlite(path):
+    with open(path, 'rb') as f:
+        return f.read(16) == b'SQLite format 3\0'
+
+
+class ResultWriter:
+    """Appends result rows to a JSONL file, flushing each one so an interrupted run loses nothing
+
+    Rows already in the file are read back first: done holds the ids that
+    succeeded and failed the ids whose last row is an error.
+    """
+
+    def __init__(self, path, restart=False):
+        self.path = path
+        self.done = set()
+        self.failed = set()
+        if restart and os.path.exists(path):
+            os.remove(path)
+        elif os.path.exists(path):
+            self._load()
+        self._file = open(path, 'a')
+
+    def _load(self):
+        complete = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError
+                    row = json.loads(line)
+                except ValueError:
+                    break  # Cut off by the interruption
+                complete += len(line)
+                if 'error' in row:
+                    if row['id'] not in self.done:
+                        self.failed.add(row['id'])
+                else:
+                    self.done.add(row['id'])
+                    self.failed.discard(row['id'])
+        # Drop a partly written last line, so new rows start on a line of their own
+        os.truncate(self.path, complete)
+
+    def skip(self, row_id, retry_errors=False):
+        return row_id in self.done or (row_id in self.failed and not retry_errors)
+
+    def write(self, row):
+        self._file.write(json.dumps(row) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def write_parquet(rows_path, path):
+    """Convert a finished run's JSONL rows to Parquet, one row per id (a success replaces a failure)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    strings = pa.list_(pa.string())
+    schema = pa.schema([
+        ('id', pa.string()), ('image_hash', pa.string()), ('model', pa.string()), ('catalogue', pa.string()),
+        ('percentage', pa.float64()), ('score', pa.float64()), ('detected_categories', strings),
+        ('detected_items', strings), ('improvement_suggestions', strings), ('roasts', strings),
+        ('error', pa.string()),
+    ])
+    succeeded = {record['id'] for _, record in iter_jsonl(rows_path) if 'error' not in record}
+    seen = set()
+    with pq.ParquetWriter(path + '.tmp', schema) as writer:
+        batch = []
+        for _, record in iter_jsonl(rows_path):
+            if record['id'] in seen or ('error' in record and record['id'] in succeeded):
+                continue
+            seen.add(record['id'])
+            batch.append(record)
+            if len(batch) == PARQUET_BATCH:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    os.replace(path + '.tmp', path)
+    os.remove(rows_path)
+
+
+class Progress:
+    """Counts rows as they are written and prints a line every PROGRESS_INTERVAL seconds"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def add(self, row):
+        if 'error' in row:
+            self.failed += 1
+        else:
+            self.succeeded += 1
+        now = time.monotonic()
+        if now - self.last_report >= PROGRESS_INTERVAL:
+            self.last_report = now
+            print(self.summary())
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        scored = self.succeeded + self.failed
+        return (f"{scored} scored ({self.failed} failed), {self.skipped} skipped, "
+                f"{elapsed:.0f} s, {scored / max(elapsed, 1e-9):.1f}/s")
+
+
+async def score_images(app, items, writer, progress, pool, args):
+    """Preprocess on the process pool and analyze with at most args.concurrency Gemini calls at once"""
+    loop = asyncio.get_running_loop()
+    catalogue = app.get_catalogue()
+    calls = asyncio.Semaphore(args.concurrency)
+    # Images being preprocessed or waiting for a call: enough to keep both busy, few enough to bound memory
+    in_flight = asyncio.Semaphore(args.concurrency + 2 * args.workers)
+    preprocess_options = (app.MAX_IMAGE_PIXELS, app.PREPROCESS_MAX_EDGE, app.PREPROCESS_FORMAT, app.PREPROCESS_QUALITY)
+
+    async def score(item_id, path, encoded):
+        try:
+            try:
+                digest, prepared = await loop.run_in_executor(pool, prepare_image_file, path, encoded, *preprocess_options)
+            except ImageTooLarge as e:
+                raise app.AnalysisError(f'Image too large. {e}', 413)
+            except (FileNotFoundError, PermissionError, IsADirectoryError, BrokenExecutor):
+                raise
+            except Exception as e:
+                # Worded as /analyze words it
+                raise app.AnalysisError(f'Invalid image format: {str(e)}', 400)
+            model_entry = app.get_model_entry(args.model)
+            async with calls:
+                result = await app.analyze_prepared_async(digest, prepared.as_part(), catalogue, model_entry, args.mode)
+            row = {'id': item_id, 'image_hash': digest, 'model': model_entry.name,
+                   **app.compact_result(result, catalogue.version)}
+        except app.AnalysisError as e:
+            row = {'id': item_id, 'error': e.message}
+        except Exception as e:
+            row = {'id': item_id, 'error': str(e) or type(e).__name__}
+        finally:
+            in_flight.release()
+        writer.write(row)
+        progress.add(row)
+
+    tasks = set()
+    for item_id, path, encoded in items:
+        if writer.skip(item_id, args.retry_errors):
+            progress.skipped += 1
+            continue
+        await in_flight.acquire()
+        task = asyncio.ensure_future(score(item_id, path, encoded))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks)
+
+
+def rescore(rows, writer, progress, pool, args):
+    """Recompute stored results' scores on the process pool, writing them in input order"""
+    pending = deque()
+
+    def write_oldest():
+        for row in pending.popleft().result():
+            writer.write(row)
+            progress.add(row)
+
+    chunk = []
+    for row in rows:
+        if not row.get('id') or not isinstance(row.get('detected_items'), list) or writer.skip(row['id']):
+            progress.skipped += 1
+            continue
+        chunk.append(row)
+        if len(chunk) == RESCORE_CHUNK:
+            pending.append(pool.submit(rescore_rows, chunk))
+            chunk = []
+            if len(pending) > 2 * args.workers:
+                write_oldest()
+    if chunk:
+        pending.append(pool.submit(rescore_rows, chunk))
+    while pending:
+        write_oldest()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='+', help='Directories, glob patterns, JSONL files or image files')
+    parser.add_argument('-o', '--output', required=True, help='Results file (.jsonl, or .parquet)')
+    parser.add_argument('--format', choices=('jsonl', 'parquet'), help='Output format (default: from the extension)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Preprocessing processes')
+    parser.add_argument('--concurrency', type=int, default=8, help='Gemini calls in flight at once')
+    parser.add_argument('--model', help='Registered model to use (default: routed as by the server)')
+    parser.add_argument('--mode', choices=('legacy', 'structured', 'compact'),
+                        help='Analysis mode (default: ANALYSIS_MODE / ANALYSIS_MODE_WEIGHTS)')
+    parser.add_argument('--catalogue', help='Catalogue file to score against (default: CATALOGUE_PATH)')
+    parser.add_argument('--rescore-only', action='store_true',
+                        help='Recompute scores of stored detected items without calling Gemini')
+    parser.add_argument('--retry-errors', action='store_true', help='Also rerun ids that failed in an earlier run')
+    parser.add_argument('--restart', action='store_true', help='Discard earlier results in the output and start over')
+    args = parser.parse_args(argv)
+
+    output_format = args.format or ('parquet' if args.output.endswith('.parquet') else 'jsonl')
+    if output_format == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error('Parquet output needs pyarrow: pip install pyarrow')
+    rows_path = f'{args.output}.partial.jsonl' if output_format == 'parquet' else args.output
+
+    # Set before app is imported (here and in the worker processes, which inherit the environment)
+    if args.catalogue:
+        os.environ['CATALOGUE_PATH'] = os.path.abspath(args.catalogue)
+    import app
+
+    if not args.rescore_only:
+        if not app.api_key:
+            parser.error('GEMINI_API_KEY is not set')
+        try:
+            app.get_model_entry(args.model)
+        except app.AnalysisError as e:
+            parser.error(e.message)
+
+    writer = ResultWriter(rows_path, restart=args.restart)
+    progress = Progress()
+    # Spawned rather than forked: the parent already runs threads (Gemini client, stores)
+    pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        if args.rescore_only:
+            rescore(iter_stored_results(args.inputs), writer, progress, pool, args)
+        else:
+            asyncio.run(score_images(app, iter_images(args.inputs), writer, progress, pool, args))
+    except KeyboardInterrupt:
+        print(f"Interrupted after {progress.summary()}. Run the same command again to resume.")
+        return 130
+    finally:
+        writer.close()
+        pool.shutdown()
+        if app.analysis_store is not None:
+            app.analysis_store.close()
+
+    print(progress.summary())
+    if output_format == 'parquet':
+        write_parquet(rows_path, args.output)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,793 @@
+// Theme toggle functionality
+const themeToggle = document.getElementById('themeToggle');
+const themeIcon = document.getElementById('themeIcon');
+const themeText = document.getElementById('themeText');
+const htmlElement = document.documentElement;
+
+// Get saved theme from localStorage or use system preference
+function getInitialTheme() {
+    const savedTheme = localStorage.getItem('theme');
+    if (savedTheme) {
+        return savedTheme;
+    }
+    // Check system preference
+    if (window.matchMedia && window.matchMedia('(prefers-color-scheme: dark)').matches) {
+        return 'dark';
+    }
+    return 'light';
+}
+
+const initialTheme = getInitialTheme();
+htmlElement.setAttribute('data-theme', initialTheme);
+updateThemeUI(initialTheme);
+
+themeToggle.addEventListener('click', () => {
+    const currentTheme = htmlElement.getAttribute('data-theme');
+    const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
+    htmlElement.setAttribute('data-theme', newTheme);
+    localStorage.setItem('theme', newTheme);
+    updateThemeUI(newTheme);
+});
+
+function updateThemeUI(theme) {
+    if (theme === 'dark') {
+        themeIcon.textContent = '☀️';
+        themeText.textContent = 'Light Mode';
+    } else {
+        themeIcon.textContent = '🌙';
+        themeText.textContent = 'Dark Mode';
+    }
+}
+
+const uploadArea = document.getElementById('uploadArea');
+const imageInput = document.getElementById('imageInput');
+const previewContainer = document.getElementById('previewContainer');
+const previewImage = document.getElementById('previewImage');
+const analyzeBtn = document.getElementById('analyzeBtn');
+const loading = document.getElementById('loading');
+const results = document.getElementById('results');
+const error = document.getElementById('error');
+const scorePercentage = document.getElementById('scorePercentage');
+const categoryBadges = document.getElementById('categoryBadges');
+const itemList = document.getElementById('itemList');
+const improvementSection = document.getElementById('improvementSection');
+const improvementList = document.getElementById('improvementList');
+const roastsSection = document.getElementById('roastsSection');
+const roastsList = document.getElementById('roastsList');
+
+// Camera elements
+const uploadModeBtn = document.getElementById('uploadModeBtn');
+const cameraModeBtn = document.getElementById('cameraModeBtn');
+const cameraContainer = document.getElementById('cameraContainer');
+const cameraPreview = document.getElementById('cameraPreview');
+const cameraCanvas = document.getElementById('cameraCanvas');
+const captureBtn = document.getElementById('captureBtn');
+const stopCameraBtn = document.getElementById('stopCameraBtn');
+const cameraError = document.getElementById('cameraError');
+const liveBtn = document.getElementById('liveBtn');
+const liveStatus = document.getElementById('liveStatus');
+
+let currentImageBlob = null;
+let currentPreviewUrl = null;
+let currentStream = null;
+let currentMode = 'upload';
+
+// Results are requested in the compact format, which names categories by id; their
+// names and weights come from the catalogue, fetched once per catalogue version
+let catalogue = null;
+let catalogueRequest = null;
+let latestScore = null;
+
+// Live mode: sample the camera continuously, but only send a frame when the scene changed
+const LIVE_SAMPLE_MS = 500;
+const LIVE_THUMB_WIDTH = 32;
+const LIVE_THUMB_HEIGHT = 24;
+const LIVE_CHANGE_THRESHOLD = 12;  // mean brightness difference (0-255) from the last sent frame
+const LIVE_STABLE_THRESHOLD = 6;   // ...while differing less than this from the previous sample
+const LIVE_MAX_EDGE = 1024;
+const liveThumb = document.createElement('canvas');
+liveThumb.width = LIVE_THUMB_WIDTH;
+liveThumb.height = LIVE_THUMB_HEIGHT;
+let liveSession = null;
+let liveTimer = null;
+let liveInFlight = false;
+let liveRetryAt = 0;
+let liveLastSent = null;
+let livePrevious = null;
+let liveSampled = 0;
+let liveSent = 0;
+
+// Mode toggle
+uploadModeBtn.addEventListener('click', () => switchMode('upload'));
+cameraModeBtn.addEventListener('click', () => switchMode('camera'));
+
+function switchMode(mode) {
+    currentMode = mode;
+    
+    if (mode === 'upload') {
+        uploadModeBtn.classList.add('active');
+        cameraModeBtn.classList.remove('active');
+        uploadArea.style.display = 'block';
+        cameraContainer.classList.remove('active');
+        stopCamera();
+    } else {
+        cameraModeBtn.classList.add('active');
+        uploadModeBtn.classList.remove('active');
+        uploadArea.style.display = 'none';
+        
+        // Force display the camera container
+        cameraContainer.style.display = 'block';
+        cameraContainer.classList.add('active');
+        
+        // Ensure video element is visible
+        cameraPreview.style.display = 'block';
+        cameraPreview.style.visibility = 'visible';
+        
+        console.log('Camera container should be visible now');
+        console.log('Container display:', window.getComputedStyle(cameraContainer).display);
+        console.log('Video element:', cameraPreview);
+        
+        // Wait a bit longer and ensure element is in view before starting camera
+        setTimeout(() => {
+            // Double check visibility
+            const rect = cameraContainer.getBoundingClientRect();
+            console.log('Camera container rect:', rect);
+            
+            if (rect.width > 0 && rect.height > 0) {
+                console.log('Container is visible, starting camera...');
+                startCamera();
+            } else {
+                console.error('Container is not visible!');
+                cameraError.textContent = 'Camera container is not visible. Please refresh the page.';
+            }
+        }, 300);
+    }
+    
+    // Clear preview and results when switching modes
+    previewContainer.style.display = 'none';
+    results.classList.remove('show');
+    error.classList.remove('show');
+    roastsSection.style.display = 'none';
+    improvementSection.style.display = 'none';
+    currentImageBlob = null;
+}
+
+async function startCamera() {
+    console.log('=== STARTING CAMERA ===');
+    cameraError.textContent = '';
+    captureBtn.disabled = true;
+    liveBtn.disabled = true;
+    stopCameraBtn.disabled = true;
+    
+    // Stop any existing stream first
+    if (currentStream) {
+        console.log('Stopping existing stream...');
+        stopCamera();
+        // Wait a moment for stream to fully stop
+        await new Promise(resolve => setTimeout(resolve, 200));
+    }
+    
+    // Check if we're on a secure context (HTTPS or localhost)
+    const isSecureContext = window.isSecureContext || location.protocol === 'https:' || location.hostname === 'localhost' || location.hostname === '127.0.0.1';
+    console.log('Secure context:', isSecureContext, 'Protocol:', location.protocol, 'Hostname:', location.hostname);
+    
+    if (!isSecureContext) {
+        cameraError.textContent = 'Camera access requires HTTPS or localhost. Please use HTTPS or run on localhost.';
+        console.error('Not a secure context!');
+        return;
+    }
+    
+    try {
+        // Check if getUserMedia is supported
+        if (!navigator.mediaDevices) {
+            throw new Error('navigator.mediaDevices is not available. Your browser may not support camera access.');
+        }
+        
+        if (!navigator.mediaDevices.getUserMedia) {
+            throw new Error('getUserMedia is not available. Your browser may not support camera access.');
+        }
+        
+        console.log('getUserMedia is available');
+        
+        // First, try with simple constraints to ensure we get permission prompt
+        console.log('Requesting camera access with simple constraints...');
+        let stream;
+        
+        try {
+            // Start with simplest possible constraints
+            const simpleConstraints = { video: true };
+            console.log('Trying constraints:', simpleConstraints);
+            stream = await navigator.mediaDevices.getUserMedia(simpleConstraints);
+            console.log('✓ Camera stream obtained with simple constraints');
+        } catch (simpleErr) {
+            console.log('Simple constraints failed:', simpleErr.name, simpleErr.message);
+            
+            // Try with front-facing camera preference
+            try {
+                const constraints = {
+                    video: {
+                        facingMode: 'user'
+                    }
+                };
+                console.log('Trying constraints:', constraints);
+                stream = await navigator.mediaDevices.getUserMedia(constraints);
+                console.log('✓ Camera stream obtained with front-facing preference');
+            } catch (frontErr) {
+                console.log('Front-facing failed:', frontErr.name, frontErr.message);
+                throw simpleErr; // Throw the original error
+            }
+        }
+        
+        if (!stream) {
+            throw new Error('Failed to obtain camera stream');
+        }
+        
+        console.log('Stream obtained:', stream);
+        console.log('Video tracks:', stream.getVideoTracks());
+        
+        currentStream = stream;
+        
+        // Set the stream to the video element
+        cameraPreview.srcObject = stream;
+        console.log('Stream assigned to video element');
+        
+        // Ensure video element is ready
+        if (cameraPreview.readyState >= 2) {
+            // Video is already loaded
+            console.log('Video ready state:', cameraPreview.readyState);
+            try {
+                await cameraPreview.play();
+                console.log('✓ Video is playing');
+                captureBtn.disabled = false;
+                liveBtn.disabled = false;
+                stopCameraBtn.disabled = false;
+                cameraError.textContent = '';
+            } catch (playErr) {
+                console.error('Error playing video:', playErr);
+                cameraError.textContent = 'Error playing video. Please try again.';
+            }
+        } else {
+            // Wait for video to load
+            cameraPreview.onloadedmetadata = async () => {
+                console.log('Video metadata loaded, readyState:', cameraPreview.readyState);
+                try {
+                    await cameraPreview.play();
+                    console.log('✓ Video is playing after metadata load');
+                    captureBtn.disabled = false;
+                    liveBtn.disabled = false;
+                    stopCameraBtn.disabled = false;
+                    cameraError.textContent = '';
+                } catch (playErr) {
+                    console.error('Error playing video after metadata:', playErr);
+                    cameraError.textContent = 'Error playing video. Please try again.';
+                }
+            };
+            
+            // Also try to play immediately (in case metadata is already loaded)
+            cameraPreview.play().then(() => {
+                console.log('✓ Video started playing immediately');
+                captureBtn.disabled = false;
+                liveBtn.disabled = false;
+                stopCameraBtn.disabled = false;
+                cameraError.textContent = '';
+            }).catch(err => {
+                console.log('Immediate play failed, waiting for metadata...', err);
+            });
+        }
+        
+        // Handle stream ending
+        stream.getVideoTracks().forEach(track => {
+            track.addEventListener('ended', () => {
+                console.log('Camera track ended');
+                stopCamera();
+                cameraError.textContent = 'Camera stream ended. Click "Take Photo" again to restart.';
+            });
+        });
+        
+        // Handle errors on the video element
+        cameraPreview.onerror = (err) => {
+            console.error('Video element error:', err);
+            cameraError.textContent = 'Error displaying camera preview. Please try again.';
+        };
+        
+        // Monitor video element state
+        cameraPreview.addEventListener('playing', () => {
+            console.log('✓ Video is now playing');
+            cameraError.textContent = '';
+        });
+        
+        cameraPreview.addEventListener('error', (e) => {
+            console.error('Video error event:', e);
+        });
+        
+    } catch (err) {
+        console.error('=== CAMERA ERROR ===');
+        console.error('Error name:', err.name);
+        console.error('Error message:', err.message);
+        console.error('Full error:', err);
+        
+        let errorMessage = 'Unable to access camera. ';
+        
+        if (err.name === 'NotAllowedError' || err.name === 'PermissionDeniedError') {
+            errorMessage = 'Camera permission denied. Please allow camera access in your browser settings and try again.';
+        } else if (err.name === 'NotFoundError' || err.name === 'DevicesNotFoundError') {
+            errorMessage = 'No camera found on your device. Please use the upload option instead.';
+        } else if (err.name === 'NotReadableError' || err.name === 'TrackStartError') {
+            errorMessage = 'Camera is being used by another application. Please close other apps using the camera and try again.';
+        } else if (err.name === 'OverconstrainedError') {
+            errorMessage = 'Camera constraints not supported by your device.';
+        } else if (err.name === 'SecurityError') {
+            errorMessage = 'Camera access blocked due to security restrictions. Please use HTTPS or localhost.';
+        } else if (err.name === 'TypeError') {
+            errorMessage = 'Camera API not available. Your browser may not support camera access.';
+        } else {
+            errorMessage += err.message || 'Unknown error. Please check browser console for details.';
+        }
+        
+        cameraError.textContent = errorMessage;
+        captureBtn.disabled = true;
+        liveBtn.disabled = true;
+        stopCameraBtn.disabled = true;
+        
+        // Show error in main error area too
+        showError(errorMessage);
+    }
+}
+
+function stopCamera() {
+    if (currentStream) {
+        currentStream.getTracks().forEach(track => {
+            track.stop();
+            console.log('Stopped track:', track.kind);
+        });
+        currentStream = null;
+    }
+    if (cameraPreview) {
+        cameraPreview.srcObject = null;
+        cameraPreview.onloadedmetadata = null;
+        cameraPreview.onerror = null;
+    }
+    captureBtn.disabled = true;
+    liveBtn.disabled = true;
+    stopCameraBtn.disabled = true;
+    stopLive();
+}
+
+stopCameraBtn.addEventListener('click', stopCamera);
+
+liveBtn.addEventListener('click', () => {
+    if (liveTimer) {
+        stopLive();
+    } else {
+        startLive();
+    }
+});
+
+async function startLive() {
+    try {
+        const response = await fetch('/live', { method: 'POST' });
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || 'Could not start live mode');
+        }
+        liveSession = data.session;
+    } catch (err) {
+        cameraError.textContent = err.message;
+        return;
+    }
+    liveLastSent = null;
+    livePrevious = null;
+    liveRetryAt = 0;
+    liveSampled = 0;
+    liveSent = 0;
+    liveTimer = setInterval(sampleLiveFrame, LIVE_SAMPLE_MS);
+    liveBtn.textContent = '⏹ Stop Live';
+    captureBtn.disabled = true;
+    liveStatus.textContent = 'Live: point the camera at your setup';
+    error.classList.remove('show');
+}
+
+function stopLive() {
+    if (liveTimer) {
+        clearInterval(liveTimer);
+        liveTimer = null;
+    }
+    if (liveSession) {
+        fetch(`/live/${liveSession}`, { method: 'DELETE', keepalive: true }).catch(() => {});
+        liveSession = null;
+    }
+    liveBtn.textContent = '🔴 Go Live';
+    captureBtn.disabled = !currentStream;
+    liveStatus.textContent = '';
+}
+
+// Grayscale 32x24 thumbnail of the current video frame
+function liveThumbnail() {
+    const ctx = liveThumb.getContext('2d', { willReadFrequently: true });
+    ctx.drawImage(cameraPreview, 0, 0, LIVE_THUMB_WIDTH, LIVE_THUMB_HEIGHT);
+    const pixels = ctx.getImageData(0, 0, LIVE_THUMB_WIDTH, LIVE_THUMB_HEIGHT).data;
+    const gray = new Uint8Array(LIVE_THUMB_WIDTH * LIVE_THUMB_HEIGHT);
+    for (let i = 0; i < gray.length; i++) {
+        gray[i] = (pixels[i * 4] * 299 + pixels[i * 4 + 1] * 587 + pixels[i * 4 + 2] * 114) / 1000;
+    }
+    return gray;
+}
+
+function thumbnailDifference(a, b) {
+    let total = 0;
+    for (let i = 0; i < a.length; i++) {
+        total += Math.abs(a[i] - b[i]);
+    }
+    return total / a.length;
+}
+
+function sampleLiveFrame() {
+    if (!currentStream || document.hidden || cameraPreview.readyState < 2) return;
+    const thumb = liveThumbnail();
+    const previous = livePrevious;
+    livePrevious = thumb;
+    liveSampled++;
+    // At most one frame in flight, and only once the camera has settled on a new scene
+    if (liveInFlight || Date.now() < liveRetryAt) return;
+    const changed = !liveLastSent || thumbnailDifference(thumb, liveLastSent) > LIVE_CHANGE_THRESHOLD;
+    const stable = previous && thumbnailDifference(thumb, previous) < LIVE_STABLE_THRESHOLD;
+    if (changed && stable) {
+        liveLastSent = thumb;
+        sendLiveFrame();
+    }
+}
+
+function sendLiveFrame() {
+    const scale = Math.min(1, LIVE_MAX_EDGE / Math.max(cameraPreview.videoWidth, cameraPreview.videoHeight));
+    cameraCanvas.width = Math.round(cameraPreview.videoWidth * scale);
+    cameraCanvas.height = Math.round(cameraPreview.videoHeight * scale);
+    cameraCanvas.getContext('2d').drawImage(cameraPreview, 0, 0, cameraCanvas.width, cameraCanvas.height);
+    liveInFlight = true;
+    const session = liveSession;
+    cameraCanvas.toBlob(async (blob) => {
+        try {
+            if (!blob) throw new Error('Failed to capture frame');
+            liveSent++;
+            const response = await fetch(`/live/${session}/frame?format=compact`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'image/jpeg' },
+                body: blob
+            });
+            const data = await response.json();
+            if (response.status === 404 && session === liveSession) {
+                // The session expired while the tab was idle: carry on in a new one
+                stopLive();
+                startLive();
+                return;
+            }
+            if (!response.ok) {
+                throw new Error(data.error || 'Analysis failed');
+            }
+            if (session !== liveSession) return;
+            cameraError.textContent = '';
+            displayResults(data);
+            results.classList.add('show');
+            liveStatus.textContent = `Live: ${liveSampled} frames checked, ${liveSent} sent, ` +
+                `${data.live.analyzed} analyzed` + (data.live.new_items.length ? ` (+${data.live.new_items.length} new)` : '');
+        } catch (err) {
+            // Retry this scene after a pause, so a failing server isn't sent a frame per sample
+            liveLastSent = null;
+            liveRetryAt = Date.now() + 5000;
+            cameraError.textContent = err.message;
+        } finally {
+            liveInFlight = false;
+        }
+    }, 'image/jpeg', 0.85);
+}
+
+captureBtn.addEventListener('click', () => {
+    if (!currentStream) return;
+    
+    // Set canvas dimensions to match video
+    cameraCanvas.width = cameraPreview.videoWidth;
+    cameraCanvas.height = cameraPreview.videoHeight;
+    
+    // Draw video frame to canvas
+    const ctx = cameraCanvas.getContext('2d');
+    ctx.drawImage(cameraPreview, 0, 0);
+    
+    // Convert canvas to a JPEG blob (sent as raw bytes, no base64)
+    cameraCanvas.toBlob((blob) => {
+        if (!blob) {
+            showError('Failed to capture photo. Please try again.');
+            return;
+        }
+        
+        // Use the captured image
+        setCurrentImage(blob);
+        previewContainer.style.display = 'block';
+        results.classList.remove('show');
+        error.classList.remove('show');
+    }, 'image/jpeg', 0.9);
+    
+    // Stop camera after capture
+    stopCamera();
+    
+    // Switch back to upload mode to show the preview and analyze button
+    uploadModeBtn.classList.add('active');
+    cameraModeBtn.classList.remove('active');
+    cameraContainer.classList.remove('active');
+    uploadArea.style.display = 'block';
+    currentMode = 'upload';
+});
+
+// Upload area click
+uploadArea.addEventListener('click', () => {
+    if (currentMode === 'upload') {
+        imageInput.click();
+    }
+});
+
+// Drag and drop
+uploadArea.addEventListener('dragover', (e) => {
+    e.preventDefault();
+    uploadArea.classList.add('dragover');
+});
+
+uploadArea.addEventListener('dragleave', () => {
+    uploadArea.classList.remove('dragover');
+});
+
+uploadArea.addEventListener('drop', (e) => {
+    e.preventDefault();
+    uploadArea.classList.remove('dragover');
+    const files = e.dataTransfer.files;
+    if (files.length > 0) {
+        handleImageFile(files[0]);
+    }
+});
+
+// File input change
+imageInput.addEventListener('change', (e) => {
+    if (e.target.files.length > 0) {
+        handleImageFile(e.target.files[0]);
+    }
+});
+
+function handleImageFile(file) {
+    if (!file.type.startsWith('image/')) {
+        showError('Please upload an image file');
+        return;
+    }
+
+    setCurrentImage(file);
+    previewContainer.style.display = 'block';
+    results.classList.remove('show');
+    error.classList.remove('show');
+}
+
+function setCurrentImage(blob) {
+    // Preview straight from the blob instead of reading it into a data URL
+    if (currentPreviewUrl) {
+        URL.revokeObjectURL(currentPreviewUrl);
+    }
+    currentImageBlob = blob;
+    currentPreviewUrl = URL.createObjectURL(blob);
+    previewImage.src = currentPreviewUrl;
+}
+
+// Analyze button
+analyzeBtn.addEventListener('click', async () => {
+    if (!currentImageBlob) {
+        showError('Please upload an image first');
+        return;
+    }
+
+    loading.classList.add('show');
+    results.classList.remove('show');
+    error.classList.remove('show');
+    analyzeBtn.disabled = true;
+
+    try {
+        // Send the image as a raw binary body and render events as they stream in
+        const response = await fetch('/analyze/stream?format=compact', {
+            method: 'POST',
+            headers: {
+                'Content-Type': currentImageBlob.type || 'application/octet-stream',
+            },
+            body: currentImageBlob
+        });
+
+        if (!response.ok) {
+            const data = await response.json();
+            throw new Error(data.error || 'Analysis failed');
+        }
+
+        await readEventStream(response, handleAnalysisEvent);
+    } catch (err) {
+        showError(err.message);
+    } finally {
+        loading.classList.remove('show');
+        analyzeBtn.disabled = false;
+    }
+});
+
+// Parse a text/event-stream response body, calling onEvent(name, data) per event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const block of events) {
+            let name = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) name = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            if (data) onEvent(name, JSON.parse(data));
+        }
+    }
+}
+
+function handleAnalysisEvent(name, data) {
+    if (name === 'start') {
+        itemList.innerHTML = '';
+        categoryBadges.innerHTML = '';
+        roastsSection.style.display = 'none';
+        improvementSection.style.display = 'none';
+    } else if (name === 'item') {
+        // Show the results panel as soon as the first item arrives
+        loading.classList.remove('show');
+        results.classList.add('show');
+        const li = document.createElement('li');
+        li.textContent = data.item;
+        itemList.appendChild(li);
+    } else if (name === 'score') {
+        displayScore(data);
+    } else if (name === 'result') {
+        displayResults(data);
+    } else if (name === 'error') {
+        throw new Error(data.error || 'Analysis failed');
+    }
+}
+
+function displayScore(data) {
+    scorePercentage.textContent = data.percentage + '%';
+    
+    // Update score circle color based on percentage
+    const scoreCircle = document.querySelector('.score-circle');
+    scoreCircle.classList.remove('score-high', 'score-medium', 'score-low');
+    
+    if (data.percentage >= 70) {
+        scoreCircle.classList.add('score-high');
+    } else if (data.percentage >= 40) {
+        scoreCircle.classList.add('score-medium');
+    } else {
+        scoreCircle.classList.add('score-low');
+    }
+    scoreCircle.style.backgroundSize = '200% 200%';
+
+    // Display category badges
+    latestScore = data;
+    if (catalogue && catalogue.version === data.catalogue) {
+        displayBadges(data);
+    } else {
+        categoryBadges.innerHTML = '';
+        loadCatalogue(data.catalogue).then(() => {
+            // Unless a newer score has been shown meanwhile
+            if (latestScore === data) displayBadges(data);
+        });
+    }
+}
+
+function displayBadges(data) {
+    categoryBadges.innerHTML = '';
+    if (data.detected_categories && data.detected_categories.length > 0) {
+        data.detected_categories.forEach(id => {
+            const category = catalogue && catalogue.categories[id];
+            const badge = document.createElement('span');
+            badge.className = 'category-badge';
+            badge.textContent = category ? category.name + ` (+${category.weight}pts)` : id;
+            categoryBadges.appendChild(badge);
+        });
+    } else {
+        categoryBadges.innerHTML = '<p style="color: var(--text-tertiary);">No characteristics detected</p>';
+    }
+}
+
+// Versioned catalogue URLs never change, so the browser caches them for good
+function loadCatalogue(version) {
+    if (!catalogueRequest || catalogueRequest.version !== version) {
+        const promise = fetch(`/catalogue/${encodeURIComponent(version)}`)
+            .then(response => response.ok ? response : fetch('/catalogue'))
+            .then(response => response.json())
+            .then(data => { catalogue = data; })
+            .catch(() => {});  // Badges fall back to category ids
+        catalogueRequest = { version, promise };
+    }
+    return catalogueRequest.promise;
+}
+
+function displayResults(data) {
+    displayScore(data);
+
+    // Display detected items
+    itemList.innerHTML = '';
+    if (data.detected_items && data.detected_items.length > 0) {
+        data.detected_items.forEach(item => {
+            const li = document.createElement('li');
+            li.textContent = item;
+            itemList.appendChild(li);
+        });
+    } else {
+        itemList.innerHTML = '<li style="color: var(--text-tertiary);">No items detected</li>';
+    }
+
+    // Display roasts if score is below 30%
+    roastsList.innerHTML = '';
+    console.log('🔥 Roast Check - Percentage:', data.percentage, 'Roasts:', data.roasts);
+    
+    // Check if roasts should be displayed (score < 30%)
+    if (data.percentage < 30) {
+        if (data.roasts && Array.isArray(data.roasts) && data.roasts.length > 0) {
+            console.log('✅ Displaying', data.roasts.length, 'roasts for score', data.percentage + '%');
+            data.roasts.forEach(roast => {
+                if (roast && roast.trim()) {
+                    const li = document.createElement('li');
+                    li.textContent = roast;
+                    roastsList.appendChild(li);
+                }
+            });
+            
+            // Only show if we actually added roasts to the list
+            if (roastsList.children.length > 0) {
+                roastsSection.style.display = 'block';
+                console.log('✅ Roasts section is now visible');
+            } else {
+                console.warn('⚠️ No valid roasts to display');
+                roastsSection.style.display = 'none';
+            }
+        } else {
+            console.warn('⚠️ Score is < 30% but no roasts in response. Roasts:', data.roasts);
+            roastsSection.style.display = 'none';
+        }
+    } else {
+        console.log('ℹ️ Score is', data.percentage + '% (>= 30%), no roasts will be shown');
+        roastsSection.style.display = 'none';
+    }
+
+    // Display improvement suggestions (only if score is less than 100%)
+    improvementList.innerHTML = '';
+    if (data.percentage >= 100) {
+        improvementSection.style.display = 'none';
+    } else if (data.improvement_suggestions && data.improvement_suggestions.length > 0) {
+        // Display all suggestions (they should already be formatted properly)
+        data.improvement_suggestions.forEach(suggestion => {
+            // Skip very short or header-like messages
+            if (suggestion.length > 15 && !suggestion.toLowerCase().includes('focus on adding these high-value items')) {
+                const li = document.createElement('li');
+                li.textContent = suggestion;
+                improvementList.appendChild(li);
+            }
+        });
+        
+        // If no suggestions were added, show a fallback
+        if (improvementList.children.length === 0) {
+            improvementList.innerHTML = '<li>Keep adding performative items to reach 100%! Focus on high-value items like feminist literature, tote bags, and matcha lattes.</li>';
+        }
+        
+        improvementSection.style.display = 'block';
+    } else {
+        // Fallback message if no suggestions
+        improvementSection.style.display = 'block';
+        improvementList.innerHTML = '<li>Keep adding performative items to reach 100%! Focus on high-value items like feminist literature, tote bags, and matcha lattes.</li>';
+    }
+
+    results.classList.add('show');
+}
+
+function showError(message) {
+    error.textContent = message;
+    error.classList.add('show');
+}
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+import app
+import asgi
+from benchmarks import fake_gemini
+from benchmarks.bench_load import make_images
+
+
+@pytest.fixture(autouse=True)
+def fake_model(monkeypatch):
+    monkeypatch.setattr(app, 'api_key', 'test')
+    fake_gemini.install(app.model_registry, latency=0, latency_jitter=0, per_output_token=0)
+
+
+def token_observations(kind):
+    prefix = f'analyzer_request_tokens_count{{endpoint="analyze_image",kind="{kind}"}} '
+    return next((int(line[len(prefix):]) for line in app.REQUEST_TOKENS.samples() if line.startswith(prefix)), 0)
+
+
+def post_analyze(image_bytes):
+    sent = []
+    messages = [{'type': 'http.request', 'body': image_bytes, 'more_body': False}]
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/analyze', 'query_string': b'',
+             'headers': [(b'content-type', b'image/jpeg')]}
+    asyncio.run(asgi.application(scope, receive, send))
+    return sent[0]['status']
+
+
+def test_analyze_records_request_tokens():
+    prompt, output = token_observations('prompt'), token_observations('output')
+    # An image no other test analyzes, so it isn't answered from the cache
+    assert post_analyze(make_images(1, 352, 288)[0]) == 200
+    assert token_observations('prompt') == prompt + 1
+    assert token_observations('output') == output + 1
@@ -0,0 +1,44 @@
+import base64
+import json
+
+import pytest
+
+import app
+from benchmarks import fake_gemini
+from benchmarks.bench_load import make_images
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app, 'api_key', 'test')
+    fake_gemini.install(app.model_registry, latency=0, latency_jitter=0, per_output_token=0)
+    return app.app.test_client()
+
+
+def post_batch(client, images):
+    response = client.post('/analyze/batch', json={'images': images})
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    return response, records
+
+
+def test_bad_image_fails_only_its_own_record(client):
+    good = base64.b64encode(make_images(1, 320, 240)[0]).decode()
+    response, records = post_batch(client, [good, 'not base64!', base64.b64encode(b'not an image').decode(), ''])
+    assert response.status_code == 200
+
+    by_index = {record['index']: record for record in records if 'index' in record}
+    assert 'result' in by_index[0]
+    assert by_index[1]['status'] == 400 and by_index[1]['error'].startswith('Invalid image format')
+    assert by_index[2]['status'] == 400
+    assert by_index[3] == {'index': 3, 'error': 'No image provided', 'status': 400}
+    summary = records[-1]['summary']
+    assert summary['images'] == 4 and summary['failed'] == 3
+
+
+def test_too_many_images_is_refused_before_decoding(client, monkeypatch):
+    decoded = []
+    monkeypatch.setattr(app, 'decode_image_data', lambda image_data: decoded.append(image_data))
+    response = client.post('/analyze/batch', json={'images': ['x'] * (app.BATCH_MAX_IMAGES + 1)})
+    assert response.status_code == 400
+    assert 'Too many images' in response.get_json()['error']
+    assert decoded == []
@@ -0,0 +1,26 @@
+import importlib
+
+import pytest
+
+from benchmarks.__main__ import SUITES, run_suite
+
+
+class FakeServer:
+    def shutdown(self):
+        pass
+
+
+@pytest.mark.parametrize('suite', SUITES)
+def test_every_suite_dispatches(suite, monkeypatch):
+    # Stand in for the suite's work, so only the dispatch itself is tested
+    module = importlib.import_module(f'benchmarks.bench_{suite}')
+    monkeypatch.setattr(module, 'run', lambda *args, **kwargs: [[{'name': suite}]])
+    if suite == 'load':
+        monkeypatch.setattr(module, 'start_local_server', lambda args: ('http://127.0.0.1:0', FakeServer()))
+        monkeypatch.setattr(module, 'make_images', lambda *args, **kwargs: [])
+    assert run_suite(suite)
+
+
+def test_unknown_suite_is_refused():
+    with pytest.raises(ValueError):
+        run_suite('nonexistent')
@@ -0,0 +1,24 @@
+import pytest
+
+from compression import choose_encoding
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('gzip', 'gzip'),
+    ('gzip;q=0, *', None),
+    ('gzip; q=0.0, *;q=1', None),
+    ('GZIP;q=0.5', 'gzip'),
+    ('*', 'gzip'),
+    ('*;q=0', None),
+    ('*;q=0, gzip', 'gzip'),
+    ('deflate, identity', None),
+    ('', None),
+    (None, None),
+])
+def test_choose_encoding(accept_encoding, expected):
+    assert choose_encoding(accept_encoding, enabled=('gzip',)) == expected
+
+
+def test_choose_encoding_prefers_the_servers_order_among_accepted_codings():
+    assert choose_encoding('gzip, br', enabled=('br', 'gzip')) == 'br'
+    assert choose_encoding('br;q=0, *', enabled=('br', 'gzip')) == 'gzip'
@@ -0,0 +1,45 @@
+import pytest
+
+import app
+from benchmarks.bench_load import make_images
+from live_sessions import LiveSessionStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = LiveSessionStore()
+    monkeypatch.setattr(app, 'live_sessions', store)
+    monkeypatch.setattr(app, 'run_analysis', lambda image_bytes, catalogue, model_entry: {
+        'detected_items': ['matcha latte'], 'detected_categories': ['matcha_latte']})
+    return store
+
+
+def test_frame_keeps_what_another_frame_saved_just_before_its_claim(store, monkeypatch):
+    session = store.create()
+    claim = store.claim
+
+    def claim_after_another_frame(session_id, *args, **kwargs):
+        # Another frame finishes, and saves its items, right before this frame's claim
+        other = store.get(session_id)
+        other.items, other.frames, other.analyzed = ['canvas tote bag'], 1, 1
+        store.save(other)
+        return claim(session_id, *args, **kwargs)
+
+    monkeypatch.setattr(store, 'claim', claim_after_another_frame)
+    app.analyze_live_frame(session.id, make_images(1, 320, 240)[0], app.get_model_entry())
+
+    saved = store.get(session.id)
+    assert saved.items == ['canvas tote bag', 'matcha latte']
+    assert (saved.frames, saved.analyzed) == (2, 2)
+
+
+def test_busy_and_missing_sessions(store):
+    session = store.create()
+    assert store.claim(session.id)
+    with pytest.raises(app.AnalysisError) as busy:
+        app.analyze_live_frame(session.id, b'', app.get_model_entry())
+    assert busy.value.status == 409
+
+    with pytest.raises(app.AnalysisError) as missing:
+        app.analyze_live_frame('no-such-session', b'', app.get_model_entry())
+    assert missing.value.status == 404
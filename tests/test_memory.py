@@ -0,0 +1,20 @@
+import app
+from memory import PeakMemoryTracker
+
+
+def test_request_that_raises_still_finishes_its_memory_tracking(monkeypatch):
+    tracker = PeakMemoryTracker()
+    tracker.enabled = True  # Counted even where /proc/self/clear_refs can't be written
+    monkeypatch.setattr(app, 'memory_tracker', tracker)
+    monkeypatch.setattr(app.job_workers, 'start', lambda: None)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(app.job_queue, 'get', fail)
+    response = app.app.test_client().get('/jobs/some-job')
+    assert response.status_code == 500
+    assert tracker._active == 0
+
+    assert app.app.test_client().get('/healthz').status_code == 200
+    assert tracker._active == 0
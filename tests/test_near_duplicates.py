@@ -0,0 +1,42 @@
+import io
+
+from PIL import Image, ImageDraw
+
+import app
+from near_duplicates import NearDuplicateIndex, hamming_distance, image_dhash
+
+
+def scene(extra_object=False):
+    """A simple photo-like scene; extra_object adds a large dark box, which changes what's in the picture"""
+    image = Image.new('RGB', (640, 480))
+    draw = ImageDraw.Draw(image)
+    for x in range(640):
+        draw.line([(x, 0), (x, 479)], fill=(60 + x // 5, 90, 140))
+    draw.rectangle([80, 120, 260, 400], fill=(200, 180, 150))
+    draw.ellipse([360, 80, 560, 280], fill=(40, 120, 60))
+    if extra_object:
+        draw.rectangle([400, 300, 590, 426], fill=(20, 20, 30))
+    out = io.BytesIO()
+    image.save(out, 'PNG')
+    return out.getvalue()
+
+
+def test_distinct_images_do_not_match_at_the_default_distance():
+    original, different = image_dhash(scene()), image_dhash(scene(extra_object=True))
+    # A different scene, yet close enough that the old default of 6 bits reused its result
+    assert hamming_distance(original, different) <= 6
+
+    # The module's default and the app's (NEAR_DUPLICATE_MAX_DISTANCE unset)
+    for max_distance in (NearDuplicateIndex().max_distance, app.near_duplicate_index.max_distance):
+        index = NearDuplicateIndex(max_distance=max_distance)
+        index.add('ns', original, 'original')
+        assert index.candidates('ns', different) == []
+
+
+def test_reencoded_copy_still_matches_at_the_default_distance():
+    copy = io.BytesIO()
+    Image.open(io.BytesIO(scene())).resize((480, 360)).save(copy, 'JPEG', quality=60)
+
+    index = NearDuplicateIndex()
+    index.add('ns', image_dhash(scene()), 'original')
+    assert [target for _, target in index.candidates('ns', image_dhash(copy.getvalue()))] == ['original']
@@ -0,0 +1,27 @@
+import time
+
+from result_cache import ResultCache, _DiskTier
+
+
+def test_disk_tier_purges_expired_rows_as_it_is_written(tmp_path):
+    disk = _DiskTier(str(tmp_path / 'cache.sqlite'), ttl_seconds=60, trim_every=10)
+    for index in range(5):
+        disk.put(f'old-{index}', {'index': index}, time.time() - 1)
+    for index in range(5):
+        disk.put(f'new-{index}', {'index': index}, time.time() + 60)
+
+    # The tenth write trims: the expired rows are gone without anyone calling purge_expired()
+    assert len(disk) == 5
+    assert disk.expirations == 5
+
+
+def test_disk_tier_evicts_the_oldest_rows_beyond_max_entries(tmp_path):
+    cache = ResultCache(max_entries=0, ttl_seconds=60, disk_path=str(tmp_path / 'cache.sqlite'), disk_max_entries=100)
+    cache._disk.trim_every = 50
+    for index in range(300):
+        cache.put(f'key-{index}', {'index': index})
+
+    assert cache.stats()['disk_size'] == 100
+    assert cache.stats()['disk_evictions'] == 200
+    assert cache.get('key-299') == {'index': 299}
+    assert cache.get('key-0') is None
@@ -0,0 +1,48 @@
+import json
+import os
+
+import app
+from catalogue import Catalogue
+from score_cli import rescore_result
+
+CATALOGUE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'catalogue.json')
+DETECTED_ITEMS = ['bell hooks book', 'matcha latte', 'canvas tote bag', 'baggy jeans', 'Phoebe Bridgers shirt']
+
+
+def catalogue_data():
+    with open(CATALOGUE_FILE) as f:
+        return json.load(f)
+
+
+def test_rescore_regenerates_suggestions_and_roasts_for_new_weights():
+    old = Catalogue(catalogue_data(), 'old')
+    row = dict(app.build_analysis_result(DETECTED_ITEMS, [], 'text', old), id='1')
+    assert row['percentage'] >= 30 and row['roasts'] == []
+
+    # Plants now outweigh everything else: the same items score under 30%, and plants are the top suggestion
+    data = catalogue_data()
+    data['categories']['plant_parent']['weight'] = 200
+    new = Catalogue(data, 'new')
+
+    rescored = rescore_result(row, new)
+    assert rescored['percentage'] < 30
+    assert rescored['catalogue'] == 'new'
+    assert rescored['roasts']
+    assert set(rescored['roasts']) <= set(new.roasts) | set(new.missing_roasts.values())
+    assert rescored['improvement_suggestions'] == app.generate_improvement_suggestions(rescored['detected_categories'], new)
+    assert rescored['improvement_suggestions'][0] == new.suggestions['plant_parent']
+    assert 'max_score' not in rescored and 'category_details' not in rescored
+
+
+def test_rescore_drops_roasts_once_the_score_reaches_30():
+    data = catalogue_data()
+    data['categories']['plant_parent']['weight'] = 200
+    old = Catalogue(data, 'old')
+    row = dict(app.build_analysis_result(DETECTED_ITEMS, [], 'text', old), id='1')
+    assert row['roasts']
+
+    rescored = rescore_result(row, Catalogue(catalogue_data(), 'new'))
+    assert rescored['percentage'] >= 30
+    assert rescored['roasts'] == []
+    for category in rescored['detected_categories']:
+        assert catalogue_data()['categories'][category]['suggestion'] not in rescored['improvement_suggestions']